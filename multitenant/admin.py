@@ -12,24 +12,320 @@ example:
     from myapp.models import *
     
     admin.site.register(BugReport, TenantAdmin) 
+
+For tenants with lots of instances, set scalable_changelist:
+
+    class BugReportAdmin(TenantAdmin):
+        scalable_changelist = True
+        list_display = ('title', 'component', 'reporter')
+
+Then the changelist doesn't count the tenant's instances when nothing filters them, but uses the latest count
+from multitenant.metering (if there is one); a page is found by reading only the primary keys, which an index on
+(tenant_id, id) serves, before the instances of that page are loaded, and when the list is ordered by primary key
+the links to the next and previous pages carry the primary key where the current page ends, so that the page is
+read on from there instead of skipping the rows of every page before it; the foreign keys in list_display are
+loaded along with the instances; and the foreign keys and many-to-many fields to tenant-aware models are edited
+with raw id widgets instead of <select>s listing every one of the tenant's instances.
+
+The lookup popup of a raw id widget to a tenant-aware model is the changelist of the related model, served by
+TenantAdmin with only the current tenant's instances, whatever the admin class of the related model.
 """
 
+import copy
+
+from django.conf.urls import patterns, url
 from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, IGNORED_PARAMS, PAGE_VAR
+from django.contrib.admin.widgets import ForeignKeyRawIdWidget, ManyToManyRawIdWidget
+from django.core.exceptions import ValidationError
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.core.urlresolvers import reverse
+from django.db.models import ForeignKey
+from django.db.models.fields import FieldDoesNotExist
+from django.http import Http404
+from django.utils.html import escape
+from django.utils.text import Truncator
 
 from models import *
 from forms import TenantModelForm
-from middleware import get_current_tenant
+from copyonwrite import tenant_q
+from metering import get_usage
+from middleware import get_current_tenant_id
+from registry import get_model_label, is_tenant_model
 
 admin.site.register(Tenant)
 
 
+class TenantUsageAdmin(admin.ModelAdmin):
+    # Filled in by the meter_tenants command; see multitenant.metering.
+    list_display = ('taken', 'tenant_id', 'model', 'rows', 'bytes')
+    list_filter = ('model',)
+    date_hierarchy = 'taken'
+
+admin.site.register(TenantUsage, TenantUsageAdmin)
+
+# The primary key the current page ends at, carried by the links to the next and previous pages.
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+
+
+class TenantPaginator(Paginator):
+    """
+    Finds the instances of a page by their primary keys first, and can go by an estimated count.
+    """
+    estimated_count = None
+
+    def _get_count(self):
+        if self.estimated_count is not None:
+            return self.estimated_count
+        return super(TenantPaginator, self)._get_count()
+    count = property(_get_count)
+
+    def validate_number(self, number):
+        if self.estimated_count is None:
+            return super(TenantPaginator, self).validate_number(number)
+        # The estimate may be short; pages past it are checked by looking.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('That page number is not an integer')
+        if number < 1:
+            raise EmptyPage('That page number is less than 1')
+        return number
+
+    def pk_order(self):
+        """
+        True if object_list is ordered by primary key, False if by descending primary key, None otherwise.
+        """
+        query = self.object_list.query
+        pk_name = self.object_list.model._meta.pk.name
+        ordering = []
+        for name in query.order_by or (query.default_ordering and self.object_list.model._meta.ordering) or []:
+            # The changelist adds the primary key to whatever the ordering is, sometimes twice.
+            name = {pk_name: 'pk', '-' + pk_name: '-pk'}.get(name, name)
+            if name not in ordering:
+                ordering.append(name)
+        if ordering == ['pk']:
+            return True
+        if ordering == ['-pk']:
+            return False
+        return None
+
+    def page(self, number, after=None, before=None):
+        """
+        after is the primary key of the last instance of the page before, or before the primary key of the first
+        instance of the page after.  When object_list is ordered by primary key, the page is then read on from
+        there in the index, instead of skipping the rows of the pages before it.
+        """
+        number = self.validate_number(number)
+        ascending = self.pk_order()
+        if ascending is not None and (after is not None or before is not None):
+            forward = ascending == (after is not None)
+            lookup = 'pk__gt' if forward else 'pk__lt'
+            keys = self.object_list.filter(**{lookup: after if after is not None else before})
+            pks = list(keys.order_by('pk' if forward else '-pk').values_list('pk', flat=True)[:self.per_page])
+        else:
+            bottom = (number - 1) * self.per_page
+            pks = list(self.object_list.values_list('pk', flat=True)[bottom:bottom + self.per_page])
+        if not pks and number > 1:
+            raise EmptyPage('That page contains no results')
+        # Same ordering as object_list.
+        page = Page(self.object_list.filter(pk__in=pks), number, self)
+        page.pks = pks
+        return page
+
+
+def estimated_count(model_class, tenant_id):
+    """
+    The number of tenant_id's instances of model_class in the latest snapshot, or None if there's none.
+    """
+    usage = get_usage(tenant_id).get(get_model_label(model_class))
+    return usage and usage[0]
+
+
+class TenantChangeList(ChangeList):
+    """
+    A changelist that avoids counting all of the tenant's instances; see TenantAdmin.scalable_changelist.
+    """
+    def get_query_set(self, request):
+        # The page cursors aren't lookups.
+        self.cursors = {}
+        for name in (AFTER_VAR, BEFORE_VAR):
+            value = self.params.pop(name, None)
+            if value is not None:
+                try:
+                    self.cursors[name] = self.model._meta.pk.to_python(value)
+                except ValidationError:
+                    pass
+        return super(TenantChangeList, self).get_query_set(request)
+
+    def get_query_string(self, new_params=None, remove=None):
+        pks = getattr(self, 'page_pks', None)
+        if new_params and pks and self.paginator.pk_order() is not None:
+            new_params = dict(new_params)
+            if new_params.get(PAGE_VAR) == self.page_num + 1:
+                new_params[AFTER_VAR] = pks[-1]
+            elif new_params.get(PAGE_VAR) == self.page_num - 1:
+                new_params[BEFORE_VAR] = pks[0]
+        return super(TenantChangeList, self).get_query_string(new_params, remove)
+
+    def get_results(self, request):
+        filtered = bool(self.query or [name for name in self.params if name not in IGNORED_PARAMS])
+        estimate = estimated_count(self.model, get_current_tenant_id())
+
+        paginator = self.model_admin.get_paginator(request, self.query_set, self.list_per_page)
+        if not filtered and estimate is not None:
+            # The estimate may be stale.  Reading the primary keys of just enough rows tells whether there are more
+            # than one page, or than show all may show: the estimate only stands beyond that.
+            limit = max(self.list_per_page, self.list_max_show_all) + 1
+            rows = len(self.query_set.values_list('pk', flat=True)[:limit])
+            paginator.estimated_count = rows if rows < limit else max(estimate, rows)
+        result_count = paginator.count
+        if not filtered:
+            full_result_count = result_count
+        elif estimate is not None:
+            full_result_count = estimate
+        else:
+            full_result_count = self.root_query_set.count()
+
+        can_show_all = result_count <= self.list_max_show_all
+        multi_page = result_count > self.list_per_page
+        if (self.show_all and can_show_all) or not multi_page:
+            result_list = self.query_set._clone()
+        else:
+            try:
+                page = paginator.page(self.page_num + 1, after=self.cursors.get(AFTER_VAR),
+                                      before=self.cursors.get(BEFORE_VAR))
+            except InvalidPage:
+                raise IncorrectLookupParameters
+            result_list = page.object_list
+            self.page_pks = page.pks
+
+        self.result_count = result_count
+        self.full_result_count = full_result_count
+        self.result_list = result_list
+        self.can_show_all = can_show_all
+        self.multi_page = multi_page
+        self.paginator = paginator
+
+
+class TenantRawIdWidget(ForeignKeyRawIdWidget):
+    """
+    A raw id widget whose lookup popup is TenantAdmin.lookup_view, and which only labels the current tenant's
+    instances.  lookup is the (app label, module name, field name) of the field.
+    """
+    def __init__(self, rel, admin_site, lookup, attrs=None, using=None):
+        self.lookup = lookup
+        super(TenantRawIdWidget, self).__init__(rel, admin_site, attrs=attrs, using=using)
+
+    def render(self, name, value, attrs=None):
+        output = super(TenantRawIdWidget, self).render(name, value, attrs)
+        if self.rel.to not in self.admin_site._registry:
+            return output
+        # Django builds the link to the related model's own changelist; send it to the lookup view instead.
+        rel_to = self.rel.to._meta
+        app_label, module_name, field_name = self.lookup
+        changelist = reverse('admin:%s_%s_changelist' % (rel_to.app_label, rel_to.module_name),
+                             current_app=self.admin_site.name)
+        lookup = reverse('admin:%s_%s_lookup' % (app_label, module_name), args=[field_name],
+                         current_app=self.admin_site.name)
+        return output.replace('href="%s' % changelist, 'href="%s' % lookup, 1)
+
+    def label_for_value(self, value):
+        key = self.rel.get_related_field().name
+        try:
+            manager = self.rel.to._default_manager.using(self.db)
+            obj = manager.filter(tenant_q(self.rel.to, get_current_tenant_id())).get(**{key: value})
+            return '&nbsp;<strong>%s</strong>' % escape(Truncator(obj).words(14, truncate='...'))
+        except (ValueError, self.rel.to.DoesNotExist):
+            return ''
+
+
+class TenantManyToManyRawIdWidget(ManyToManyRawIdWidget, TenantRawIdWidget):
+    pass
+
+
 class TenantAdmin(admin.ModelAdmin):
     exclude = ('tenant',)
     
     # Filter all relation fields' querysets by tenant
     form = TenantModelForm
-    
+
+    # Set to True for models with lots of instances per tenant.
+    scalable_changelist = False
+
+    def __init__(self, model, admin_site):
+        super(TenantAdmin, self).__init__(model, admin_site)
+        if self.scalable_changelist:
+            self.paginator = TenantPaginator
+            related = [field.name for field in model._meta.fields + model._meta.many_to_many
+                       if field.rel and field.name != 'tenant' and is_tenant_model(field.rel.to)]
+            self.raw_id_fields = tuple(self.raw_id_fields) + tuple(name for name in related if name not in self.raw_id_fields)
+
+    def get_changelist(self, request, **kwargs):
+        if self.scalable_changelist:
+            return TenantChangeList
+        return super(TenantAdmin, self).get_changelist(request, **kwargs)
+
     def queryset(self, request):
         qs = super(TenantAdmin, self).queryset(request)
-        return qs.filter(tenant = get_current_tenant() )
-    
\ No newline at end of file
+        if self.scalable_changelist:
+            related = []
+            for name in self.list_display:
+                try:
+                    field = self.model._meta.get_field(name)
+                except FieldDoesNotExist:
+                    continue
+                if isinstance(field, ForeignKey):
+                    related.append(name)
+            if related:
+                qs = qs.select_related(*related)
+        return qs.filter(tenant_q(self.model, get_current_tenant_id()))
+    
+
+    def _raw_id_field(self, db_field):
+        return db_field.name in self.raw_id_fields and is_tenant_model(db_field.rel.to)
+
+    def formfield_for_foreignkey(self, db_field, request=None, **kwargs):
+        if self._raw_id_field(db_field):
+            kwargs['widget'] = TenantRawIdWidget(db_field.rel, self.admin_site, self._lookup(db_field),
+                                                 using=kwargs.get('using'))
+            return db_field.formfield(**kwargs)
+        return super(TenantAdmin, self).formfield_for_foreignkey(db_field, request, **kwargs)
+
+    def formfield_for_manytomany(self, db_field, request=None, **kwargs):
+        if db_field.rel.through._meta.auto_created and self._raw_id_field(db_field):
+            kwargs['widget'] = TenantManyToManyRawIdWidget(db_field.rel, self.admin_site, self._lookup(db_field),
+                                                           using=kwargs.get('using'))
+            kwargs['help_text'] = ''
+            return db_field.formfield(**kwargs)
+        return super(TenantAdmin, self).formfield_for_manytomany(db_field, request, **kwargs)
+
+    def _lookup(self, db_field):
+        return self.model._meta.app_label, self.model._meta.module_name, db_field.name
+
+    def get_urls(self):
+        info = self.model._meta.app_label, self.model._meta.module_name
+        return patterns('',
+            url(r'^lookup/(\w+)/$', self.admin_site.admin_view(self.lookup_view), name='%s_%s_lookup' % info),
+        ) + super(TenantAdmin, self).get_urls()
+
+    def lookup_view(self, request, field_name):
+        """
+        The lookup popup of the raw id widget of field_name: the changelist of the related model, with only the
+        current tenant's instances, even when the related model's admin isn't a TenantAdmin.
+        """
+        try:
+            db_field = self.model._meta.get_field(field_name)
+        except FieldDoesNotExist:
+            raise Http404
+        if not db_field.rel or not self._raw_id_field(db_field):
+            raise Http404
+        related = self.admin_site._registry.get(db_field.rel.to)
+        if related is None:
+            raise Http404
+        related = copy.copy(related)
+        queryset = related.queryset
+        related.queryset = lambda request: queryset(request).filter(tenant_q(db_field.rel.to, get_current_tenant_id()))
+        return related.changelist_view(request)
@@ -0,0 +1,141 @@
+"""
+Archiving dormant tenants, so that the tables and indexes everyone uses only hold the active ones.
+
+An archived tenant's instances are moved, in batches and with their primary keys, to the database named by
+TENANT_ARCHIVE_DATABASE, and the Tenant is marked as archived.  The archive database needs the same tables;
+a separate SQLite file is enough:
+
+    TENANT_ARCHIVE_DATABASE = 'archive'
+
+    ./manage.py archive_tenants --inactive-days=180
+
+When one of its users comes back, the ThreadLocals middleware notices that the tenant is archived, and moves its
+instances back before going on with the request.  That request takes longer, depending on the size of the tenant.
+
+While a tenant's instances are on the move, its archive_transition says so, and nobody else moves them: a request
+for a tenant that's being archived or rehydrated waits up to TENANT_REHYDRATE_WAIT seconds for that to finish, then
+gives up with TenantBusy.
+
+example:
+
+    from multitenant.archive import archive_tenant, rehydrate_tenant
+
+    archive_tenant(tenant)
+    rehydrate_tenant(tenant)
+"""
+
+import datetime
+import time
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction, DEFAULT_DB_ALIAS
+
+from generations import bump_generation
+from middleware import forget_tenant
+from registry import get_plan, get_profile_class
+from routers import copy_tenant, delete_tenant_rows, get_tenant_database
+from settings import BASE_TENANT_ID, TENANT_ARCHIVE_DATABASE
+
+ARCHIVING = 'archiving'
+REHYDRATING = 'rehydrating'
+
+
+class TenantBusy(Exception):
+    """
+    The tenant's instances are being archived or rehydrated by someone else.
+    """
+
+
+def _archive_database():
+    if not TENANT_ARCHIVE_DATABASE:
+        raise ImproperlyConfigured('Set TENANT_ARCHIVE_DATABASE to the database that archived tenants go to.')
+    return TENANT_ARCHIVE_DATABASE
+
+
+def _set_state(tenant_id, **state):
+    from models import Tenant
+    Tenant.objects.using(DEFAULT_DB_ALIAS).filter(pk=tenant_id).update(**state)
+    forget_tenant(tenant_id)
+    for model_class in get_plan():
+        bump_generation(model_class, tenant_id)
+
+
+def _begin(tenant_id, transition, archived, wait=0):
+    """
+    Marks tenant_id as in transition, if it's archived as given and nobody else is moving its instances.
+    Returns False if there's nothing to do: the tenant is already the other way.  Waits up to wait seconds
+    for a transition going on to finish, then raises TenantBusy.
+    """
+    from models import Tenant
+    deadline = time.time() + wait
+    while True:
+        with transaction.commit_on_success(using=DEFAULT_DB_ALIAS):
+            tenant = Tenant.objects.using(DEFAULT_DB_ALIAS).select_for_update().get(pk=tenant_id)
+            if not tenant.archive_transition:
+                if tenant.archived != archived:
+                    return False
+                Tenant.objects.using(DEFAULT_DB_ALIAS).filter(pk=tenant_id).update(archive_transition=transition)
+                forget_tenant(tenant_id)
+                return True
+        if time.time() >= deadline:
+            raise TenantBusy('Tenant %s is %s.' % (tenant_id, tenant.archive_transition))
+        time.sleep(min(1, max(0, deadline - time.time())))
+
+
+def dormant_tenants(days):
+    """
+    The tenants that aren't archived, and none of whose users have logged in for the last days.
+    """
+    from models import Tenant
+    profile_class = get_profile_class()
+    if profile_class is None:
+        raise ImproperlyConfigured('Finding dormant tenants needs AUTH_PROFILE_MODULE, to tell whose users are whose.')
+    since = datetime.datetime.now() - datetime.timedelta(days=days)
+    active = profile_class.objects.filter(user__last_login__gte=since).values('tenant')
+    return Tenant.objects.filter(archived=False, archive_transition='').exclude(pk=BASE_TENANT_ID).exclude(pk__in=active)
+
+
+def archive_tenant(tenant, pause=0):
+    """
+    Moves all of tenant's instances to the archive database, and marks it as archived.
+    Returns the number of instances archived: none if it's archived already.
+    Raises TenantBusy if its instances are being moved already.
+    """
+    archive = _archive_database()
+    tenant_id = getattr(tenant, 'pk', tenant)
+    if tenant_id == BASE_TENANT_ID:
+        raise ValueError('The base tenant cannot be archived.')
+    source = get_tenant_database(tenant_id)
+    if not _begin(tenant_id, ARCHIVING, archived=False):
+        return 0
+
+    # Copy first, then switch, then delete: if anything fails, the instances are still where the tenant looks,
+    # and running it again picks up where it stopped.
+    try:
+        archived = copy_tenant(tenant_id, source, archive)
+        _set_state(tenant_id, archived=True)
+        delete_tenant_rows(tenant_id, source, pause)
+    finally:
+        _set_state(tenant_id, archive_transition='')
+    return archived
+
+
+def rehydrate_tenant(tenant, pause=0, wait=0):
+    """
+    Moves an archived tenant's instances back from the archive database, and marks it as active again.
+    Returns the number of instances brought back: none if it isn't archived (anymore).
+    If its instances are being moved already, waits up to wait seconds for that, then raises TenantBusy.
+    """
+    archive = _archive_database()
+    tenant_id = getattr(tenant, 'pk', tenant)
+    database = get_tenant_database(tenant_id)
+    if not _begin(tenant_id, REHYDRATING, archived=True, wait=wait):
+        return 0
+
+    try:
+        restored = copy_tenant(tenant_id, archive, database)
+        _set_state(tenant_id, archived=False)
+        delete_tenant_rows(tenant_id, archive, pause)
+    finally:
+        _set_state(tenant_id, archive_transition='')
+    return restored
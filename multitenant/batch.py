@@ -0,0 +1,180 @@
+"""
+Running a job, or a management command, once for every tenant.
+
+for_each_tenant() calls a function with each tenant as the current tenant, so tenant_objects, the router and
+everything else see that tenant's instances.  The tenants can be spread over a pool of threads or processes,
+each with its own database connections.  A tenant whose job raises an exception doesn't stop the others: the
+error is recorded in the report, and the next tenant goes on.
+
+example:
+
+    from multitenant.batch import for_each_tenant
+
+    def close_stale_bugs(tenant):
+        BugReport.tenant_objects.filter(updated__lt=cutoff).update(status='closed')
+
+    report = for_each_tenant(close_stale_bugs, workers=8)
+    print report.summary()
+
+or, from the command line, with any management command:
+
+    ./manage.py tenant_command cleanup_sessions --workers=8
+    ./manage.py tenant_command sync_counts --tenants=3,7,42 -- --verbosity=2
+
+With processes=True the function must be picklable, i.e. defined at the top level of a module.
+"""
+
+import multiprocessing
+import Queue
+import threading
+import time
+import traceback
+
+from django.core.management import get_commands, load_command_class
+from django.db import connections
+
+from middleware import tenant_context
+from settings import BASE_TENANT_ID
+
+
+class TenantRunReport(object):
+    """
+    What happened for each tenant: results by tenant id for those that went through, and the
+    formatted traceback by tenant id for those that failed.
+    """
+    def __init__(self):
+        self.results = {}
+        self.errors = {}
+        self.started = time.time()
+        self.finished = None
+
+    def add(self, tenant_id, ok, value):
+        if ok:
+            self.results[tenant_id] = value
+        else:
+            self.errors[tenant_id] = value
+
+    def summary(self):
+        lines = ['%s tenants, %s succeeded, %s failed, in %.1f seconds.' % (
+            len(self.results) + len(self.errors), len(self.results), len(self.errors),
+            (self.finished or time.time()) - self.started)]
+        for tenant_id in sorted(self.errors):
+            lines.append('Tenant %s failed:\n%s' % (tenant_id, self.errors[tenant_id]))
+        return '\n'.join(lines)
+
+
+def get_tenants(tenant_ids=None, exclude=None, include_base=False, include_archived=False):
+    """
+    The tenants to run over: those in tenant_ids (all of them if None), except those in exclude,
+    the base tenant and the archived tenants.
+    """
+    from models import Tenant
+    tenants = Tenant.objects.order_by('pk')
+    if tenant_ids is not None:
+        tenants = tenants.filter(pk__in=list(tenant_ids))
+    if exclude:
+        tenants = tenants.exclude(pk__in=list(exclude))
+    if not include_base:
+        tenants = tenants.exclude(pk=BASE_TENANT_ID)
+    if not include_archived:
+        tenants = tenants.exclude(archived=True)
+    return tenants
+
+
+def _run_one(args):
+    func, tenant = args
+    try:
+        with tenant_context(tenant):
+            return tenant.pk, True, func(tenant)
+    except (Exception, SystemExit):
+        return tenant.pk, False, traceback.format_exc()
+
+
+def _close_connections():
+    for connection in connections.all():
+        connection.close()
+
+
+def _init_process():
+    # The connections inherited from the parent belong to the parent; forget them without closing them.
+    for connection in connections.all():
+        connection.connection = None
+
+
+def _run_in_threads(func, tenants, workers, callback):
+    tasks = Queue.Queue()
+    for tenant in tenants:
+        tasks.put(tenant)
+    done = Queue.Queue()
+
+    def work():
+        try:
+            while True:
+                try:
+                    tenant = tasks.get_nowait()
+                except Queue.Empty:
+                    return
+                done.put(_run_one((func, tenant)))
+        finally:
+            _close_connections()
+
+    threads = [threading.Thread(target=work, name='multitenant-batch-%s' % i) for i in range(workers)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for i in xrange(len(tenants)):
+        callback(*done.get())
+    for thread in threads:
+        thread.join()
+
+
+def for_each_tenant(func, tenants=None, workers=1, processes=False, callback=None):
+    """
+    Calls func(tenant) with each of tenants (see get_tenants() for the default) as the current tenant,
+    workers at a time, in threads or, with processes set, in processes.  callback, if given, is called
+    with (tenant id, ok, result or traceback) as each tenant is done.  Returns a TenantRunReport.
+    """
+    if tenants is None:
+        tenants = get_tenants()
+    tenants = list(tenants)
+    report = TenantRunReport()
+
+    def done(tenant_id, ok, value):
+        report.add(tenant_id, ok, value)
+        if callback is not None:
+            callback(tenant_id, ok, value)
+
+    if workers <= 1:
+        for tenant in tenants:
+            done(*_run_one((func, tenant)))
+    elif processes:
+        # Nothing the children could inherit should be in use.
+        _close_connections()
+        pool = multiprocessing.Pool(workers, initializer=_init_process)
+        try:
+            for result in pool.imap_unordered(_run_one, [(func, tenant) for tenant in tenants]):
+                done(*result)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        _run_in_threads(func, tenants, workers, done)
+
+    report.finished = time.time()
+    return report
+
+
+class CommandJob(object):
+    """
+    Runs a management command, given as it would be on the command line, for one tenant.
+    Picklable, so it can be sent to other processes.
+    """
+    def __init__(self, name, argv=()):
+        self.name = name
+        self.argv = list(argv)
+
+    def __call__(self, tenant):
+        command = load_command_class(get_commands()[self.name], self.name)
+        parser = command.create_parser('manage.py', self.name)
+        options, args = parser.parse_args(self.argv)
+        return command.execute(*args, **options.__dict__)
@@ -0,0 +1,215 @@
+"""
+A tenant-namespaced wrapper around any of django's cache backends.
+
+Every key goes through the wrapper prefixed with the current tenant's id and that tenant's cache version, so
+tenants never see each other's entries, and nobody has to put the tenant in their keys by hand.  Clearing all of
+one tenant's entries is a single increment of its version: the old entries are simply never found again, and
+expire on their own.
+
+example:
+
+    from multitenant.cache import tenant_cache, invalidate_tenant
+
+    sidebar = tenant_cache.get('sidebar')
+    if sidebar is None:
+        sidebar = render_sidebar()
+        tenant_cache.set('sidebar', sidebar, 300)
+    ...
+    invalidate_tenant(tenant)
+
+To wrap another backend, or to work on behalf of a tenant other than the current one:
+
+    from django.core.cache import get_cache
+    from multitenant.cache import TenantCache
+
+    sessions = TenantCache(get_cache('sessions'), tenant_id=42)
+
+Whole pages are cached per tenant with tenant_cache_page(), used like django's cache_page(), or site-wide with
+TenantUpdateCacheMiddleware and TenantFetchFromCacheMiddleware; template fragments with the tenant_cache tag:
+
+    {% load multitenant_cache %}
+    {% tenant_cache 500 sidebar request.user.username %} ... {% endtenant_cache %}
+
+The version costs one more cache lookup per operation; get_many() and set_many() only look it up once.
+"""
+
+import copy
+
+from django.core.cache import cache as default_cache
+from django.middleware.cache import CacheMiddleware, FetchFromCacheMiddleware, UpdateCacheMiddleware
+from django.utils.decorators import decorator_from_middleware_with_args
+
+from generations import GENERATION_TIMEOUT, _initial
+from middleware import get_current_tenant_id
+
+
+def _version_key(tenant_id):
+    return 'multitenant:cache-version:%s' % tenant_id
+
+
+def get_cache_version(tenant_id, cache=None):
+    """
+    The current cache version of tenant_id, as kept in cache (the default cache if None).
+    """
+    cache = cache or default_cache
+    key = _version_key(tenant_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _initial(), GENERATION_TIMEOUT)
+        version = cache.get(key)
+    return version
+
+
+def invalidate_tenant(tenant, cache=None):
+    """
+    Drops all of tenant's entries from cache (the default cache if None), however many there are.
+    """
+    cache = cache or default_cache
+    key = _version_key(getattr(tenant, 'pk', tenant))
+    try:
+        cache.incr(key)
+    except ValueError:
+        # incr() raises ValueError when the key is missing.
+        cache.set(key, _initial(), GENERATION_TIMEOUT)
+
+
+class TenantCache(object):
+    """
+    Wraps a cache backend, prefixing every key with a tenant and its cache version.
+    The tenant is tenant_id if given, otherwise the current tenant at the time of each call.
+    """
+    def __init__(self, cache=None, tenant_id=None):
+        self.cache = cache or default_cache
+        self.tenant_id = tenant_id
+
+    def _get_tenant_id(self):
+        if self.tenant_id is not None:
+            return self.tenant_id
+        return get_current_tenant_id()
+
+    def _prefix(self):
+        tenant_id = self._get_tenant_id()
+        return 'tenant:%s:%s:' % (tenant_id, get_cache_version(tenant_id, self.cache))
+
+    def for_tenant(self, tenant):
+        """
+        The same backend, on behalf of tenant.
+        """
+        return TenantCache(self.cache, getattr(tenant, 'pk', tenant))
+
+    def invalidate(self):
+        invalidate_tenant(self._get_tenant_id(), self.cache)
+
+    # clear() only clears this tenant's entries; use the backend's own to clear everything.
+    clear = invalidate
+
+    def add(self, key, value, timeout=None, version=None):
+        return self.cache.add(self._prefix() + key, value, timeout, version=version)
+
+    def get(self, key, default=None, version=None):
+        return self.cache.get(self._prefix() + key, default, version=version)
+
+    def set(self, key, value, timeout=None, version=None):
+        self.cache.set(self._prefix() + key, value, timeout, version=version)
+
+    def delete(self, key, version=None):
+        self.cache.delete(self._prefix() + key, version=version)
+
+    def has_key(self, key, version=None):
+        return self.cache.has_key(self._prefix() + key, version=version)
+
+    __contains__ = has_key
+
+    def incr(self, key, delta=1, version=None):
+        return self.cache.incr(self._prefix() + key, delta, version=version)
+
+    def decr(self, key, delta=1, version=None):
+        return self.cache.decr(self._prefix() + key, delta, version=version)
+
+    def get_many(self, keys, version=None):
+        prefix = self._prefix()
+        values = self.cache.get_many([prefix + key for key in keys], version=version)
+        return dict((key[len(prefix):], value) for key, value in values.items())
+
+    def set_many(self, data, timeout=None, version=None):
+        prefix = self._prefix()
+        self.cache.set_many(dict((prefix + key, value) for key, value in data.items()), timeout, version=version)
+
+    def delete_many(self, keys, version=None):
+        prefix = self._prefix()
+        self.cache.delete_many([prefix + key for key in keys], version=version)
+
+    def __getattr__(self, name):
+        # Everything else (default_timeout, close(), ...) is the backend's.
+        return getattr(self.cache, name)
+
+
+tenant_cache = TenantCache()
+
+
+class TenantCacheMiddleware(CacheMiddleware):
+    """
+    django's CacheMiddleware, keeping each tenant's pages apart.  Must come after ThreadLocals.
+    """
+    def __init__(self, *args, **kwargs):
+        super(TenantCacheMiddleware, self).__init__(*args, **kwargs)
+        self.cache = TenantCache(self.cache)
+
+
+def _for_request(middleware, request):
+    """
+    A copy of middleware whose cache is that of the request's tenant, as found by ThreadLocals, or None if
+    ThreadLocals didn't run.  The middleware is shared by every thread, so its own cache is left alone.
+    """
+    tenant_id = getattr(request, '_multitenant_tenant_id', None)
+    if tenant_id is None:
+        return None
+    middleware = copy.copy(middleware)
+    middleware.cache = middleware.cache.for_tenant(tenant_id)
+    return middleware
+
+
+class TenantUpdateCacheMiddleware(UpdateCacheMiddleware):
+    """
+    Must come before ThreadLocals: its process_response runs after ThreadLocals has put the context back,
+    so the page is stored for the tenant ThreadLocals found for the request, never the current one.
+    """
+    def __init__(self):
+        super(TenantUpdateCacheMiddleware, self).__init__()
+        self.cache = TenantCache(self.cache)
+
+    def process_response(self, request, response):
+        middleware = _for_request(self, request)
+        if middleware is None:
+            return response
+        return UpdateCacheMiddleware.process_response(middleware, request, response)
+
+
+class TenantFetchFromCacheMiddleware(FetchFromCacheMiddleware):
+    """
+    Must come after ThreadLocals.
+    """
+    def __init__(self):
+        super(TenantFetchFromCacheMiddleware, self).__init__()
+        self.cache = TenantCache(self.cache)
+
+    def process_request(self, request):
+        # With LAZY_TENANT_RESOLUTION, this is where the request's tenant is found.
+        get_current_tenant_id()
+        middleware = _for_request(self, request)
+        if middleware is None:
+            request._cache_update_cache = False
+            return None
+        return FetchFromCacheMiddleware.process_request(middleware, request)
+
+
+def tenant_cache_page(timeout, cache=None, key_prefix=None):
+    """
+    Like django's cache_page(), with a separate copy of the page for each tenant.
+    example:
+        @tenant_cache_page(60 * 15)
+        def bug_list(request):
+            ...
+    """
+    return decorator_from_middleware_with_args(TenantCacheMiddleware)(
+        cache_timeout=timeout, cache_alias=cache, key_prefix=key_prefix)
@@ -0,0 +1,229 @@
+"""
+Bulk cloning of tenant-aware model instances from one tenant to another.
+
+This is what runs when a new tenant is created: every base tenant instance of every tenant-aware model
+gets copied to the new tenant.  Instead of saving one instance at a time, each model is copied with
+bulk_create, in foreign key dependency order, and the whole clone runs in a single transaction.
+Foreign keys and many-to-many links between the cloned instances are remapped to point at the copies.
+
+example:
+
+    from multitenant.cloning import clone_tenant
+
+    clone_tenant(source_tenant, dest_tenant)
+
+Note that the primary keys of the new instances are read back after inserting them, so this only
+supports models with an auto-incrementing primary key.
+"""
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+from generations import bump_generation
+from registry import dependency_order, get_clone_plan, get_foreign_keys, get_m2m_fields
+from routers import get_tenant_database
+from settings import BASE_TENANT_ID, BULK_BATCH_SIZE
+
+
+def _tenant_id(tenant):
+    return getattr(tenant, 'pk', tenant)
+
+
+def _chunks(items, size):
+    for i in xrange(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _batch_size(model_class, using, params_per_row=None):
+    """
+    Number of rows to send per query.  SQLite limits the number of parameters in a single query,
+    so we stay below that limit.
+    """
+    if params_per_row is None:
+        params_per_row = len(model_class._meta.local_fields)
+    if connections[using].vendor == 'sqlite':
+        return max(1, min(BULK_BATCH_SIZE, 999 // max(1, params_per_row)))
+    return BULK_BATCH_SIZE
+
+
+def _insert(model_class, objs, dest_tenant_id, using):
+    """
+    Inserts objs with bulk_create, and returns their new primary keys in the same order.
+    """
+    manager = model_class._base_manager.db_manager(using)
+    existing = manager.filter(tenant=dest_tenant_id)
+    before = existing.aggregate(max_pk=Max(model_class._meta.pk.name))['max_pk']
+
+    for batch in _chunks(objs, _batch_size(model_class, using)):
+        manager.bulk_create(batch)
+
+    # The new rows can't be told apart by their primary keys: some backends don't insert a batch in order
+    # (SQLite's INSERT ... SELECT ... UNION), and rows may be added to the destination tenant meanwhile.  Match
+    # each instance with a new row holding its values instead; auto_now and auto_now_add fields got a new value on
+    # the way in, so they can't be matched.  Identical instances are interchangeable.
+    fields = [field for field in model_class._meta.local_fields if field is not model_class._meta.pk
+              and not getattr(field, 'auto_now', False) and not getattr(field, 'auto_now_add', False)]
+
+    def key(values):
+        return tuple(field.to_python(value) for field, value in zip(fields, values))
+
+    inserted = existing if before is None else existing.filter(pk__gt=before)
+    rows = {}
+    for row in inserted.order_by('pk').values_list('pk', *[field.attname for field in fields]):
+        rows.setdefault(key(row[1:]), []).append(row[0])
+    new_pks = []
+    for obj in objs:
+        pks = rows.get(key([getattr(obj, field.attname) for field in fields]))
+        if not pks:
+            raise ValueError(
+                'Could not read back the primary keys of the cloned %s instances.' % model_class._meta.object_name)
+        new_pks.append(pks.pop(0))
+    return new_pks
+
+
+def _update_fk(model_class, field, assignments, using):
+    """
+    Sets field on many rows at once.  assignments is a list of (pk, value) tuples.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(model_class._meta.db_table)
+    pk_column = qn(model_class._meta.pk.column)
+    cursor = connection.cursor()
+
+    for batch in _chunks(assignments, _batch_size(model_class, using, params_per_row=3)):
+        sql = 'UPDATE %s SET %s = CASE %s %s END WHERE %s IN (%s)' % (
+            table, qn(field.column), pk_column,
+            ' '.join(['WHEN %s THEN %s'] * len(batch)),
+            pk_column, ', '.join(['%s'] * len(batch)),
+        )
+        params = []
+        for pk, value in batch:
+            params.extend([pk, value])
+        params.extend([pk for pk, value in batch])
+        cursor.execute(sql, params)
+
+
+def clone_model_rows(model_class, source_tenant_id, dest_tenant_id, pk_maps, deferred, using=DEFAULT_DB_ALIAS,
+                     source_using=None):
+    """
+    Copies all source tenant instances of model_class to the destination tenant.
+    pk_maps holds a key for every model taking part in the clone: a dict of {old pk: new pk} once the
+    model has been cloned, None before that.  References to cloned models are remapped before inserting;
+    references to models that haven't been cloned yet (self references, cycles) are appended to deferred,
+    to be fixed up later by apply_deferred().
+    The instances are read from source_using (by default, the same database they're written to).
+    Returns the {old pk: new pk} dict for model_class.
+    """
+    source = list(model_class._base_manager.db_manager(source_using or using).filter(tenant=source_tenant_id).order_by('pk'))
+    if not source:
+        return {}
+
+    old_pks = [obj.pk for obj in source]
+    fks = get_foreign_keys(model_class)
+    pending = []
+
+    for index, obj in enumerate(source):
+        obj.pk = None
+        obj.tenant_id = dest_tenant_id
+        for field in fks:
+            value = getattr(obj, field.attname)
+            if value is None or field.rel.to not in pk_maps:
+                continue
+            target_map = pk_maps[field.rel.to]
+            if target_map is None:
+                # The target hasn't been cloned yet.  Keep pointing at the source instance for now,
+                # which is a valid row, and fix it up once we know the new primary key.
+                pending.append((index, field, value))
+            elif value in target_map:
+                setattr(obj, field.attname, target_map[value])
+
+    new_pks = _insert(model_class, source, dest_tenant_id, using)
+    pk_map = dict(zip(old_pks, new_pks))
+    for index, field, value in pending:
+        deferred.append((model_class, field, new_pks[index], value))
+    return pk_map
+
+
+def apply_deferred(deferred, pk_maps, using=DEFAULT_DB_ALIAS):
+    """
+    Fixes up the references that clone_model_rows() could not remap while inserting.
+    """
+    grouped = {}
+    for model_class, field, pk, old_value in deferred:
+        target_map = pk_maps.get(field.rel.to) or {}
+        if old_value in target_map:
+            grouped.setdefault((model_class, field), []).append((pk, target_map[old_value]))
+
+    for (model_class, field), assignments in grouped.items():
+        _update_fk(model_class, field, assignments, using)
+
+
+def clone_m2m(model_class, pk_maps, using=DEFAULT_DB_ALIAS, source_using=None):
+    """
+    Copies the many-to-many links of the cloned instances of model_class, remapping both ends.
+    Only auto-created intermediary tables are handled here; an explicit "through" model that is
+    tenant-aware gets cloned like any other model.
+    """
+    own_map = pk_maps.get(model_class)
+    if not own_map:
+        return
+
+    for field in get_m2m_fields(model_class):
+        through = field.rel.through
+        source_name = field.m2m_field_name()
+        target_name = field.m2m_reverse_field_name()
+        source_attname = through._meta.get_field(source_name).attname
+        target_attname = through._meta.get_field(target_name).attname
+        target_map = pk_maps.get(field.rel.to) or {}
+        manager = through._base_manager.db_manager(using)
+        source_manager = through._base_manager.db_manager(source_using or using)
+
+        links = []
+        for keys in _chunks(own_map.keys(), _batch_size(through, source_using or using, params_per_row=1)):
+            rows = source_manager.filter(**{'%s__in' % source_name: keys}).values_list(source_name, target_name)
+            for source_pk, target_pk in rows:
+                links.append(through(**{
+                    source_attname: own_map[source_pk],
+                    target_attname: target_map.get(target_pk, target_pk),
+                }))
+
+        for batch in _chunks(links, _batch_size(through, using)):
+            manager.bulk_create(batch)
+
+
+def clone_tenant(source_tenant, dest_tenant, model_classes=None, using=None):
+    """
+    Clones all instances of model_classes (by default, all the models in the registry's clone plan)
+    from source_tenant to dest_tenant, in a single transaction.
+    The instances are read from the source tenant's database, and written to using (by default, the
+    destination tenant's database); see multitenant.routers.
+    Returns a dict of {model class: {old pk: new pk}}.
+    """
+    if model_classes is None:
+        ordered = get_clone_plan()
+    else:
+        ordered = dependency_order(model_classes)
+    source_tenant_id = _tenant_id(source_tenant)
+    dest_tenant_id = _tenant_id(dest_tenant)
+    if using is None:
+        using = get_tenant_database(dest_tenant_id)
+    source_using = get_tenant_database(source_tenant_id, default=using)
+    pk_maps = dict.fromkeys(ordered)
+    deferred = []
+
+    with transaction.commit_on_success(using=using):
+        for model_class in ordered:
+            pk_maps[model_class] = clone_model_rows(
+                model_class, source_tenant_id, dest_tenant_id, pk_maps, deferred, using=using, source_using=source_using)
+        apply_deferred(deferred, pk_maps, using=using)
+        for model_class in ordered:
+            clone_m2m(model_class, pk_maps, using=using, source_using=source_using)
+        if model_classes is None and source_tenant_id == BASE_TENANT_ID:
+            # Keep track of where the new instances came from, for multitenant.sync.
+            from sync import record_links
+            record_links(dest_tenant_id, pk_maps, using=using)
+
+    for model_class in ordered:
+        bump_generation(model_class, dest_tenant_id)
+    return pk_maps
@@ -0,0 +1,167 @@
+"""
+Copy-on-write for tenant-aware models.
+
+Normally every new tenant gets its own copy of every base tenant instance.  For models with lots of base
+tenant instances that most tenants never change, set copy_on_write on the model class:
+
+    class BugReportType(TenantModel):
+        copy_on_write = True
+        name = models.CharField(max_length=50)
+
+Those models are not cloned for new tenants.  Instead, tenant_objects shows the tenant's own instances plus
+the base tenant's instances that the tenant hasn't changed or deleted.  The first time a tenant saves one
+of the base tenant's instances, the tenant gets its own copy, and the base tenant's instance is hidden from
+that tenant from then on.  Deleting one of the base tenant's instances only hides it from that tenant.
+Either way, the base tenant's instance itself is never touched.
+
+Which base tenant instances a tenant has changed or deleted is recorded with BaseTenantLink.
+
+Note that the base tenant's instances are shared: their many-to-many links are copied along when a tenant
+gets its own copy, but links added from the base tenant's side only show up from that side.
+"""
+
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.query import QuerySet
+
+from generations import bump_generation
+from middleware import get_current_tenant_id
+from registry import get_foreign_keys, get_m2m_fields, get_model_label, get_tenant_model_classes
+from settings import BASE_TENANT_ID
+
+
+def is_copy_on_write(model_class):
+    return getattr(model_class, 'copy_on_write', False)
+
+
+def hidden_base_pks(model_class, tenant_id):
+    """
+    The primary keys of the base tenant instances that tenant_id has changed or deleted, as a queryset.
+    """
+    from models import BaseTenantLink
+    return BaseTenantLink.objects.filter(
+        tenant=tenant_id, model=get_model_label(model_class),
+    ).values_list('base_pk', flat=True)
+
+
+def tenant_q(model_class, tenant_id):
+    """
+    A Q object that selects the instances of model_class that tenant_id can see.
+    """
+    if is_copy_on_write(model_class) and tenant_id != BASE_TENANT_ID:
+        shared = Q(tenant=BASE_TENANT_ID) & ~Q(pk__in=hidden_base_pks(model_class, tenant_id))
+        return Q(tenant=tenant_id) | shared
+    return Q(tenant=tenant_id)
+
+
+def is_shared(instance, tenant_id):
+    """
+    True if instance is one of the base tenant's instances, seen by another tenant.
+    """
+    return (
+        is_copy_on_write(instance.__class__) and instance.pk is not None and tenant_id != BASE_TENANT_ID
+        and getattr(instance, '_loaded_tenant_id', None) == BASE_TENANT_ID
+    )
+
+
+def materialize(instance, tenant_id):
+    """
+    Saves instance, one of the base tenant's instances, as tenant_id's own copy.
+    The tenant's references to the base tenant's instance are moved to the copy.
+    """
+    from models import BaseTenantLink
+
+    model_class = instance.__class__
+    label = get_model_label(model_class)
+    base_pk = instance.pk
+    db = instance._state.db
+
+    with transaction.commit_on_success(using=db):
+        link, created = BaseTenantLink.objects.using(db).get_or_create(tenant_id=tenant_id, model=label, base_pk=base_pk)
+        if link.local_pk is not None:
+            # The tenant already has its copy, e.g. this instance was loaded before the copy was made.
+            instance.pk = link.local_pk
+        else:
+            instance.pk = None
+        instance.tenant_id = tenant_id
+        instance._loaded_tenant_id = tenant_id
+        instance.save(using=db)
+        if link.local_pk is not None:
+            return
+
+        link.local_pk = instance.pk
+        link.save(using=db)
+
+        for field in get_m2m_fields(model_class):
+            through = field.rel.through
+            source_name = field.m2m_field_name()
+            target_name = field.m2m_reverse_field_name()
+            source_attname = through._meta.get_field(source_name).attname
+            target_attname = through._meta.get_field(target_name).attname
+            manager = through._base_manager.db_manager(db)
+            manager.bulk_create([
+                through(**{source_attname: instance.pk, target_attname: target_pk})
+                for target_pk in manager.filter(**{source_name: base_pk}).values_list(target_name, flat=True)
+            ])
+
+        for other in get_tenant_model_classes():
+            for field in get_foreign_keys(other):
+                if field.rel.to is model_class:
+                    other._base_manager.db_manager(db).filter(
+                        tenant=tenant_id, **{field.name: base_pk}
+                    ).update(**{field.name: instance.pk})
+                    bump_generation(other, tenant_id)
+            for field in get_m2m_fields(other):
+                if field.rel.to is model_class:
+                    source_name = field.m2m_field_name()
+                    target_name = field.m2m_reverse_field_name()
+                    field.rel.through._base_manager.db_manager(db).filter(
+                        **{target_name: base_pk, '%s__tenant' % source_name: tenant_id}
+                    ).update(**{target_name: instance.pk})
+                    bump_generation(other, tenant_id)
+
+
+def hide(instance, tenant_id):
+    """
+    Hides instance, one of the base tenant's instances, from tenant_id, as if the tenant had deleted it.
+    """
+    from models import BaseTenantLink
+    BaseTenantLink.objects.using(instance._state.db).get_or_create(
+        tenant_id=tenant_id, model=get_model_label(instance.__class__), base_pk=instance.pk,
+    )
+    bump_generation(instance.__class__, tenant_id)
+
+
+class CopyOnWriteQuerySet(QuerySet):
+    """
+    The queryset returned by tenant_objects for copy-on-write models.  Updates and deletes never touch
+    the base tenant's instances; they're copied or hidden instead.
+    """
+    def _shared(self):
+        """
+        Returns (tenant id, the base tenant's instances to copy or hide, the queryset to change in place).
+        The base tenant changes its own instances in place.
+        """
+        tenant_id = get_current_tenant_id()
+        if tenant_id == BASE_TENANT_ID:
+            return tenant_id, [], self
+        return tenant_id, list(self.filter(tenant=BASE_TENANT_ID)), self.exclude(tenant=BASE_TENANT_ID)
+
+    def delete(self):
+        tenant_id, shared, own = self._shared()
+        for instance in shared:
+            hide(instance, tenant_id)
+        QuerySet.delete(own)
+    delete.alters_data = True
+
+    def update(self, **kwargs):
+        tenant_id, shared, own = self._shared()
+        updated = QuerySet.update(own, **kwargs)
+        if shared:
+            # Only now make the copies, so they're not updated twice.
+            for instance in shared:
+                materialize(instance, tenant_id)
+            copies = self.model._base_manager.db_manager(self.db).filter(pk__in=[instance.pk for instance in shared])
+            updated += copies.update(**kwargs)
+        return updated
+    update.alters_data = True
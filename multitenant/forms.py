@@ -12,25 +12,67 @@ example:
             model = Company
 
 Note that we don't need to worry about filtering the options available for each form field.
+
+The list of options for each of those fields is read from the database every time a form is rendered.
+For forms that are rendered often, or formsets with many rows, set cache_tenant_choices to keep the
+lists in django's cache; they're dropped as soon as an instance of the model is saved or deleted for
+that tenant:
+
+    class CompanyForm(TenantModelForm):
+        cache_tenant_choices = True
+
+        class Meta:
+            model = Company
 """
 
+from hashlib import md5
+
 from django import forms
+from django.core.cache import cache
+
+from copyonwrite import tenant_q
+from generations import get_generation
+from middleware import get_current_tenant, get_current_tenant_id
+from registry import is_tenant_model
+from settings import TENANT_CHOICES_CACHE_TIMEOUT
 
-from middleware import get_current_tenant
+
+def get_cached_choices(field, tenant_id):
+    """
+    The choices of a ModelChoiceField (or ModelMultipleChoiceField) whose queryset is filtered by tenant,
+    from the cache if they're there.
+    """
+    model_class = field.queryset.model
+    query = '%s.%s|%s|%s' % (field.__class__.__module__, field.__class__.__name__, field.empty_label, field.queryset.query)
+    key = 'multitenant:choices:%s.%s:%s:%s:%s' % (
+        model_class._meta.app_label, model_class._meta.object_name.lower(), tenant_id,
+        get_generation(model_class, tenant_id), md5(query.encode('utf-8')).hexdigest(),
+    )
+    choices = cache.get(key)
+    if choices is None:
+        choices = list(field.choices)
+        cache.set(key, choices, TENANT_CHOICES_CACHE_TIMEOUT)
+    return choices
 
 
 class TenantModelForm(forms.ModelForm):
+    # Set to True to keep the choices of the tenant-filtered fields in the cache.
+    cache_tenant_choices = False
+
     def __init__(self, *args, **kwargs):
         super(TenantModelForm, self).__init__(*args, **kwargs)
 
-        tenant = get_current_tenant()
-        if tenant:
+        tenant_id = get_current_tenant_id()
+        if tenant_id:
             for field in self.fields.values():
                 if isinstance(field, (forms.ModelChoiceField, forms.ModelMultipleChoiceField,)):
-                    # Check if the model being used for the ModelChoiceField has a tenant model field
-                    if hasattr(field.queryset.model, 'tenant'):
+                    # Check if the model being used for the ModelChoiceField is tenant-aware
+                    if is_tenant_model(field.queryset.model):
                         # Add filter restricting queryset to values to this tenant only.
-                        field.queryset = field.queryset.filter(tenant=tenant)
+                        field.queryset = field.queryset.filter(tenant_q(field.queryset.model, tenant_id))
+                        if self.cache_tenant_choices:
+                            # Only rendering uses the choices; validation still goes through the queryset.
+                            field.choices = get_cached_choices(field, tenant_id)
                 
     def clean(self):
         cleaned_data = super(TenantModelForm, self).clean()
@@ -0,0 +1,58 @@
+"""
+Per-tenant, per-model generation counters, kept in django's cache so that every process sees them.
+
+A generation is bumped whenever an instance of a tenant-aware model is saved or deleted (see the signal
+handlers in models.py, and the bulk methods of TenantMgr).  Anything cached on behalf of a tenant and
+model should include the current generation in its cache key: after a change, the old entries are
+simply never found again, and expire on their own.
+
+example:
+
+    from multitenant.generations import get_generation
+
+    key = 'bug-types:%s:%s' % (tenant_id, get_generation(BugReportType, tenant_id))
+"""
+
+import time
+
+from django.core.cache import cache
+
+# Counters are kept for as long as memcached allows (30 days); they're only ever read through get_generation().
+GENERATION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def _key(model_class, tenant_id):
+    return 'multitenant:generation:%s.%s:%s' % (
+        model_class._meta.app_label, model_class._meta.object_name.lower(), tenant_id)
+
+
+def _initial():
+    # If a counter gets evicted from the cache, it must not start over at a value that was used before.
+    return int(time.time() * 1000000)
+
+
+def get_generation(model_class, tenant_id):
+    key = _key(model_class, tenant_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, _initial(), GENERATION_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(model_class, tenant_id):
+    key = _key(model_class, tenant_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # incr() raises ValueError when the key is missing.
+        cache.set(key, _initial(), GENERATION_TIMEOUT)
+
+
+def get_generations(model_class, tenant_ids):
+    """
+    {tenant id: generation} of model_class for tenant_ids, with a single cache query.
+    Counters that aren't in the cache are left out.
+    """
+    keys = dict((_key(model_class, tenant_id), tenant_id) for tenant_id in tenant_ids)
+    return dict((keys[key], generation) for key, generation in cache.get_many(keys.keys()).items())
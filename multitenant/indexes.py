@@ -0,0 +1,168 @@
+"""
+Finding the composite indexes that tenant-aware models are missing.
+
+TenantModel's foreign key gives every table an index on tenant_id alone.  But tenant_objects filters every query
+by tenant, and then orders or filters on other columns: without an index that starts with tenant_id and goes on
+with those columns, the database either reads all of the tenant's rows, or walks an index over all tenants' rows.
+
+For each tenant-aware model, the indexes it should have are worked out from its declaration:
+
+- its Meta.ordering:                        (tenant_id, <ordering columns>)
+- each unique_together that has the tenant: (tenant_id, <the other columns>), unless tenant comes first already
+- each field with db_index=True:            (tenant_id, <column>)
+
+An index that one of its longer siblings starts with is left out.  Those that no existing index starts with are
+reported, and can be written out as South migrations:
+
+    ./manage.py tenant_indexes
+    ./manage.py tenant_indexes bugs --migrations
+    ./manage.py tenant_indexes --fail      # exits with an error if any are missing, e.g. in CI
+
+example:
+
+    from multitenant.indexes import missing_indexes
+
+    for model_class, columns in missing_indexes():
+        print model_class._meta.db_table, columns
+"""
+
+from django.db import connections, DEFAULT_DB_ALIAS
+from django.db.models.fields import FieldDoesNotExist
+
+from registry import get_plan
+
+
+def _column(model_class, name):
+    try:
+        field = model_class._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    return field.column
+
+
+def wanted_indexes(model_class):
+    """
+    The indexes model_class should have, as tuples of column names starting with tenant_id.
+    """
+    opts = model_class._meta
+    tenant_column = opts.get_field('tenant').column
+    wanted = []
+
+    columns = []
+    for name in opts.ordering:
+        name = name.lstrip('-')
+        if name == 'pk':
+            name = opts.pk.name
+        column = _column(model_class, name)
+        if column is None or column == tenant_column:
+            # Ordering by a related model's field, or randomly: the index can't help from there on.
+            break
+        columns.append(column)
+    if columns:
+        wanted.append(tuple([tenant_column] + columns))
+
+    for names in opts.unique_together:
+        if 'tenant' in names and names[0] != 'tenant':
+            others = [_column(model_class, name) for name in names if name != 'tenant']
+            wanted.append(tuple([tenant_column] + [column for column in others if column]))
+
+    for field in opts.local_fields:
+        if field.db_index and not field.unique and not field.rel and field.column != tenant_column:
+            wanted.append((tenant_column, field.column))
+
+    # An index on (a, b, c) serves queries on (a, b) just as well.
+    wanted.sort(key=len, reverse=True)
+    kept = []
+    for columns in wanted:
+        if len(columns) > 1 and not [other for other in kept if other[:len(columns)] == columns]:
+            kept.append(columns)
+    return kept
+
+
+def get_index_columns(table, using=DEFAULT_DB_ALIAS):
+    """
+    The indexes (unique constraints and primary key included) on table, as tuples of column names.
+    """
+    connection = connections[using]
+    cursor = connection.cursor()
+    if hasattr(connection.introspection, 'get_constraints'):
+        constraints = connection.introspection.get_constraints(cursor, table)
+        return [tuple(constraint['columns']) for constraint in constraints.values()
+                if constraint['index'] or constraint['unique'] or constraint['primary_key']]
+
+    quote_name = connection.ops.quote_name
+    if connection.vendor == 'sqlite':
+        cursor.execute('PRAGMA index_list(%s)' % quote_name(table))
+        indexes = []
+        for row in cursor.fetchall():
+            cursor.execute('PRAGMA index_info(%s)' % quote_name(row[1]))
+            indexes.append(tuple(column for seqno, cid, column in sorted(cursor.fetchall())))
+        return indexes
+    if connection.vendor == 'postgresql':
+        cursor.execute('SELECT attnum, attname FROM pg_attribute WHERE attrelid = %s::regclass', [quote_name(table)])
+        names = dict(cursor.fetchall())
+        cursor.execute('SELECT indkey FROM pg_index WHERE indrelid = %s::regclass', [quote_name(table)])
+        return [tuple(names[int(number)] for number in str(row[0]).split() if int(number))
+                for row in cursor.fetchall()]
+    if connection.vendor == 'mysql':
+        cursor.execute('SHOW INDEX FROM %s' % quote_name(table))
+        indexes = {}
+        for row in cursor.fetchall():
+            indexes.setdefault(row[2], []).append((row[3], row[4]))
+        return [tuple(column for seq, column in sorted(columns)) for columns in indexes.values()]
+    raise NotImplementedError('Reading the indexes of a %s database is not supported.' % connection.vendor)
+
+
+def missing_indexes(model_classes=None, using=DEFAULT_DB_ALIAS):
+    """
+    The wanted indexes that no existing index starts with, as a list of (model class, columns).
+    """
+    if model_classes is None:
+        model_classes = get_plan()
+    missing = []
+    for model_class in model_classes:
+        wanted = wanted_indexes(model_class)
+        if not wanted:
+            continue
+        existing = get_index_columns(model_class._meta.db_table, using)
+        for columns in wanted:
+            if not [index for index in existing if index[:len(columns)] == columns]:
+                missing.append((model_class, columns))
+    return missing
+
+
+MIGRATION_TEMPLATE = '''# encoding: utf-8
+from south.db import db
+from south.v2 import SchemaMigration
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+%(forwards)s
+
+    def backwards(self, orm):
+%(backwards)s
+
+    models = %(frozen_models)s
+
+    complete_apps = [%(app_label)r]
+'''
+
+
+def make_migration(app_label, missing):
+    """
+    The source of a South migration adding the missing indexes, a list of (model class, columns), with the
+    app's models frozen as schemamigration would.
+    """
+    from south.creator.freezer import freeze_apps_to_string
+    forwards, backwards = [], []
+    for model_class, columns in missing:
+        table = model_class._meta.db_table
+        forwards.append('        db.create_index(%r, %r)' % (table, list(columns)))
+        backwards.append('        db.delete_index(%r, %r)' % (table, list(columns)))
+    return MIGRATION_TEMPLATE % {
+        'app_label': app_label,
+        'forwards': '\n'.join(forwards) or '        pass',
+        'backwards': '\n'.join(reversed(backwards)) or '        pass',
+        'frozen_models': freeze_apps_to_string([app_label]),
+    }
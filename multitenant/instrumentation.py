@@ -0,0 +1,223 @@
+"""
+Counting and timing queries and requests per tenant, to find out which tenants load the database.
+
+    TENANT_INSTRUMENTATION = True
+
+Every query is counted and timed against the current tenant and the model whose table it reads or writes (as far
+as the SQL tells), and every request that goes through the ThreadLocals middleware against its tenant.  The counters
+are kept in memory, and every TENANT_STATS_FLUSH_INTERVAL seconds each process sends the stats_flushed signal with
+them, then adds them to the TenantStats table, one row per hour, tenant and model.  To see them:
+
+    ./manage.py tenant_stats --hours=24
+
+To send the numbers somewhere else (statsd, logs, ...), connect to the signal:
+
+    from multitenant.instrumentation import stats_flushed
+
+    def send(sender, stats, **kwargs):
+        for (tenant_id, model), (queries, sql_time, requests, request_time) in stats.items():
+            ...
+    stats_flushed.connect(send)
+
+Queries are timed with a cursor wrapper, installed on every connection as it opens: connection.execute_wrapper
+where django has it, otherwise the hook django uses for its debug cursor.  The overhead is a couple of clock
+reads, a regular expression and a dictionary update per query.
+"""
+
+import datetime
+import logging
+import re
+import threading
+import time
+
+from django.db import connections, transaction, DatabaseError, IntegrityError
+from django.db.backends.signals import connection_created
+from django.db.models import F, get_models
+from django.dispatch import Signal
+
+from middleware import peek_current_tenant_id
+from registry import get_model_label
+from settings import TENANT_INSTRUMENTATION, TENANT_STATS_FLUSH_INTERVAL
+
+logger = logging.getLogger('multitenant')
+
+stats_flushed = Signal(providing_args=['stats'])
+
+# The first table named in a query.
+_table_re = re.compile(r'\b(?:FROM|INTO|UPDATE)\s+[`"\[]?(\w+)', re.IGNORECASE)
+
+_lock = threading.Lock()
+_stats = {}
+_last_flush = [time.time()]
+_local = threading.local()
+_tables = {}
+
+
+def _model_for_sql(sql):
+    match = _table_re.search(sql)
+    if match is None:
+        return ''
+    if not _tables:
+        for model_class in get_models(include_auto_created=True):
+            _tables[model_class._meta.db_table] = get_model_label(model_class)
+    return _tables.get(match.group(1), match.group(1))
+
+
+def _add(tenant_id, model, queries=0, sql_time=0.0, requests=0, request_time=0.0):
+    key = (tenant_id, model)
+    with _lock:
+        counters = _stats.get(key)
+        if counters is None:
+            counters = _stats[key] = [0, 0.0, 0, 0.0]
+        counters[0] += queries
+        counters[1] += sql_time
+        counters[2] += requests
+        counters[3] += request_time
+
+
+def record_query(sql, duration):
+    if getattr(_local, 'paused', False):
+        return
+    _add(peek_current_tenant_id(), _model_for_sql(sql), queries=1, sql_time=duration)
+
+
+def record_request(tenant_id, duration):
+    _add(tenant_id, '', requests=1, request_time=duration)
+
+
+class _TimingCursor(object):
+    """
+    Wraps a cursor, timing execute() and executemany().
+    """
+    def __init__(self, cursor):
+        self.cursor = cursor
+
+    def execute(self, sql, params=()):
+        start = time.time()
+        try:
+            return self.cursor.execute(sql, params)
+        finally:
+            record_query(sql, time.time() - start)
+
+    def executemany(self, sql, param_list):
+        start = time.time()
+        try:
+            return self.cursor.executemany(sql, param_list)
+        finally:
+            record_query(sql, time.time() - start)
+
+    def __getattr__(self, attr):
+        return getattr(self.cursor, attr)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    start = time.time()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        record_query(sql, time.time() - start)
+
+
+def instrument(sender, connection, **kwargs):
+    """
+    Installs the timing cursor on a connection.  Connected to connection_created when instrumentation is on.
+    """
+    if getattr(connection, '_multitenant_instrumented', False):
+        return
+    connection._multitenant_instrumented = True
+    if hasattr(connection, 'execute_wrappers'):
+        connection.execute_wrappers.append(_execute_wrapper)
+        return
+
+    # Older django: every cursor goes through make_debug_cursor() when use_debug_cursor is set.
+    use_debug_cursor = connection.use_debug_cursor
+    make_debug_cursor = connection.make_debug_cursor
+
+    def make_cursor(cursor):
+        from django.conf import settings
+        from django.db.backends.util import CursorWrapper
+        if use_debug_cursor or (use_debug_cursor is None and settings.DEBUG):
+            wrapped = make_debug_cursor(cursor)
+        else:
+            wrapped = CursorWrapper(cursor, connection)
+        return _TimingCursor(wrapped)
+
+    connection.use_debug_cursor = True
+    connection.make_debug_cursor = make_cursor
+
+
+def flush(force=False):
+    """
+    Sends stats_flushed with the counters gathered since the last flush, and adds them to TenantStats.
+    Does nothing if the last flush was less than TENANT_STATS_FLUSH_INTERVAL seconds ago, unless force is set.
+    """
+    global _stats
+    from models import TenantStats
+
+    now = time.time()
+    with _lock:
+        if not force and now - _last_flush[0] < TENANT_STATS_FLUSH_INTERVAL:
+            return
+        stats, _stats = _stats, {}
+        _last_flush[0] = now
+    if not stats:
+        return
+
+    stats_flushed.send(sender=TenantStats, stats=stats)
+
+    hour = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+    # Writing the stats shouldn't count as load.
+    _local.paused = True
+    try:
+        items = stats.items()
+        for i, ((tenant_id, model), counters) in enumerate(items):
+            try:
+                _save(hour, tenant_id, model, *counters)
+            except DatabaseError:
+                # The stats must never fail the request they're flushed from.  Keep what wasn't written for
+                # the next flush.
+                logger.exception('Could not write the tenant stats; will try again.')
+                transaction.rollback_unless_managed()
+                for (tenant_id, model), (queries, sql_time, requests, request_time) in items[i:]:
+                    _add(tenant_id, model, queries, sql_time, requests, request_time)
+                break
+    finally:
+        _local.paused = False
+
+
+def _save(hour, tenant_id, model, queries, sql_time, requests, request_time):
+    from models import TenantStats
+    rows = TenantStats.objects.filter(hour=hour, tenant_id=tenant_id, model=model)
+    increments = dict(queries=F('queries') + queries, sql_time=F('sql_time') + sql_time,
+                      requests=F('requests') + requests, request_time=F('request_time') + request_time)
+    if rows.update(**increments):
+        return
+    # Like get_or_create(): another process may create the row between the update and the insert.
+    sid = transaction.savepoint()
+    try:
+        TenantStats.objects.create(hour=hour, tenant_id=tenant_id, model=model, queries=queries,
+                                   sql_time=sql_time, requests=requests, request_time=request_time)
+        transaction.savepoint_commit(sid)
+    except IntegrityError:
+        transaction.savepoint_rollback(sid)
+        rows.update(**increments)
+
+
+def get_stats():
+    """
+    The counters gathered by this process since the last flush, as {(tenant id, model label): [queries,
+    sql time, requests, request time]}.
+    """
+    with _lock:
+        return dict((key, list(counters)) for key, counters in _stats.items())
+
+
+if TENANT_INSTRUMENTATION:
+    connection_created.connect(instrument)
+    # Connections opened before this module was imported.
+    for alias in connections:
+        if connections[alias].connection is not None:
+            instrument(None, connections[alias])
@@ -0,0 +1,153 @@
+"""
+Finding references from one tenant's instances to another tenant's.
+
+Nothing in the database stops an instance of a tenant-aware model from pointing at another tenant's instance,
+through a foreign key or a many-to-many link.  Checking instance by instance is far too slow on big tables, so
+each relation between tenant-aware models is checked with a single join, in SQL:
+
+    SELECT COUNT(*) FROM bugs_bugreport r INNER JOIN bugs_component c ON r.component_id = c.id
+    WHERE r.tenant_id <> c.tenant_id
+
+References to the base tenant's instances of copy-on-write models are shared on purpose, and are not counted.
+
+    ./manage.py tenant_integrity
+    ./manage.py tenant_integrity --fix --batch-size=1000
+
+With --fix, nullable foreign keys to another tenant's instances are set to NULL and cross-tenant many-to-many
+links are deleted, a batch at a time; foreign keys that can't be NULL are only reported.  With sharding, each
+database is checked on its own (--database): a join can't follow a reference to another database.
+
+example:
+
+    from multitenant.integrity import check_integrity
+
+    for relation, count, sample in check_integrity():
+        print relation, count
+"""
+
+import time
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from copyonwrite import is_copy_on_write
+from generations import bump_generation
+from registry import get_foreign_keys, get_m2m_fields, get_plan, is_tenant_model
+from settings import BASE_TENANT_ID, BULK_BATCH_SIZE
+
+
+class Relation(object):
+    """
+    A foreign key, or a many-to-many field, between two tenant-aware models.
+    """
+    def __init__(self, model_class, field):
+        self.model_class = model_class
+        self.field = field
+        self.many_to_many = field in model_class._meta.many_to_many
+
+    def __repr__(self):
+        return '<Relation %s.%s.%s>' % (self.model_class._meta.app_label, self.model_class._meta.object_name, self.field.name)
+
+    @property
+    def nullable(self):
+        return self.many_to_many or self.field.null
+
+    def _from_where(self, qn):
+        """
+        The FROM and WHERE clauses selecting the cross-tenant references, and the key of each.
+        """
+        source = self.model_class._meta
+        target = self.field.rel.to._meta
+        source_tenant = qn(source.get_field('tenant').column)
+        target_tenant = qn(target.get_field('tenant').column)
+        if self.many_to_many:
+            through = self.field.rel.through._meta
+            source_column = through.get_field(self.field.m2m_field_name()).column
+            target_column = through.get_field(self.field.m2m_reverse_field_name()).column
+            sql = ('FROM %s l INNER JOIN %s s ON l.%s = s.%s INNER JOIN %s t ON l.%s = t.%s WHERE s.%s <> t.%s' % (
+                qn(through.db_table), qn(source.db_table), qn(source_column), qn(source.pk.column),
+                qn(target.db_table), qn(target_column), qn(target.pk.column), source_tenant, target_tenant))
+            key = 'l.%s' % qn(through.pk.column)
+        else:
+            sql = 'FROM %s s INNER JOIN %s t ON s.%s = t.%s WHERE s.%s <> t.%s' % (
+                qn(source.db_table), qn(target.db_table), qn(self.field.column), qn(target.pk.column),
+                source_tenant, target_tenant)
+            key = 's.%s' % qn(source.pk.column)
+        if is_copy_on_write(self.field.rel.to):
+            sql += ' AND t.%s <> %d' % (target_tenant, BASE_TENANT_ID)
+        return sql, key
+
+    def count(self, using=DEFAULT_DB_ALIAS):
+        connection = connections[using]
+        sql, key = self._from_where(connection.ops.quote_name)
+        cursor = connection.cursor()
+        cursor.execute('SELECT COUNT(*) ' + sql)
+        return cursor.fetchone()[0]
+
+    def sample(self, limit, using=DEFAULT_DB_ALIAS):
+        """
+        Up to limit of the cross-tenant references, as (source pk, source tenant, target pk, target tenant).
+        """
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        sql, key = self._from_where(qn)
+        cursor = connection.cursor()
+        cursor.execute('SELECT s.%s, s.%s, t.%s, t.%s %s ORDER BY %s LIMIT %d' % (
+            qn(self.model_class._meta.pk.column), qn(self.model_class._meta.get_field('tenant').column),
+            qn(self.field.rel.to._meta.pk.column), qn(self.field.rel.to._meta.get_field('tenant').column),
+            sql, key, limit))
+        return cursor.fetchall()
+
+    def fix(self, batch_size=BULK_BATCH_SIZE, pause=0, using=DEFAULT_DB_ALIAS):
+        """
+        Removes the cross-tenant references, batch_size at a time.  Returns the number removed.
+        """
+        if not self.nullable:
+            raise ValueError('%s.%s cannot be NULL; fix these references by hand.' % (
+                self.model_class._meta.object_name, self.field.name))
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        sql, key = self._from_where(qn)
+        fixed = 0
+        tenant_ids = set()
+        while True:
+            cursor = connection.cursor()
+            cursor.execute('SELECT %s, s.%s %s LIMIT %d' % (
+                key, qn(self.model_class._meta.get_field('tenant').column), sql, batch_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            pks = [row[0] for row in rows]
+            tenant_ids.update(row[1] for row in rows)
+            with transaction.commit_on_success(using=using):
+                if self.many_to_many:
+                    self.field.rel.through._base_manager.db_manager(using).filter(pk__in=pks).delete()
+                else:
+                    self.model_class._base_manager.db_manager(using).filter(pk__in=pks).update(**{self.field.name: None})
+            fixed += len(pks)
+            if pause:
+                time.sleep(pause)
+        for tenant_id in tenant_ids:
+            bump_generation(self.model_class, tenant_id)
+        return fixed
+
+
+def get_relations():
+    """
+    Every foreign key and many-to-many field between tenant-aware models, in dependency order.
+    """
+    relations = []
+    for model_class in get_plan():
+        for field in get_foreign_keys(model_class) + get_m2m_fields(model_class):
+            if is_tenant_model(field.rel.to):
+                relations.append(Relation(model_class, field))
+    return relations
+
+
+def check_integrity(relations=None, limit=10, using=DEFAULT_DB_ALIAS):
+    """
+    Yields (relation, count, sample) for each relation that has cross-tenant references.
+    """
+    for relation in relations or get_relations():
+        count = relation.count(using)
+        if count:
+            yield relation, count, relation.sample(limit, using)
@@ -0,0 +1,58 @@
+"""
+A small in-process cache, bounded in size and in age of its entries.
+It's used to keep things like the current tenant around between requests without hitting the db.
+"""
+
+import time
+from collections import OrderedDict
+from threading import Lock
+
+
+class LRUCache(object):
+    """
+    Keeps at most max_size entries, dropping the least recently used one first.
+    Entries older than timeout seconds are discarded; a timeout of None means they never expire.
+
+    example:
+        cache = LRUCache(max_size=1000, timeout=300)
+        cache.set('key', value)
+        value = cache.get('key')    # None if missing or expired
+    """
+    def __init__(self, max_size=1000, timeout=None):
+        self.max_size = max_size
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, expires = self._data.pop(key)
+            except KeyError:
+                return default
+            if expires is not None and expires < time.time():
+                return default
+            # Re-insert, so this key becomes the most recently used one.
+            self._data[key] = (value, expires)
+            return value
+
+    def set(self, key, value):
+        expires = None
+        if self.timeout is not None:
+            expires = time.time() + self.timeout
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, expires)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
@@ -0,0 +1,42 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from multitenant.archive import archive_tenant, dormant_tenants, rehydrate_tenant
+from multitenant.models import Tenant
+
+
+class Command(BaseCommand):
+    args = '[<tenant id> ...]'
+    help = 'Moves the instances of dormant tenants to TENANT_ARCHIVE_DATABASE, or brings them back with --rehydrate.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--inactive-days', type='int', dest='inactive_days', default=None,
+            help='Archive every tenant none of whose users has logged in for this many days.'),
+        make_option('--rehydrate', action='store_true', dest='rehydrate', default=False,
+            help='Bring the given tenants back from the archive instead.'),
+        make_option('--pause', type='float', dest='pause', default=0,
+            help='Seconds to wait between batches of deletes.'),
+    )
+
+    def handle(self, *args, **options):
+        tenant_ids = [int(tenant_id) for tenant_id in args]
+        if options['inactive_days'] is not None:
+            if options['rehydrate']:
+                raise CommandError('--inactive-days and --rehydrate don\'t go together.')
+            tenant_ids.extend(dormant_tenants(options['inactive_days']).values_list('pk', flat=True))
+        if not tenant_ids:
+            raise CommandError('Give tenant ids, or --inactive-days.')
+
+        for tenant_id in tenant_ids:
+            tenant = Tenant.objects.get(pk=tenant_id)
+            if options['rehydrate']:
+                if tenant.archived:
+                    count = rehydrate_tenant(tenant, options['pause'])
+                    self.stdout.write('Rehydrated %s instances of tenant %s\n' % (count, tenant_id))
+            elif not tenant.archived:
+                try:
+                    count = archive_tenant(tenant, options['pause'])
+                except ValueError as e:
+                    raise CommandError(str(e))
+                self.stdout.write('Archived %s instances of tenant %s\n' % (count, tenant_id))
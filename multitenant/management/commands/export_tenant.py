@@ -0,0 +1,36 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from multitenant.models import Tenant
+from multitenant.transfer import export_tenant, open_file
+
+
+class Command(BaseCommand):
+    args = '<tenant id> <file>'
+    help = 'Writes all of a tenant\'s instances to a file (compressed if it ends with .gz, - for stdout).'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--database', dest='database', default=None,
+            help='Database to read from; by default, the tenant\'s own.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: export_tenant %s' % self.args)
+        tenant_id, filename = args
+        try:
+            tenant = Tenant.objects.get(pk=tenant_id)
+        except Tenant.DoesNotExist:
+            raise CommandError('Tenant %s does not exist.' % tenant_id)
+
+        if filename == '-':
+            export_tenant(tenant, sys.stdout, options['database'])
+            return
+        out = open_file(filename, 'wb')
+        try:
+            count = export_tenant(tenant, out, options['database'])
+        finally:
+            out.close()
+        self.stdout.write('Exported %s instances of tenant %s\n' % (count, tenant.pk))
@@ -0,0 +1,55 @@
+import sys
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from multitenant.models import Tenant
+from multitenant.transfer import import_tenant, open_file, read_header
+
+
+class Command(BaseCommand):
+    args = '<file> [<tenant id>]'
+    help = ('Adds the instances from a file written by export_tenant to a tenant.  Without a tenant id, '
+            'a new tenant is created for them, without cloning the base tenant.')
+
+    option_list = BaseCommand.option_list + (
+        make_option('--name', dest='name', default=None,
+            help='Name of the new tenant; by default, the exported tenant\'s name.'),
+        make_option('--database', dest='database', default=None,
+            help='Database to write to; by default, the tenant\'s own.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) not in (1, 2):
+            raise CommandError('Usage: import_tenant %s' % self.args)
+        filename = args[0]
+        if filename == '-' and len(args) == 1:
+            # The header that names the new tenant would be read off the stream before the import.
+            raise CommandError('Give the id of the tenant to import into when reading from standard input.')
+
+        if len(args) == 2:
+            try:
+                tenant = Tenant.objects.get(pk=args[1])
+            except Tenant.DoesNotExist:
+                raise CommandError('Tenant %s does not exist.' % args[1])
+        else:
+            source = open_file(filename)
+            try:
+                header = read_header(source)
+            except ValueError as e:
+                raise CommandError(str(e))
+            finally:
+                source.close()
+            tenant = Tenant(name=options['name'] or header['name'], email=header['email'])
+            # A raw save, so that the base tenant isn't cloned into it.
+            tenant.save_base(raw=True, using=DEFAULT_DB_ALIAS)
+
+        source = sys.stdin if filename == '-' else open_file(filename)
+        try:
+            count = import_tenant(source, tenant, options['database'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            source.close()
+        self.stdout.write('Imported %s instances into tenant %s\n' % (count, tenant.pk))
@@ -0,0 +1,23 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+
+from multitenant.metering import prune_snapshots, take_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Counts the rows of every tenant-aware model for every tenant, into TenantUsage.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--full', action='store_true', dest='full', default=False,
+            help='Count every model, even those that haven\'t changed since the last snapshot.'),
+        make_option('--keep-days', type='int', dest='keep_days', default=None,
+            help='Delete the snapshots older than this many days, except the latest of each model.'),
+    )
+
+    def handle(self, *args, **options):
+        counted = take_snapshot(full=options['full'])
+        self.stdout.write('Counted %s models: %s\n' % (len(counted), ', '.join(counted)))
+        if options['keep_days'] is not None:
+            deleted = prune_snapshots(options['keep_days'])
+            self.stdout.write('Deleted %s old counts\n' % deleted)
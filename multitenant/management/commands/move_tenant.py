@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from multitenant.routers import move_tenant
+
+
+class Command(BaseCommand):
+    args = '<tenant id> <database>'
+    help = 'Moves all of a tenant\'s instances to another database, and places the tenant there.'
+
+    def handle(self, *args, **options):
+        if len(args) != 2:
+            raise CommandError('Usage: move_tenant %s' % self.args)
+        tenant_id, database = args
+        if database not in connections.databases:
+            raise CommandError('Unknown database "%s".' % database)
+        try:
+            moved = move_tenant(int(tenant_id), database)
+        except ValueError as e:
+            raise CommandError(str(e))
+        self.stdout.write('Moved %s instances of tenant %s to %s\n' % (moved, tenant_id, database))
@@ -0,0 +1,31 @@
+import time
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from multitenant.provisioning import provision_waiting_tenants
+
+
+class Command(BaseCommand):
+    help = 'Gives new tenants their copy of the base tenant, when TENANT_PROVISIONING is "queue" or "thread".'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--loop', action='store_true', dest='loop', default=False,
+            help='Keep looking for new tenants instead of stopping when none are left.'),
+        make_option('--interval', type='float', dest='interval', default=5,
+            help='Seconds to wait between looks, with --loop.'),
+        make_option('--retry-failed', action='store_true', dest='retry_failed', default=False,
+            help='Also retry the tenants whose provisioning failed.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='Database to use.'),
+    )
+
+    def handle(self, *args, **options):
+        while True:
+            done = provision_waiting_tenants(options['retry_failed'], options['database'])
+            for tenant_id in done:
+                self.stdout.write('Provisioned tenant %s\n' % tenant_id)
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
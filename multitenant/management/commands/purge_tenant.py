@@ -0,0 +1,43 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+
+from multitenant.models import Tenant
+from multitenant.purge import purge_tenant
+from multitenant.registry import get_model_label
+
+
+class Command(BaseCommand):
+    args = '<tenant id>'
+    help = 'Deletes a tenant and all of its instances, in batches.  Run it again to resume.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--batch-size', type='int', dest='batch_size', default=None,
+            help='Instances deleted per query; by default TENANT_BULK_BATCH_SIZE.'),
+        make_option('--pause', type='float', dest='pause', default=0,
+            help='Seconds to wait between batches.'),
+        make_option('--noinput', action='store_false', dest='interactive', default=True,
+            help='Do NOT prompt the user for input of any kind.'),
+    )
+
+    def handle(self, *args, **options):
+        if len(args) != 1:
+            raise CommandError('Usage: purge_tenant %s' % self.args)
+        tenant_id = int(args[0])
+        tenant = Tenant.objects.filter(pk=tenant_id)
+        if options['interactive']:
+            name = tenant[0].name if tenant else tenant_id
+            confirm = raw_input('This will delete tenant "%s" and ALL of its data.  Type \'yes\' to continue: ' % name)
+            if confirm != 'yes':
+                raise CommandError('Purge cancelled.')
+
+        kwargs = {'pause': options['pause']}
+        if options['batch_size']:
+            kwargs['batch_size'] = options['batch_size']
+        try:
+            counts = purge_tenant(tenant_id, **kwargs)
+        except ValueError as e:
+            raise CommandError(str(e))
+        for model_class, deleted in sorted(counts.items(), key=lambda item: get_model_label(item[0])):
+            if deleted:
+                self.stdout.write('%s: %s deleted\n' % (get_model_label(model_class), deleted))
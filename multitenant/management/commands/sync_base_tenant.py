@@ -0,0 +1,24 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from multitenant.registry import get_model_label
+from multitenant.sync import sync_base_tenant
+
+
+class Command(BaseCommand):
+    help = 'Gives existing tenants the base tenant instances added or changed since the last sync.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--adopt', action='store_true', dest='adopt', default=False,
+            help='Also sync tenants created before their instances were linked to the base tenant, from now on.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='Database to use.'),
+    )
+
+    def handle(self, *args, **options):
+        counts = sync_base_tenant(options['adopt'], options['database'])
+        for model_class, (inserted, updated) in sorted(counts.items(), key=lambda item: get_model_label(item[0])):
+            if inserted or updated:
+                self.stdout.write('%s: %s inserted, %s updated\n' % (get_model_label(model_class), inserted, updated))
@@ -0,0 +1,57 @@
+from optparse import make_option
+
+from django.core.management import get_commands
+from django.core.management.base import BaseCommand, CommandError
+
+from multitenant.batch import CommandJob, for_each_tenant, get_tenants
+
+
+def _ids(value):
+    if not value:
+        return None
+    return [int(tenant_id) for tenant_id in value.split(',')]
+
+
+class Command(BaseCommand):
+    args = '<command> [<argument or option of the command> ...]'
+    help = 'Runs a management command once for every tenant, with that tenant as the current tenant.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--tenants', dest='tenants', default=None,
+            help='Comma-separated ids of the tenants to run for; all of them by default.'),
+        make_option('--exclude', dest='exclude', default=None,
+            help='Comma-separated ids of tenants to leave out.'),
+        make_option('--include-base', action='store_true', dest='include_base', default=False,
+            help='Run for the base tenant too.'),
+        make_option('--include-archived', action='store_true', dest='include_archived', default=False,
+            help='Run for archived tenants too.'),
+        make_option('--workers', type='int', dest='workers', default=1,
+            help='How many tenants to run for at the same time.'),
+        make_option('--processes', action='store_true', dest='processes', default=False,
+            help='Use processes rather than threads for the workers.'),
+    )
+
+    def create_parser(self, prog_name, subcommand):
+        parser = super(Command, self).create_parser(prog_name, subcommand)
+        # Whatever comes after the command's name is for the command.
+        parser.disable_interspersed_args()
+        return parser
+
+    def handle(self, *args, **options):
+        if not args:
+            raise CommandError('Give the name of the command to run.')
+        name, argv = args[0], args[1:]
+        if name not in get_commands():
+            raise CommandError('Unknown command: %r' % name)
+
+        tenants = get_tenants(_ids(options['tenants']), _ids(options['exclude']),
+                              options['include_base'], options['include_archived'])
+
+        def done(tenant_id, ok, value):
+            if not ok:
+                self.stderr.write('Tenant %s failed\n' % tenant_id)
+
+        report = for_each_tenant(CommandJob(name, argv), tenants, options['workers'], options['processes'], done)
+        self.stdout.write(report.summary() + '\n')
+        if report.errors:
+            raise CommandError('%s tenants failed.' % len(report.errors))
@@ -0,0 +1,54 @@
+import os
+import re
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import get_app
+
+from multitenant.indexes import make_migration, missing_indexes
+from multitenant.registry import get_plan
+
+
+class Command(BaseCommand):
+    args = '[<app label> ...]'
+    help = 'Lists the composite (tenant_id, ...) indexes that tenant-aware models are missing.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--migrations', action='store_true', dest='migrations', default=False,
+            help='Write a South migration adding them to each app.'),
+        make_option('--fail', action='store_true', dest='fail', default=False,
+            help='Exit with an error if any are missing.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='The database to look at.'),
+    )
+
+    def handle(self, *app_labels, **options):
+        model_classes = [model_class for model_class in get_plan()
+                         if not app_labels or model_class._meta.app_label in app_labels]
+        missing = missing_indexes(model_classes, options['database'])
+
+        by_app = {}
+        for model_class, columns in missing:
+            by_app.setdefault(model_class._meta.app_label, []).append((model_class, columns))
+            self.stdout.write('%s: (%s)\n' % (model_class._meta.db_table, ', '.join(columns)))
+        if not missing:
+            self.stdout.write('No missing indexes.\n')
+
+        if options['migrations']:
+            for app_label, app_missing in sorted(by_app.items()):
+                self.write_migration(app_label, app_missing)
+
+        if missing and options['fail']:
+            raise CommandError('%s missing indexes.' % len(missing))
+
+    def write_migration(self, app_label, missing):
+        directory = os.path.join(os.path.dirname(get_app(app_label).__file__), 'migrations')
+        if not os.path.isdir(directory):
+            self.stderr.write('%s has no migrations directory; skipped.\n' % app_label)
+            return
+        numbers = [int(name[:4]) for name in os.listdir(directory) if re.match(r'^\d{4}_.*\.py$', name)]
+        filename = os.path.join(directory, '%04d_tenant_indexes.py' % (max(numbers or [0]) + 1))
+        with open(filename, 'w') as out:
+            out.write(make_migration(app_label, missing))
+        self.stdout.write('Wrote %s\n' % filename)
@@ -0,0 +1,41 @@
+from optparse import make_option
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from multitenant.integrity import check_integrity
+from multitenant.settings import BULK_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = 'Finds foreign keys and many-to-many links from one tenant\'s instances to another tenant\'s.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--fix', action='store_true', dest='fix', default=False,
+            help='Set the nullable foreign keys to NULL, and delete the links.'),
+        make_option('--limit', type='int', dest='limit', default=10,
+            help='How many references to show for each relation.'),
+        make_option('--batch-size', type='int', dest='batch_size', default=BULK_BATCH_SIZE,
+            help='How many references to fix per transaction, with --fix.'),
+        make_option('--pause', type='float', dest='pause', default=0,
+            help='Seconds to wait between batches, with --fix.'),
+        make_option('--database', dest='database', default=DEFAULT_DB_ALIAS,
+            help='The database to check.'),
+    )
+
+    def handle(self, *args, **options):
+        using = options['database']
+        left = 0
+        for relation, count, sample in check_integrity(limit=options['limit'], using=using):
+            opts = relation.model_class._meta
+            self.stdout.write('%s.%s.%s: %s references to other tenants\n' % (
+                opts.app_label, opts.object_name, relation.field.name, count))
+            for source_pk, source_tenant, target_pk, target_tenant in sample:
+                self.stdout.write('    %s (tenant %s) -> %s (tenant %s)\n' % (source_pk, source_tenant, target_pk, target_tenant))
+            if options['fix'] and relation.nullable:
+                fixed = relation.fix(options['batch_size'], options['pause'], using)
+                self.stdout.write('    fixed %s\n' % fixed)
+            else:
+                left += count
+        if left:
+            raise CommandError('%s references to other tenants.' % left)
@@ -0,0 +1,43 @@
+import datetime
+from optparse import make_option
+
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from multitenant.instrumentation import flush
+from multitenant.models import TenantStats
+
+
+class Command(BaseCommand):
+    help = 'Shows the tenants that ran the most queries and requests, from TenantStats.'
+
+    option_list = BaseCommand.option_list + (
+        make_option('--hours', type='int', dest='hours', default=24,
+            help='How far back to look.'),
+        make_option('--tenant', type='int', dest='tenant', default=None,
+            help='Show one tenant, model by model.'),
+        make_option('--limit', type='int', dest='limit', default=20,
+            help='Number of lines to show.'),
+    )
+
+    def handle(self, *args, **options):
+        # Include whatever this process has gathered so far.
+        flush(force=True)
+
+        since = datetime.datetime.now() - datetime.timedelta(hours=options['hours'])
+        stats = TenantStats.objects.filter(hour__gte=since)
+        if options['tenant'] is not None:
+            key = 'model'
+            stats = stats.filter(tenant_id=options['tenant'])
+        else:
+            key = 'tenant_id'
+        rows = stats.values(key).annotate(
+            queries=Sum('queries'), sql_time=Sum('sql_time'),
+            requests=Sum('requests'), request_time=Sum('request_time'),
+        ).order_by('-sql_time')[:options['limit']]
+
+        self.stdout.write('%-40s %10s %10s %10s %12s\n' % (key, 'queries', 'sql (s)', 'requests', 'request (s)'))
+        for row in rows:
+            self.stdout.write('%-40s %10d %10.3f %10d %12.3f\n' % (
+                row[key] if row[key] not in (None, '') else '-',
+                row['queries'], row['sql_time'], row['requests'], row['request_time']))
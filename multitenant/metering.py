@@ -0,0 +1,178 @@
+"""
+Metering how many rows, and roughly how much storage, each tenant uses, for billing and capacity planning.
+
+take_snapshot() counts the rows of every tenant-aware model with a single GROUP BY tenant_id query per model
+(and per database, with sharding), and stores the counts as TenantUsage rows.  Models whose instances haven't changed
+since the last snapshot, going by their generation for every tenant (see multitenant.generations), are skipped:
+their last counts stand.  That makes it cheap enough to run every hour:
+
+    ./manage.py meter_tenants
+    ./manage.py meter_tenants --full --keep-days=90
+
+Changes that don't bump the generations (raw SQL, QuerySet.update() outside of tenant_objects...) are only counted
+by a full snapshot.
+
+Where the database can tell how big a table is (postgresql, mysql), each tenant's share of it is estimated in
+proportion to its rows.
+
+example:
+
+    from multitenant.metering import get_usage
+
+    usage = get_usage(tenant)           # {model label: (rows, bytes or None)}
+    rows = sum(rows for rows, size in usage.values())
+"""
+
+import datetime
+import hashlib
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+from generations import get_generations
+from lru import LRUCache
+from registry import get_model_label, get_plan
+from settings import BULK_BATCH_SIZE, TENANT_CACHE_SIZE, TENANT_CACHE_TIMEOUT, TENANT_SHARDING
+
+_usage = LRUCache(max_size=TENANT_CACHE_SIZE, timeout=TENANT_CACHE_TIMEOUT)
+
+
+def get_metered_model_classes():
+    """
+    The tenant-aware models that are metered: all of them.
+    """
+    return list(get_plan())
+
+
+def get_databases():
+    """
+    The databases that hold tenants' instances.
+    """
+    databases = set([DEFAULT_DB_ALIAS])
+    if TENANT_SHARDING:
+        from models import TenantPlacement
+        databases.update(TenantPlacement.objects.values_list('database', flat=True).distinct())
+    return sorted(databases)
+
+
+def table_size(table, using=DEFAULT_DB_ALIAS):
+    """
+    The size of table in bytes, indexes included, or None if the database can't tell.
+    """
+    connection = connections[using]
+    cursor = connection.cursor()
+    if connection.vendor == 'postgresql':
+        cursor.execute('SELECT pg_total_relation_size(%s::regclass)', [connection.ops.quote_name(table)])
+    elif connection.vendor == 'mysql':
+        cursor.execute('SELECT data_length + index_length FROM information_schema.tables '
+                       'WHERE table_schema = DATABASE() AND table_name = %s', [table])
+    else:
+        return None
+    row = cursor.fetchone()
+    return row and row[0]
+
+
+def _signature(model_class, tenant_ids):
+    # Every change to a tenant's instances bumps the model's generation for the tenant: if none of them moved,
+    # neither did the counts.  A counter evicted from the cache comes back with a new value, which only gets the
+    # model counted again.  The digest fits in a BigIntegerField.
+    generations = ','.join('%s:%s' % item for item in sorted(get_generations(model_class, tenant_ids).items()))
+    return int(hashlib.md5(generations).hexdigest()[:15], 16)
+
+
+def count_rows(model_class, using=DEFAULT_DB_ALIAS):
+    """
+    The number of rows of model_class in the database using, by tenant id, with a single query.
+    """
+    qn = connections[using].ops.quote_name
+    column = qn(model_class._meta.get_field('tenant').column)
+    cursor = connections[using].cursor()
+    cursor.execute('SELECT %s, COUNT(*) FROM %s GROUP BY %s' % (column, qn(model_class._meta.db_table), column))
+    return dict(cursor.fetchall())
+
+
+def _last_totals():
+    # The latest whole-table row (tenant_id NULL) of each model.
+    from models import TenantUsage
+    latest = TenantUsage.objects.filter(tenant_id=None).values('model').annotate(latest=Max('taken'))
+    return dict((row['model'], TenantUsage.objects.get(tenant_id=None, model=row['model'], taken=row['latest']))
+                for row in latest)
+
+
+def take_snapshot(model_classes=None, full=False):
+    """
+    Counts every tenant's rows of model_classes (every tenant-aware model by default), skipping the models
+    that haven't changed since the last snapshot unless full is set.  Returns the labels of the models counted.
+    """
+    from models import Tenant, TenantUsage
+    if model_classes is None:
+        model_classes = get_metered_model_classes()
+    taken = datetime.datetime.now()
+    last = {} if full else _last_totals()
+    databases = get_databases()
+    tenant_ids = list(Tenant.objects.values_list('pk', flat=True))
+    counted = []
+
+    for model_class in model_classes:
+        label = get_model_label(model_class)
+        signature = _signature(model_class, tenant_ids)
+        previous = last.get(label)
+        if previous is not None and previous.signature == signature:
+            continue
+
+        rows, sizes = {}, {}
+        for using in databases:
+            counts = count_rows(model_class, using)
+            size = table_size(model_class._meta.db_table, using)
+            table_rows = sum(counts.values())
+            for tenant_id, count in counts.items():
+                rows[tenant_id] = rows.get(tenant_id, 0) + count
+                if size is not None and table_rows:
+                    sizes[tenant_id] = sizes.get(tenant_id, 0) + size * count // table_rows
+
+        usages = [TenantUsage(taken=taken, tenant_id=tenant_id, model=label, rows=count, bytes=sizes.get(tenant_id))
+                  for tenant_id, count in rows.items()]
+        # The whole-table row goes last: a snapshot interrupted before it gets redone next time.
+        usages.append(TenantUsage(taken=taken, tenant_id=None, model=label, rows=sum(rows.values()),
+                                  signature=signature, bytes=sum(sizes.values()) if sizes else None))
+        with transaction.commit_on_success():
+            for i in xrange(0, len(usages), BULK_BATCH_SIZE):
+                TenantUsage.objects.bulk_create(usages[i:i + BULK_BATCH_SIZE])
+        counted.append(label)
+
+    _usage.clear()
+    return counted
+
+
+def get_usage(tenant):
+    """
+    The rows, and estimated bytes (None if unknown), of tenant in the latest snapshot of each model,
+    as {model label: (rows, bytes)}.  Kept in memory for TENANT_CACHE_TIMEOUT seconds.
+    """
+    from models import TenantUsage
+    tenant_id = getattr(tenant, 'pk', tenant)
+    usage = _usage.get(tenant_id)
+    if usage is None:
+        usage = {}
+        latest = TenantUsage.objects.filter(tenant_id=None).values('model').annotate(latest=Max('taken'))
+        taken = dict((row['model'], row['latest']) for row in latest)
+        for model, rows, size, when in TenantUsage.objects.filter(
+                tenant_id=tenant_id, taken__in=set(taken.values())).values_list('model', 'rows', 'bytes', 'taken'):
+            if taken.get(model) == when:
+                usage[model] = (rows, size)
+        _usage.set(tenant_id, usage)
+    return usage
+
+
+def prune_snapshots(days):
+    """
+    Deletes the snapshots older than days, except the latest one of each model.  Returns the number of rows deleted.
+    """
+    from models import TenantUsage
+    cutoff = datetime.datetime.now() - datetime.timedelta(days=days)
+    deleted = 0
+    for row in TenantUsage.objects.filter(tenant_id=None).values('model').annotate(latest=Max('taken')):
+        old = TenantUsage.objects.filter(model=row['model'], taken__lt=min(cutoff, row['latest']))
+        deleted += old.count()
+        old.delete()
+    return deleted
@@ -1,10 +1,79 @@
+import time
+from functools import wraps
+
+from django.core.exceptions import PermissionDenied
+from django.utils.importlib import import_module
 
 try:
     from threading import local
 except ImportError:
     from django.utils._threading_local import local
 
-_thread_locals = local()
+try:
+    import contextvars
+except ImportError:
+    contextvars = None
+
+from lru import LRUCache
+from settings import TENANT_CACHE_TIMEOUT, TENANT_CACHE_SIZE, LAZY_TENANT_RESOLUTION, TENANT_INSTRUMENTATION
+from settings import TENANT_RESOLVERS, TENANT_DOMAIN, TENANT_HEADER, TENANT_REHYDRATE_WAIT
+
+
+class _ThreadState(local):
+    """
+    Holds the current user and tenant for the current thread.
+    """
+    def snapshot(self):
+        return dict(self.__dict__)
+
+    def restore(self, values):
+        self.__dict__.clear()
+        self.__dict__.update(values)
+
+
+class _ContextState(object):
+    """
+    Holds the current user and tenant in a context variable, so they follow the current context
+    rather than the OS thread: requests that share a thread (coroutines, greenlets) each see their own.
+    The values are never changed in place; every assignment stores a new dict, so a snapshot is
+    just a reference.
+    """
+    def __init__(self):
+        object.__setattr__(self, '_var', contextvars.ContextVar('multitenant', default={}))
+
+    def __getattr__(self, name):
+        try:
+            return self._var.get()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        values = dict(self._var.get())
+        values[name] = value
+        self._var.set(values)
+
+    def snapshot(self):
+        return self._var.get()
+
+    def restore(self, values):
+        self._var.set(values)
+
+
+if contextvars is not None:
+    _context = _ContextState()
+else:
+    _context = _ThreadState()
+
+# Tenant instances by id, and tenant ids by user id.  Kept up to date by the post_save and post_delete
+# signal handlers in models.py; the timeout covers changes made by other processes.
+_tenants = LRUCache(max_size=TENANT_CACHE_SIZE, timeout=TENANT_CACHE_TIMEOUT)
+_user_tenant_ids = LRUCache(max_size=TENANT_CACHE_SIZE, timeout=TENANT_CACHE_TIMEOUT)
+# Whether each tenant's instances are archived, or on the move (see multitenant.archive), by tenant id.  Read along
+# with the user's tenant id where possible, so that filtering by the tenant id still takes a single query.
+_archived = LRUCache(max_size=TENANT_CACHE_SIZE, timeout=TENANT_CACHE_TIMEOUT)
+
+# Tenant ids by hostname, and when they were read; reloaded when a Tenant changes, or after TENANT_CACHE_TIMEOUT.
+_hostnames = [None, 0]
 
 
 def get_current_user():
@@ -13,7 +82,7 @@ def get_current_user():
     logged in user, even if the request object is not in scope.  The best way to do this is 
     by storing the user object in middleware while processing the request.
     """
-    return getattr(_thread_locals, 'user', None)
+    return getattr(_context, 'user', None)
 
 
 def get_current_tenant():
@@ -22,13 +91,50 @@ def get_current_tenant():
     example:
         tenant = get_current_tenant()
     """
-    tenant = getattr(_thread_locals, 'tenant', None)
+    tenant = getattr(_context, 'tenant', None)
 
     # tenant may not be set yet, if request user is anonymous, or has no profile,
+    # or if the middleware only left us a way to find it.
     if not tenant:
-        set_tenant_to_default()
+        tenant = get_cached_tenant(get_current_tenant_id())
+        _context.tenant = tenant
     
-    return getattr(_thread_locals, 'tenant', None)
+    return tenant
+
+
+def get_current_tenant_id():
+    """
+    To get the id of the current tenant, without loading the Tenant instance.
+    This is all that's needed to filter querysets by tenant.
+    example:
+        bugs = BugReport.objects.filter(tenant=get_current_tenant_id())
+    """
+    tenant = getattr(_context, 'tenant', None)
+    if tenant:
+        return tenant.pk
+
+    tenant_id = getattr(_context, 'tenant_id', None)
+    if tenant_id is None:
+        resolver = getattr(_context, 'tenant_resolver', None)
+        if resolver is not None:
+            tenant_id = resolver()
+        else:
+            from models import BASE_TENANT_ID
+            tenant_id = BASE_TENANT_ID
+        _context.tenant_id = tenant_id
+        _context.tenant_resolver = None
+    return tenant_id
+
+
+def peek_current_tenant_id():
+    """
+    The id of the current tenant if it's already known, or None.  Unlike get_current_tenant_id(), this never
+    runs a lazy resolver, so it's safe to call from code that runs for every query.
+    """
+    tenant = getattr(_context, 'tenant', None)
+    if tenant:
+        return tenant.pk
+    return getattr(_context, 'tenant_id', None)
 
 
 def set_tenant_to_default():
@@ -36,48 +142,298 @@ def set_tenant_to_default():
     Sets the current tenant as per BASE_TENANT_ID.
     """
     # import is done from within the function, to avoid trouble 
-    from models import Tenant, BASE_TENANT_ID
-    set_current_tenant( Tenant.objects.get(id=BASE_TENANT_ID) )
-    
+    from models import BASE_TENANT_ID
+    set_current_tenant( get_cached_tenant(BASE_TENANT_ID) )
+
+
+def get_cached_tenant(tenant_id):
+    """
+    Returns the Tenant with this id, from memory if we've seen it recently.
+    """
+    tenant = _tenants.get(tenant_id)
+    if tenant is None:
+        from models import Tenant
+        tenant = Tenant.objects.get(id=tenant_id)
+        _tenants.set(tenant_id, tenant)
+    return tenant
+
+
+def get_tenant_id_for_user(user):
+    """
+    Returns the id of the Tenant of a logged in user, as per the user profile.
+    Raises ValueError if the user has no profile.
+    """
+    tenant_id = _user_tenant_ids.get(user.pk)
+    if tenant_id is None:
+        from registry import get_profile_class
+        profile_class = get_profile_class()
+        rows = profile_class and list(profile_class.objects.filter(user=user.pk).values_list(
+            'tenant', 'tenant__archived', 'tenant__archive_transition')[:1])
+        if not rows:
+            # If the profile lookup failed, we're in deep doodoo.  It's not 
+            # safe to set a default tenant for this User - it might give access
+            # to the base tenant which is cloned to create all new tenants.
+            raise ValueError(
+                """A User was created with no profile.  For security reasons, 
+                we cannot allow the request to be processed any further.
+                Try deleting this User and creating it again to ensure a 
+                UserProfile gets attached, or link a UserProfile 
+                to this User.""")
+        tenant_id, archived, transition = rows[0]
+        _user_tenant_ids.set(user.pk, tenant_id)
+        _archived.set(tenant_id, bool(archived or transition))
+    return tenant_id
+
+
+def get_tenant_for_user(user):
+    """
+    Returns the Tenant of a logged in user, as per the user profile.
+    Raises ValueError if the user has no profile.
+    """
+    return get_cached_tenant(get_tenant_id_for_user(user))
+
+
+def _rehydrated(tenant_id):
+    """
+    Brings back the instances of an archived tenant before they're needed; see multitenant.archive.
+    """
+    archived = _archived.get(tenant_id)
+    if archived is None:
+        from models import Tenant
+        archived = Tenant.objects.filter(pk=tenant_id).exclude(archived=False, archive_transition='').exists()
+        _archived.set(tenant_id, archived)
+    if archived:
+        from archive import rehydrate_tenant
+        rehydrate_tenant(tenant_id, wait=TENANT_REHYDRATE_WAIT)
+    return tenant_id
+
+
+def _rehydrated_or_default(tenant_id):
+    if tenant_id is None:
+        from models import BASE_TENANT_ID
+        return BASE_TENANT_ID
+    return _rehydrated(tenant_id)
+
+
+def _remember_tenant_id(request, tenant_id):
+    # The tenant of the request, for the middleware whose process_response runs after ThreadLocals has put
+    # the context back, e.g. TenantUpdateCacheMiddleware.
+    request._multitenant_tenant_id = tenant_id
+    return tenant_id
+
+
+def forget_tenant(tenant_id):
+    _tenants.delete(tenant_id)
+    _archived.delete(tenant_id)
+
+
+def forget_user(user_id):
+    _user_tenant_ids.delete(user_id)
+
+
+def forget_hostnames():
+    _hostnames[0] = None
+
+
+def get_hostnames():
+    """
+    The {hostname: tenant id} routing table, read with a single query and then kept in memory.
+    """
+    hostnames, loaded = _hostnames
+    if hostnames is None or (TENANT_CACHE_TIMEOUT is not None and loaded + TENANT_CACHE_TIMEOUT < time.time()):
+        from models import Tenant
+        rows = Tenant.objects.exclude(hostname=None).exclude(hostname='').values_list('hostname', 'pk')
+        hostnames = dict((hostname.lower(), tenant_id) for hostname, tenant_id in rows)
+        _hostnames[:] = [hostnames, time.time()]
+    return hostnames
+
+
+def _check_user(request, tenant_id):
+    # A logged in user only gets to see their own tenant, whatever the host or headers say.
+    user = getattr(request, 'user', None)
+    if user and not user.is_anonymous() and get_tenant_id_for_user(user) != tenant_id:
+        raise PermissionDenied
+    return tenant_id
+
+
+def resolve_by_host(request):
+    """
+    The tenant whose hostname is the request's host: either the whole host (bugs.acme.com), or the
+    subdomain of TENANT_DOMAIN (acme, for acme.example.com with TENANT_DOMAIN = 'example.com').
+    """
+    host = request.get_host().split(':')[0].lower()
+    hostnames = get_hostnames()
+    tenant_id = hostnames.get(host)
+    if tenant_id is None and TENANT_DOMAIN and host.endswith('.' + TENANT_DOMAIN):
+        tenant_id = hostnames.get(host[:-len(TENANT_DOMAIN) - 1])
+    if tenant_id is None:
+        return None
+    return _check_user(request, tenant_id)
+
+
+def resolve_by_header(request):
+    """
+    The tenant id given in the TENANT_HEADER request header.  Only use this behind a proxy that sets
+    the header itself, and strips it from what clients send.
+    """
+    value = request.META.get('HTTP_' + TENANT_HEADER.upper().replace('-', '_'))
+    if not value:
+        return None
+    try:
+        tenant_id = int(value)
+    except ValueError:
+        raise PermissionDenied
+    return _check_user(request, tenant_id)
+
+
+def resolve_by_profile(request):
+    """
+    The tenant of the logged in user, as per the user profile.
+    """
+    user = getattr(request, 'user', None)
+    if user and not user.is_anonymous():
+        return get_tenant_id_for_user(user)
+    return None
+
+
+_resolvers = []
+
+
+def get_tenant_resolvers():
+    """
+    The functions named in TENANT_RESOLVERS.
+    """
+    if not _resolvers:
+        for path in TENANT_RESOLVERS:
+            module, name = path.rsplit('.', 1)
+            _resolvers.append(getattr(import_module(module), name))
+    return _resolvers
+
+
+def resolve_tenant_id(request):
+    """
+    Asks each of the TENANT_RESOLVERS in turn for the request's tenant id; the first one that
+    gives one wins.  Returns None if none of them do.
+    """
+    for resolver in get_tenant_resolvers():
+        tenant_id = resolver(request)
+        if tenant_id is not None:
+            return tenant_id
+    return None
+
 
 def set_current_tenant(tenant):
-    setattr(_thread_locals, 'tenant', tenant)
+    setattr(_context, 'tenant', tenant)
+    setattr(_context, 'tenant_id', None)
+    setattr(_context, 'tenant_resolver', None)
+
+
+def set_current_tenant_id(tenant_id):
+    """
+    Like set_current_tenant, when all you have is the id.  The Tenant instance is only
+    loaded if someone asks for it.
+    """
+    setattr(_context, 'tenant', None)
+    setattr(_context, 'tenant_id', tenant_id)
+    setattr(_context, 'tenant_resolver', None)
+
+
+def set_tenant_resolver(resolver):
+    """
+    Defers finding out the current tenant: resolver is called, with no arguments, the first time
+    the current tenant is needed, and must return the tenant id.
+    """
+    setattr(_context, 'tenant', None)
+    setattr(_context, 'tenant_id', None)
+    setattr(_context, 'tenant_resolver', resolver)
+
+
+class tenant_context(object):
+    """
+    Makes tenant the current tenant for a block of code, then puts back whatever was current before.
+    tenant may be a Tenant instance or a tenant id.  Works as a context manager or as a decorator.
+    example:
+        with tenant_context(tenant):
+            bugs = BugReport.tenant_objects.all()
+
+        @tenant_context(BASE_TENANT_ID)
+        def update_templates():
+            ...
+    """
+    def __init__(self, tenant):
+        self.tenant = tenant
+        self._saved = []
+
+    def __enter__(self):
+        self._saved.append(_context.snapshot())
+        if hasattr(self.tenant, 'pk'):
+            set_current_tenant(self.tenant)
+        else:
+            set_current_tenant_id(self.tenant)
+        return self.tenant
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _context.restore(self._saved.pop())
+
+    def __call__(self, func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            # A fresh instance for every call, so that concurrent calls don't share state.
+            with tenant_context(self.tenant):
+                return func(*args, **kwargs)
+        return inner
 
 
 class ThreadLocals(object):
     """Middleware that gets various objects from the
-    request object and saves them in thread local storage."""
+    request object and saves them for the duration of the request.
+    They're kept in a context variable where available (python 3.7+), otherwise in thread local storage.
+    Whatever was current before the request is put back when the response goes out, so nothing 
+    leaks from one request to the next."""
+
+    # Set TENANT_LAZY_RESOLUTION = True in your settings (or subclass and override) to
+    # look up the tenant only when something asks for it.
+    lazy = LAZY_TENANT_RESOLUTION
+
     def process_request(self, request):
-        _thread_locals.user = getattr(request, 'user', None)
-
-        # Attempt to set tenant
-        if _thread_locals.user and not _thread_locals.user.is_anonymous():
-            try:
-                profile = _thread_locals.user.get_profile()
-                if profile:
-                    _thread_locals.tenant = getattr(profile, 'tenant', None)
-            except:
-                # If the profile lookup failed, we're in deep doodoo.  It's not 
-                # safe to set a default tenant for this User - it might give access
-                # to the base tenant which is cloned to create all new tenants.
-                raise ValueError(
-                    """A User was created with no profile.  For security reasons, 
-                    we cannot allow the request to be processed any further.
-                    Try deleting this User and creating it again to ensure a 
-                    UserProfile gets attached, or link a UserProfile 
-                    to this User.""")
+        if TENANT_INSTRUMENTATION:
+            request._multitenant_started = time.time()
+        request._multitenant_saved_context = _context.snapshot()
+        _context.user = getattr(request, 'user', None)
+
+        # Attempt to set tenant, as per TENANT_RESOLVERS
+        if self.lazy:
+            # Views that never look at the tenant don't pay for finding it.  With no tenant id,
+            # the base tenant is used as soon as someone asks for the tenant.
+            set_tenant_resolver(lambda: _remember_tenant_id(request, _rehydrated_or_default(resolve_tenant_id(request))))
         else:
-            # It's important that we hit the db once to set the tenant, even if 
-            # it's an anonymous user.  That way we get fresh values from the db,
-            # including the tenant options.
-            #
-            # An anonymous user, for example, still has access to the login page,
-            # so he will see the primary navigation tabs.  To decide which primary
-            # navigation tabs to show, we need the tenant to be set.
-            #
-            # Not: If we simply set the tenant once and left it in a module-level 
-            # variable, it would stay latched between page requests which is NOT
-            # what we want.
-            set_tenant_to_default()
+            tenant_id = resolve_tenant_id(request)
+            if tenant_id is not None:
+                set_current_tenant(get_cached_tenant(_rehydrated(tenant_id)))
+            else:
+                # It's important that we set the tenant, even if it's an anonymous user.
+                #
+                # An anonymous user, for example, still has access to the login page,
+                # so he will see the primary navigation tabs.  To decide which primary
+                # navigation tabs to show, we need the tenant to be set.
+                #
+                # Note: the base tenant comes from the in-memory cache, which is 
+                # refreshed whenever a Tenant is saved, so we still see fresh values 
+                # including the tenant options.
+                set_tenant_to_default()
+            _remember_tenant_id(request, get_current_tenant_id())
 
+    def process_response(self, request, response):
+        started = getattr(request, '_multitenant_started', None)
+        if started is not None:
+            from instrumentation import flush, record_request
+            record_request(peek_current_tenant_id(), time.time() - started)
+            flush()
 
+        # process_request may not have run, if an earlier middleware returned a response.
+        # Error pages go through here too, after they've been rendered with the request's tenant.
+        saved = getattr(request, '_multitenant_saved_context', None)
+        if saved is not None:
+            _context.restore(saved)
+            del request._multitenant_saved_context
+        return response
@@ -0,0 +1,76 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'Tenant.provisioning_status'
+        db.add_column('multitenant_tenant', 'provisioning_status', self.gf('django.db.models.fields.CharField')(default='ready', max_length=10, db_index=True), keep_default=False)
+
+        # Adding field 'Tenant.provisioning_progress'
+        db.add_column('multitenant_tenant', 'provisioning_progress', self.gf('django.db.models.fields.PositiveSmallIntegerField')(default=100), keep_default=False)
+
+        # Adding field 'Tenant.provisioning_updated'
+        db.add_column('multitenant_tenant', 'provisioning_updated', self.gf('django.db.models.fields.DateTimeField')(null=True, blank=True), keep_default=False)
+
+        # Adding model 'ProvisioningStep'
+        db.create_table('multitenant_provisioningstep', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('tenant', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['multitenant.Tenant'])),
+            ('model', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('data', self.gf('django.db.models.fields.TextField')(blank=True)),
+        ))
+        db.send_create_signal('multitenant', ['ProvisioningStep'])
+
+        # Adding unique constraint on 'ProvisioningStep', fields ['tenant', 'model']
+        db.create_unique('multitenant_provisioningstep', ['tenant_id', 'model'])
+
+
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'ProvisioningStep', fields ['tenant', 'model']
+        db.delete_unique('multitenant_provisioningstep', ['tenant_id', 'model'])
+
+        # Deleting model 'ProvisioningStep'
+        db.delete_table('multitenant_provisioningstep')
+
+        # Deleting field 'Tenant.provisioning_updated'
+        db.delete_column('multitenant_tenant', 'provisioning_updated')
+
+        # Deleting field 'Tenant.provisioning_progress'
+        db.delete_column('multitenant_tenant', 'provisioning_progress')
+
+        # Deleting field 'Tenant.provisioning_status'
+        db.delete_column('multitenant_tenant', 'provisioning_status')
+
+
+    models = {
+        'multitenant.provisioningstep': {
+            'Meta': {'unique_together': "(('tenant', 'model'),)", 'object_name': 'ProvisioningStep'},
+            'data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.tenant': {
+            'Meta': {'object_name': 'Tenant'},
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'provisioning_progress': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '100'}),
+            'provisioning_status': ('django.db.models.fields.CharField', [], {'default': "'ready'", 'max_length': '10', 'db_index': 'True'}),
+            'provisioning_updated': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'multitenant.testtenantawaremodel': {
+            'Meta': {'object_name': 'TestTenantAwareModel'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        }
+    }
+
+    complete_apps = ['multitenant']
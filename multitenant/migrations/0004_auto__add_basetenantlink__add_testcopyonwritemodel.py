@@ -0,0 +1,86 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'TestCopyOnWriteModel'
+        db.create_table('multitenant_testcopyonwritemodel', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('tenant', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['multitenant.Tenant'])),
+            ('name', self.gf('django.db.models.fields.CharField')(max_length=10)),
+            ('fkfield', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['multitenant.TestCopyOnWriteModel'], null=True, blank=True)),
+        ))
+        db.send_create_signal('multitenant', ['TestCopyOnWriteModel'])
+
+        # Adding model 'BaseTenantLink'
+        db.create_table('multitenant_basetenantlink', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('tenant', self.gf('django.db.models.fields.related.ForeignKey')(to=orm['multitenant.Tenant'])),
+            ('model', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('base_pk', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('local_pk', self.gf('django.db.models.fields.PositiveIntegerField')(null=True, blank=True)),
+        ))
+        db.send_create_signal('multitenant', ['BaseTenantLink'])
+
+        # Adding unique constraint on 'BaseTenantLink', fields ['tenant', 'model', 'base_pk']
+        db.create_unique('multitenant_basetenantlink', ['tenant_id', 'model', 'base_pk'])
+
+
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'BaseTenantLink', fields ['tenant', 'model', 'base_pk']
+        db.delete_unique('multitenant_basetenantlink', ['tenant_id', 'model', 'base_pk'])
+
+        # Deleting model 'BaseTenantLink'
+        db.delete_table('multitenant_basetenantlink')
+
+        # Deleting model 'TestCopyOnWriteModel'
+        db.delete_table('multitenant_testcopyonwritemodel')
+
+
+    models = {
+        'multitenant.basetenantlink': {
+            'Meta': {'unique_together': "(('tenant', 'model', 'base_pk'),)", 'object_name': 'BaseTenantLink'},
+            'base_pk': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'local_pk': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.provisioningstep': {
+            'Meta': {'unique_together': "(('tenant', 'model'),)", 'object_name': 'ProvisioningStep'},
+            'data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.tenant': {
+            'Meta': {'object_name': 'Tenant'},
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'provisioning_progress': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '100'}),
+            'provisioning_status': ('django.db.models.fields.CharField', [], {'default': "'ready'", 'max_length': '10', 'db_index': 'True'}),
+            'provisioning_updated': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'multitenant.testcopyonwritemodel': {
+            'Meta': {'object_name': 'TestCopyOnWriteModel'},
+            'fkfield': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.TestCopyOnWriteModel']", 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.testtenantawaremodel': {
+            'Meta': {'object_name': 'TestTenantAwareModel'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        }
+    }
+
+    complete_apps = ['multitenant']
@@ -0,0 +1,89 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding field 'Tenant.template_version'
+        db.add_column('multitenant_tenant', 'template_version', self.gf('django.db.models.fields.PositiveIntegerField')(null=True, blank=True), keep_default=False)
+
+        # Adding model 'BaseTenantSnapshot'
+        db.create_table('multitenant_basetenantsnapshot', (
+            ('id', self.gf('django.db.models.fields.AutoField')(primary_key=True)),
+            ('model', self.gf('django.db.models.fields.CharField')(max_length=100)),
+            ('base_pk', self.gf('django.db.models.fields.PositiveIntegerField')()),
+            ('data', self.gf('django.db.models.fields.TextField')()),
+            ('version', self.gf('django.db.models.fields.PositiveIntegerField')(db_index=True)),
+        ))
+        db.send_create_signal('multitenant', ['BaseTenantSnapshot'])
+
+        # Adding unique constraint on 'BaseTenantSnapshot', fields ['model', 'base_pk']
+        db.create_unique('multitenant_basetenantsnapshot', ['model', 'base_pk'])
+
+
+    def backwards(self, orm):
+        
+        # Removing unique constraint on 'BaseTenantSnapshot', fields ['model', 'base_pk']
+        db.delete_unique('multitenant_basetenantsnapshot', ['model', 'base_pk'])
+
+        # Deleting model 'BaseTenantSnapshot'
+        db.delete_table('multitenant_basetenantsnapshot')
+
+        # Deleting field 'Tenant.template_version'
+        db.delete_column('multitenant_tenant', 'template_version')
+
+
+    models = {
+        'multitenant.basetenantlink': {
+            'Meta': {'unique_together': "(('tenant', 'model', 'base_pk'),)", 'object_name': 'BaseTenantLink'},
+            'base_pk': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'local_pk': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.basetenantsnapshot': {
+            'Meta': {'unique_together': "(('model', 'base_pk'),)", 'object_name': 'BaseTenantSnapshot'},
+            'base_pk': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'data': ('django.db.models.fields.TextField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'version': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'})
+        },
+        'multitenant.provisioningstep': {
+            'Meta': {'unique_together': "(('tenant', 'model'),)", 'object_name': 'ProvisioningStep'},
+            'data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.tenant': {
+            'Meta': {'object_name': 'Tenant'},
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'provisioning_progress': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '100'}),
+            'provisioning_status': ('django.db.models.fields.CharField', [], {'default': "'ready'", 'max_length': '10', 'db_index': 'True'}),
+            'provisioning_updated': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'template_version': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'multitenant.testcopyonwritemodel': {
+            'Meta': {'object_name': 'TestCopyOnWriteModel'},
+            'fkfield': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.TestCopyOnWriteModel']", 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.testtenantawaremodel': {
+            'Meta': {'object_name': 'TestTenantAwareModel'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        }
+    }
+
+    complete_apps = ['multitenant']
@@ -0,0 +1,79 @@
+# encoding: utf-8
+import datetime
+from south.db import db
+from south.v2 import SchemaMigration
+from django.db import models
+
+class Migration(SchemaMigration):
+
+    def forwards(self, orm):
+        
+        # Adding model 'TenantPlacement'
+        db.create_table('multitenant_tenantplacement', (
+            ('tenant_id', self.gf('django.db.models.fields.PositiveIntegerField')(primary_key=True)),
+            ('database', self.gf('django.db.models.fields.CharField')(max_length=100)),
+        ))
+        db.send_create_signal('multitenant', ['TenantPlacement'])
+
+
+    def backwards(self, orm):
+        
+        # Deleting model 'TenantPlacement'
+        db.delete_table('multitenant_tenantplacement')
+
+
+    models = {
+        'multitenant.basetenantlink': {
+            'Meta': {'unique_together': "(('tenant', 'model', 'base_pk'),)", 'object_name': 'BaseTenantLink'},
+            'base_pk': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'local_pk': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.basetenantsnapshot': {
+            'Meta': {'unique_together': "(('model', 'base_pk'),)", 'object_name': 'BaseTenantSnapshot'},
+            'base_pk': ('django.db.models.fields.PositiveIntegerField', [], {}),
+            'data': ('django.db.models.fields.TextField', [], {}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'version': ('django.db.models.fields.PositiveIntegerField', [], {'db_index': 'True'})
+        },
+        'multitenant.provisioningstep': {
+            'Meta': {'unique_together': "(('tenant', 'model'),)", 'object_name': 'ProvisioningStep'},
+            'data': ('django.db.models.fields.TextField', [], {'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'model': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.tenant': {
+            'Meta': {'object_name': 'Tenant'},
+            'email': ('django.db.models.fields.EmailField', [], {'max_length': '75'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'unique': 'True', 'max_length': '255'}),
+            'provisioning_progress': ('django.db.models.fields.PositiveSmallIntegerField', [], {'default': '100'}),
+            'provisioning_status': ('django.db.models.fields.CharField', [], {'default': "'ready'", 'max_length': '10', 'db_index': 'True'}),
+            'provisioning_updated': ('django.db.models.fields.DateTimeField', [], {'null': 'True', 'blank': 'True'}),
+            'template_version': ('django.db.models.fields.PositiveIntegerField', [], {'null': 'True', 'blank': 'True'})
+        },
+        'multitenant.tenantplacement': {
+            'Meta': {'object_name': 'TenantPlacement'},
+            'database': ('django.db.models.fields.CharField', [], {'max_length': '100'}),
+            'tenant_id': ('django.db.models.fields.PositiveIntegerField', [], {'primary_key': 'True'})
+        },
+        'multitenant.testcopyonwritemodel': {
+            'Meta': {'object_name': 'TestCopyOnWriteModel'},
+            'fkfield': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.TestCopyOnWriteModel']", 'null': 'True', 'blank': 'True'}),
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        },
+        'multitenant.testtenantawaremodel': {
+            'Meta': {'object_name': 'TestTenantAwareModel'},
+            'id': ('django.db.models.fields.AutoField', [], {'primary_key': 'True'}),
+            'name': ('django.db.models.fields.CharField', [], {'max_length': '10'}),
+            'tenant': ('django.db.models.fields.related.ForeignKey', [], {'to': "orm['multitenant.Tenant']"})
+        }
+    }
+
+    complete_apps = ['multitenant']
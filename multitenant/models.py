@@ -18,23 +18,144 @@ of the user profile for request.user.
 If it's an anonymous user, the current tenant will be the base tenant.  
 """
 
-from django.db import models
-from django.db.models.signals import post_save
+from django.db import connections, models, transaction, DEFAULT_DB_ALIAS
+from django.db.models.signals import m2m_changed, post_save, post_delete
 from django.contrib.auth.models import User
 from django.conf import settings    # We look at DEBUG only, from settings
-from django.contrib.contenttypes.models import ContentType
 
-from middleware import get_current_tenant
-from settings import BASE_TENANT_ID
+from middleware import get_current_tenant, get_current_tenant_id, forget_hostnames, forget_tenant, forget_user
+from cloning import _batch_size, _chunks
+from copyonwrite import CopyOnWriteQuerySet, hide, is_copy_on_write, is_shared, materialize, tenant_q
+from generations import bump_generation
+from querycache import CachedQuerySetMixin, get_cached_queryset_class
+from registry import get_model_label, get_profile_class, is_tenant_model
+from routers import forget_placement, get_model_database
+from settings import BASE_TENANT_ID, BULK_BATCH_SIZE
+import instrumentation     # Installs the query timing, when TENANT_INSTRUMENTATION is on.
 
 
 class TenantMgr(models.Manager):
+    """
+    Only shows the instances that belong to the current tenant.  The bulk methods stamp the current
+    tenant on the instances they write, once per batch, so you don't need to call clean() on each one.
+    example:
+        BugReport.tenant_objects.bulk_create([BugReport(description=d) for d in descriptions])
+
+    With cache_results, the results of its queries are kept in memory until the tenant's instances
+    change; see multitenant.querycache.
+    """
+    def __init__(self, cache_results=False):
+        super(TenantMgr, self).__init__()
+        self.cache_results = cache_results
+
     def get_query_set(self):
-        tenant = get_current_tenant()
-        if tenant:
-            return super(TenantMgr, self).get_query_set().filter(tenant=tenant)
+        # Filtering by id doesn't need the Tenant instance, so it may never get loaded.
+        tenant_id = get_current_tenant_id()
+
+        if self.cache_results:
+            qs = get_cached_queryset_class(self.model)(self.model, using=self._db)
+        elif is_copy_on_write(self.model):
+            qs = CopyOnWriteQuerySet(self.model, using=self._db)
+        else:
+            qs = super(TenantMgr, self).get_query_set()
+        if self._db is None:
+            database = get_model_database(self.model, tenant_id)
+            if database is not None:
+                qs = qs.using(database)
+
+        if tenant_id:
+            return qs.filter(tenant_q(self.model, tenant_id))
         else:
-            return super(TenantMgr, self).get_query_set()
+            return qs
+
+    def cached(self):
+        """
+        The current tenant's instances, with the results of the queries kept in memory.
+        example:
+            types = BugReportType.tenant_objects.cached().order_by('name')
+        """
+        qs = self.get_query_set()
+        if not isinstance(qs, CachedQuerySetMixin):
+            qs = qs._clone(klass=get_cached_queryset_class(self.model))
+        return qs
+
+    def _check_tenant(self, objs):
+        """
+        Sets the current tenant on objs that have none, and refuses objs that belong to another tenant.
+        """
+        tenant_id = get_current_tenant_id()
+        for obj in objs:
+            if obj.tenant_id is None:
+                obj.tenant_id = tenant_id
+            elif obj.tenant_id != tenant_id:
+                raise ValueError('%r belongs to tenant %s, not to the current tenant %s.' % (obj, obj.tenant_id, tenant_id))
+        return tenant_id
+
+    def bulk_create(self, objs, batch_size=None):
+        objs = list(objs)
+        self._check_tenant(objs)
+        batch_size = batch_size or BULK_BATCH_SIZE
+        for i in xrange(0, len(objs), batch_size):
+            super(TenantMgr, self).bulk_create(objs[i:i + batch_size])
+        # No signals are sent for bulk operations, so we take care of the generation ourselves.
+        bump_generation(self.model, get_current_tenant_id())
+        return objs
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        Saves the given fields of objs, which must already be in the database, with one
+        UPDATE ... SET field = CASE id WHEN ... END per batch, however different their values.
+        Returns the number of rows updated.
+        """
+        objs = list(objs)
+        tenant_id = self._check_tenant(objs)
+        fields = [self.model._meta.get_field(name) for name in fields]
+        if [f for f in fields if f.name == 'tenant' or f.primary_key]:
+            raise ValueError('bulk_update() cannot change the tenant or primary key.')
+        if not objs or not fields:
+            return 0
+
+        using = self.get_query_set().db
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        opts = self.model._meta
+        pk_column = qn(opts.pk.column)
+        batch_size = batch_size or _batch_size(self.model, using, params_per_row=2 * len(fields) + 1)
+        updated = 0
+        with transaction.commit_on_success(using=using):
+            cursor = connection.cursor()
+            for batch in _chunks(objs, batch_size):
+                assignments, params = [], []
+                for f in fields:
+                    # PostgreSQL gives the CASE the type of its THEN values, which are untyped parameters: cast
+                    # them to the column's type, or dates, numbers... are refused.
+                    then = '%s'
+                    if connection.vendor == 'postgresql':
+                        then = 'CAST(%%s AS %s)' % f.db_type(connection=connection)
+                    assignments.append('%s = CASE %s %s END' % (
+                        qn(f.column), pk_column, ' '.join(['WHEN %s THEN ' + then] * len(batch))))
+                    for obj in batch:
+                        params.extend([obj.pk, f.get_db_prep_save(getattr(obj, f.attname), connection=connection)])
+                # Only the current tenant's rows, like the rest of tenant_objects.
+                sql = 'UPDATE %s SET %s WHERE %s IN (%s) AND %s = %%s' % (
+                    qn(opts.db_table), ', '.join(assignments), pk_column, ', '.join(['%s'] * len(batch)),
+                    qn(opts.get_field('tenant').column))
+                cursor.execute(sql, params + [obj.pk for obj in batch] + [tenant_id])
+                updated += cursor.rowcount
+        bump_generation(self.model, tenant_id)
+        return updated
+
+    def update(self, **kwargs):
+        if 'tenant' in kwargs or 'tenant_id' in kwargs:
+            raise ValueError('update() cannot move instances to another tenant.')
+        updated = self.get_query_set().update(**kwargs)
+        bump_generation(self.model, get_current_tenant_id())
+        return updated
+
+    def get_or_create(self, **kwargs):
+        defaults = dict(kwargs.pop('defaults', {}))
+        defaults['tenant'] = get_current_tenant()
+        return self.get_query_set().get_or_create(defaults=defaults, **kwargs)
 
 
 class Tenant(models.Model):
@@ -50,6 +171,40 @@ class Tenant(models.Model):
         unique = True,
     )
     email = models.EmailField()
+
+    # The host (bugs.acme.com), or subdomain of TENANT_DOMAIN (acme), that anonymous visitors find this tenant
+    # at; see multitenant.middleware.resolve_by_host.
+    hostname = models.CharField(max_length=255, unique=True, null=True, blank=True)
+
+    # A new tenant gets a copy of the base tenant; see multitenant.provisioning.
+    PROVISIONING_READY = 'ready'
+    PROVISIONING_PENDING = 'pending'
+    PROVISIONING_RUNNING = 'running'
+    PROVISIONING_FAILED = 'failed'
+    PROVISIONING_STATUSES = (
+        (PROVISIONING_READY, 'Ready'),
+        (PROVISIONING_PENDING, 'Pending'),
+        (PROVISIONING_RUNNING, 'Running'),
+        (PROVISIONING_FAILED, 'Failed'),
+    )
+    provisioning_status = models.CharField(
+        max_length = 10,
+        choices = PROVISIONING_STATUSES,
+        default = PROVISIONING_READY,
+        db_index = True,
+    )
+    provisioning_progress = models.PositiveSmallIntegerField(default=100)   # percent
+    provisioning_updated = models.DateTimeField(null=True, blank=True)
+
+    # The version of the base tenant this tenant was last synced with; None if it's not synced.
+    # See multitenant.sync.
+    template_version = models.PositiveIntegerField(null=True, blank=True)
+
+    # An archived tenant's instances are kept in another database until it comes back; see multitenant.archive.
+    archived = models.BooleanField(default=False, db_index=True)
+    # 'archiving' or 'rehydrating' while its instances are on the move, so that nobody else moves them meanwhile.
+    archive_transition = models.CharField(max_length=11, blank=True, default='')
+
     def __unicode__(self):
         return self.name
 
@@ -63,6 +218,36 @@ class TenantModel(models.Model):
     objects = models.Manager()
     tenant_objects = TenantMgr()
 
+    # Set to True in a subclass to share the base tenant's instances instead of cloning them for every
+    # new tenant; see multitenant.copyonwrite.
+    copy_on_write = False
+
+    def __init__(self, *args, **kwargs):
+        super(TenantModel, self).__init__(*args, **kwargs)
+        # Remember who this instance belonged to when it was loaded, even if clean() changes the tenant.
+        # Read from __dict__, so that a deferred tenant field doesn't cost a query.
+        self._loaded_tenant_id = self.__dict__.get('tenant_id')
+
+    def save(self, *args, **kwargs):
+        tenant_id = get_current_tenant_id()
+        if is_shared(self, tenant_id):
+            # Don't change the base tenant's instance; give the current tenant its own copy instead.
+            materialize(self, tenant_id)
+        else:
+            if kwargs.get('using') is None:
+                kwargs['using'] = get_model_database(self.__class__, self.tenant_id)
+            super(TenantModel, self).save(*args, **kwargs)
+            self._loaded_tenant_id = self.tenant_id
+
+    def delete(self, *args, **kwargs):
+        tenant_id = get_current_tenant_id()
+        if is_shared(self, tenant_id):
+            hide(self, tenant_id)
+        else:
+            if kwargs.get('using') is None:
+                kwargs['using'] = get_model_database(self.__class__, self.tenant_id)
+            super(TenantModel, self).delete(*args, **kwargs)
+
     def clean(self):
         """
         Here we take care of setting the tenant for any model instance that has a foreign key to the Tenant model.
@@ -79,7 +264,7 @@ class TenantModel(models.Model):
         """
         
         user_profile_class = get_profile_class()
-        if hasattr(self, 'tenant_id') and not ( isinstance(self, user_profile_class) and self.id ):
+        if hasattr(self, 'tenant_id') and not ( user_profile_class and isinstance(self, user_profile_class) and self.id ):
             self.tenant = get_current_tenant()
             
         super(TenantModel, self).clean() 
@@ -93,6 +278,122 @@ class TestTenantAwareModel(TenantModel):
     name = models.CharField(max_length=10)
     fkfield = models.ForeignKey("self", blank=True, null=True)
     m2mfield = models.ManyToManyField("self")
+    datefield = models.DateField(blank=True, null=True)
+
+
+# For testing purposes only
+class TestCopyOnWriteModel(TenantModel):
+    copy_on_write = True
+    name = models.CharField(max_length=10)
+    fkfield = models.ForeignKey("self", blank=True, null=True)
+
+
+# For testing purposes only; the AUTH_PROFILE_MODULE of multitenant.tests.settings
+class TestUserProfile(TenantModel):
+    user = models.OneToOneField(User)
+
+
+class BaseTenantLink(models.Model):
+    """
+    Links one of the base tenant's instances to a tenant's own copy of it.
+    For copy-on-write models, a link with no local_pk means the tenant has deleted the base tenant's instance.
+    """
+    tenant = models.ForeignKey(Tenant)
+    model = models.CharField(max_length=100)
+    base_pk = models.PositiveIntegerField()
+    local_pk = models.PositiveIntegerField(null=True, blank=True)
+
+    class Meta:
+        unique_together = (("tenant", "model", "base_pk"),)
+
+    def __unicode__(self):
+        return u'%s: %s %s -> %s' % (self.tenant_id, self.model, self.base_pk, self.local_pk)
+
+
+class BaseTenantSnapshot(models.Model):
+    """
+    The values of one of the base tenant's instances as of the last sync, as JSON; see multitenant.sync.
+    version is the sync that last saw it change.
+    """
+    model = models.CharField(max_length=100)
+    base_pk = models.PositiveIntegerField()
+    data = models.TextField()
+    version = models.PositiveIntegerField(db_index=True)
+
+    class Meta:
+        unique_together = (("model", "base_pk"),)
+
+    def __unicode__(self):
+        return u'%s %s (%s)' % (self.model, self.base_pk, self.version)
+
+
+class TenantPlacement(models.Model):
+    """
+    The database holding a tenant's instances, when TENANT_SHARDING is on; see multitenant.routers.
+    Placements always live in the default database.
+    """
+    # Not a foreign key called tenant, so that placements don't count as tenant-aware themselves.
+    tenant_id = models.PositiveIntegerField(primary_key=True)
+    database = models.CharField(max_length=100)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.tenant_id, self.database)
+
+
+class TenantStats(models.Model):
+    """
+    Queries and requests of one tenant, for one model, over one hour; see multitenant.instrumentation.
+    Request counts are kept with an empty model.  Times are in seconds.
+    """
+    hour = models.DateTimeField(db_index=True)
+    # Not a foreign key: the numbers are still worth having after the tenant is gone.
+    tenant_id = models.PositiveIntegerField(null=True, blank=True)
+    model = models.CharField(max_length=100, blank=True)
+    queries = models.PositiveIntegerField(default=0)
+    sql_time = models.FloatField(default=0)
+    requests = models.PositiveIntegerField(default=0)
+    request_time = models.FloatField(default=0)
+
+    class Meta:
+        unique_together = (("hour", "tenant_id", "model"),)
+
+    def __unicode__(self):
+        return u'%s %s %s' % (self.hour, self.tenant_id, self.model)
+
+
+class TenantUsage(models.Model):
+    """
+    The number of rows of one model that one tenant had at some point; see multitenant.metering.
+    The row with no tenant_id is for the whole table, and is written last.  bytes is an estimate.
+    """
+    taken = models.DateTimeField(db_index=True)
+    # Not a foreign key, like TenantStats.
+    tenant_id = models.PositiveIntegerField(null=True, blank=True, db_index=True)
+    model = models.CharField(max_length=100)
+    rows = models.PositiveIntegerField(default=0)
+    bytes = models.BigIntegerField(null=True, blank=True)
+    # On the whole-table row: a digest of the model's generations, to tell whether anything changed since.
+    signature = models.BigIntegerField(null=True, blank=True)
+
+    def __unicode__(self):
+        return u'%s %s %s: %s' % (self.taken, self.tenant_id, self.model, self.rows)
+
+
+class ProvisioningStep(models.Model):
+    """
+    Records that the base tenant instances of one model have been cloned for a tenant, in the same
+    transaction as the clone itself.  If provisioning is interrupted, it picks up after the last step.
+    data holds what later steps need to know (new primary keys, references still to be fixed up), as JSON.
+    """
+    tenant = models.ForeignKey(Tenant)
+    model = models.CharField(max_length=100)
+    data = models.TextField(blank=True)
+
+    class Meta:
+        unique_together = (("tenant", "model"),)
+
+    def __unicode__(self):
+        return u'%s: %s' % (self.tenant_id, self.model)
     
 
 
@@ -112,43 +413,101 @@ def clone_model_instance(instance, new_values={}):
 def clone_base_tenant(sender, instance, created, **kwargs): 
     """
     Runs through all tenant-informed models, and copies each base tenant instance to an instance for the current tenant.
+    The copy is done with bulk inserts in a single transaction; see multitenant.cloning for details.
+    Depending on TENANT_PROVISIONING, the copy may be done later, outside of the request; see multitenant.provisioning.
     """
 
     # Don't clone anything when loading fixtures (when raw==True)
-    if created and not kwargs.get('raw', False):
+    if created and not kwargs.get('raw', False) and instance.pk != BASE_TENANT_ID:
+        from provisioning import tenant_created
+        tenant_created(instance, using=kwargs.get('using', DEFAULT_DB_ALIAS))
 
-        user_profile_class = get_profile_class()
-        all_model_classes = models.get_models()
+post_save.connect(clone_base_tenant, sender=Tenant)
 
-        for model_class in all_model_classes:
-            if issubclass(model_class, TenantModel) and model_class is not user_profile_class:
-                qs = model_class.objects.filter(tenant=BASE_TENANT_ID).order_by('id')
-                for i in qs:
-                    clone_model_instance(i, { 'tenant': instance })
 
-post_save.connect(clone_base_tenant, sender=Tenant)
+def tenant_changed(sender, instance, **kwargs):
+    """
+    Keeps the middleware's in-memory tenant cache and hostnames fresh.
+    """
+    forget_tenant(instance.pk)
+    forget_hostnames()
+
+post_save.connect(tenant_changed, sender=Tenant)
+post_delete.connect(tenant_changed, sender=Tenant)
+
+
+def placement_changed(sender, instance, **kwargs):
+    forget_placement(instance.tenant_id)
+
+post_save.connect(placement_changed, sender=TenantPlacement)
+post_delete.connect(placement_changed, sender=TenantPlacement)
+
+
+def user_profile_changed(sender, instance, **kwargs):
+    """
+    Forgets the cached tenant of a user whenever the user profile is saved or deleted, for example
+    when the Superuser changes his own UserProfile tenant to visit another tenant's account.
+    """
+    if sender is get_profile_class():
+        forget_user(instance.user_id)
+
+post_save.connect(user_profile_changed)
+post_delete.connect(user_profile_changed)
+
+
+def tenant_instance_changed(sender, instance, **kwargs):
+    """
+    Bumps the generation of the instance's model for its tenant, so that cached values based on
+    the model's instances (e.g. form choices) are not used anymore.
+    """
+    if is_tenant_model(sender) and instance.tenant_id is not None:
+        bump_generation(sender, instance.tenant_id)
+
+post_save.connect(tenant_instance_changed)
+post_delete.connect(tenant_instance_changed)
+
+
+def tenant_links_changed(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Bumps the generations of both models when many-to-many links are added or removed, since the links
+    are part of what the instances of either side show.
+    """
+    if not action.startswith('post_'):
+        return
+    tenant_id = getattr(instance, 'tenant_id', None)
+    for model_class in (instance.__class__, model):
+        if is_tenant_model(model_class) and tenant_id is not None:
+            bump_generation(model_class, tenant_id)
+
+m2m_changed.connect(tenant_links_changed)
+
+
+def base_tenant_copy_deleted(sender, instance, **kwargs):
+    """
+    Remembers that the tenant deleted its copy of a base tenant instance, so it's not brought back by
+    copy-on-write or by syncing the base tenant.
+    """
+    if is_tenant_model(sender) and instance.tenant_id not in (None, BASE_TENANT_ID):
+        BaseTenantLink.objects.using(kwargs.get('using', DEFAULT_DB_ALIAS)).filter(
+            tenant=instance.tenant_id, model=get_model_label(sender), local_pk=instance.pk,
+        ).update(local_pk=None)
+
+post_delete.connect(base_tenant_copy_deleted)
 
 
 def clone_model(model_class, source_tenant=BASE_TENANT_ID, dest_tenant='current_tenant'):
     """
     This is a general-purpose tool to clone (copy) all instances of a model from one tenant to another.
     By default, it clones from the base tenant to the current tenant (logged in user).
-    Warning: it will NOT work with m2m fields.
+    Foreign keys from the model to itself, and m2m links between the copied instances, point at the copies.
     """
     if dest_tenant == 'current_tenant':
         dest_tenant = get_current_tenant()
         
     if issubclass(model_class, TenantModel):
-        qs = model_class.objects.filter(tenant=source_tenant).order_by('id')
-        for i in qs:
-            clone_model_instance(i, { 'tenant': dest_tenant })
-
-
+        from cloning import clone_tenant
+        clone_tenant(source_tenant, dest_tenant, [model_class])
 
-def get_profile_class():
-    app_label, model = settings.AUTH_PROFILE_MODULE.split('.')
-    content_type = ContentType.objects.get(app_label=app_label, model=model.lower())
-    return content_type.model_class()
 
 
 def get_profile_class_old():
@@ -0,0 +1,217 @@
+"""
+Provisioning a new tenant: giving it its own copy of the base tenant's instances.
+
+By default (TENANT_PROVISIONING = 'sync') this happens while the new Tenant is being saved, which can take
+a while if the base tenant has many instances.  With TENANT_PROVISIONING = 'thread' or 'queue', saving the
+Tenant only marks it as pending, and returns right away.  The copy is then made by a background thread of
+the same process ('thread'), or by the provision_tenants management command ('queue'):
+
+    ./manage.py provision_tenants --loop
+
+The copy is made one model at a time, each in its own transaction, and the Tenant's provisioning_status
+and provisioning_progress fields are kept up to date.  Each finished model is recorded as a ProvisioningStep;
+if the worker dies half way, running provision_tenants again picks up after the last finished step.
+"""
+
+import datetime
+import json
+import logging
+import threading
+import time
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Q
+
+from cloning import apply_deferred, clone_m2m, clone_model_rows, clone_tenant
+from generations import bump_generation
+from middleware import forget_tenant
+from registry import get_clone_plan, get_model_label
+from routers import get_tenant_database
+from sync import record_links
+from settings import BASE_TENANT_ID, TENANT_PROVISIONING, TENANT_PROVISIONING_TIMEOUT
+
+logger = logging.getLogger('multitenant')
+
+# The name of the last step: copying the links between the cloned instances.
+LINKS_STEP = '*links*'
+
+_queue = queue.Queue()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def tenant_created(tenant, using=DEFAULT_DB_ALIAS):
+    """
+    Called when a new Tenant is saved.  Either clones the base tenant right away, or leaves it for later.
+    """
+    from models import Tenant
+
+    if TENANT_PROVISIONING == 'sync':
+        clone_tenant(BASE_TENANT_ID, tenant, using=get_tenant_database(tenant.pk, default=using))
+        return
+
+    _set_status(tenant.pk, Tenant.PROVISIONING_PENDING, 0, using)
+    tenant.provisioning_status = Tenant.PROVISIONING_PENDING
+    tenant.provisioning_progress = 0
+    if TENANT_PROVISIONING == 'thread':
+        _queue.put((tenant.pk, using))
+        _start_worker()
+
+
+def _set_status(tenant_id, status, progress, using):
+    from models import Tenant
+    Tenant.objects.using(using).filter(pk=tenant_id).update(
+        provisioning_status=status,
+        provisioning_progress=progress,
+        provisioning_updated=datetime.datetime.now(),
+    )
+    # update() doesn't send signals, so the middleware's cache must be told.
+    forget_tenant(tenant_id)
+
+
+def tenants_to_provision(retry_failed=False, using=DEFAULT_DB_ALIAS):
+    """
+    The tenants waiting to be provisioned, including those whose worker seems to have died.
+    """
+    from models import Tenant
+    stale = datetime.datetime.now() - datetime.timedelta(seconds=TENANT_PROVISIONING_TIMEOUT)
+    statuses = [Tenant.PROVISIONING_PENDING]
+    if retry_failed:
+        statuses.append(Tenant.PROVISIONING_FAILED)
+    waiting = Q(provisioning_status__in=statuses) | Q(provisioning_status=Tenant.PROVISIONING_RUNNING, provisioning_updated__lt=stale)
+    return Tenant.objects.using(using).filter(waiting).order_by('pk')
+
+
+def claim_tenant(tenant_id, retry_failed=False, using=DEFAULT_DB_ALIAS):
+    """
+    Marks a waiting tenant as running.  Returns False if it's not waiting, for example if another
+    worker got to it first.
+    """
+    from models import Tenant
+    claimed = tenants_to_provision(retry_failed, using).filter(pk=tenant_id).update(
+        provisioning_status=Tenant.PROVISIONING_RUNNING,
+        provisioning_updated=datetime.datetime.now(),
+    )
+    forget_tenant(tenant_id)
+    return claimed == 1
+
+
+def provision_tenant(tenant_id, using=DEFAULT_DB_ALIAS):
+    """
+    Clones the base tenant for tenant_id, skipping the steps that were already done.
+    The tenant should have been claimed first, see claim_tenant().
+    using is where the Tenant is; the instances go to the tenant's own database, see multitenant.routers.
+    """
+    from models import Tenant, ProvisioningStep
+
+    data_using = get_tenant_database(tenant_id, default=using)
+    source_using = get_tenant_database(BASE_TENANT_ID, default=using)
+
+    plan = get_clone_plan()
+    steps = dict(
+        (step.model, json.loads(step.data or '{}'))
+        for step in ProvisioningStep.objects.using(data_using).filter(tenant=tenant_id)
+    )
+    pk_maps = dict.fromkeys(plan)
+    for model_class in plan:
+        data = steps.get(get_model_label(model_class))
+        if data is not None:
+            pk_maps[model_class] = dict((old, new) for old, new in data['pk_map'])
+
+    progress = 0
+    try:
+        for index, model_class in enumerate(plan):
+            label = get_model_label(model_class)
+            if label in steps:
+                continue
+            with transaction.commit_on_success(using=data_using):
+                deferred = []
+                pk_maps[model_class] = clone_model_rows(
+                    model_class, BASE_TENANT_ID, tenant_id, pk_maps, deferred, using=data_using, source_using=source_using)
+
+                # References to this model or to models already cloned can be fixed right away;
+                # the others wait for the last step.
+                fix_now, fix_later = [], []
+                for item in deferred:
+                    (fix_now if pk_maps.get(item[1].rel.to) is not None else fix_later).append(item)
+                apply_deferred(fix_now, pk_maps, using=data_using)
+
+                data = {
+                    'pk_map': pk_maps[model_class].items(),
+                    'deferred': [(field.name, pk, old_value) for m, field, pk, old_value in fix_later],
+                }
+                ProvisioningStep.objects.using(data_using).create(tenant_id=tenant_id, model=label, data=json.dumps(data))
+                progress = 100 * (index + 1) // (len(plan) + 1)
+                _set_status(tenant_id, Tenant.PROVISIONING_RUNNING, progress, using)
+            steps[label] = data
+
+        if LINKS_STEP not in steps:
+            with transaction.commit_on_success(using=data_using):
+                deferred = []
+                for model_class in plan:
+                    for name, pk, old_value in steps[get_model_label(model_class)]['deferred']:
+                        deferred.append((model_class, model_class._meta.get_field(name), pk, old_value))
+                apply_deferred(deferred, pk_maps, using=data_using)
+                for model_class in plan:
+                    clone_m2m(model_class, pk_maps, using=data_using, source_using=source_using)
+                record_links(tenant_id, pk_maps, using=data_using)
+                ProvisioningStep.objects.using(data_using).create(tenant_id=tenant_id, model=LINKS_STEP)
+
+        with transaction.commit_on_success(using=data_using):
+            # The steps are only needed to resume; once done, they can go.
+            ProvisioningStep.objects.using(data_using).filter(tenant=tenant_id).delete()
+            _set_status(tenant_id, Tenant.PROVISIONING_READY, 100, using)
+    except Exception:
+        _set_status(tenant_id, Tenant.PROVISIONING_FAILED, progress, using)
+        raise
+
+    for model_class in plan:
+        bump_generation(model_class, tenant_id)
+
+
+def provision_waiting_tenants(retry_failed=False, using=DEFAULT_DB_ALIAS):
+    """
+    Provisions every tenant that's waiting for it.  Returns the list of tenant ids provisioned.
+    A tenant that fails is logged and left as failed; the others still get their turn.
+    """
+    done = []
+    for tenant_id in list(tenants_to_provision(retry_failed, using).values_list('pk', flat=True)):
+        if not claim_tenant(tenant_id, retry_failed, using):
+            continue
+        try:
+            provision_tenant(tenant_id, using)
+            done.append(tenant_id)
+        except Exception:
+            logger.exception('Provisioning of tenant %s failed.', tenant_id)
+    return done
+
+
+def _start_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_work, name='multitenant-provisioning')
+            _worker.daemon = True
+            _worker.start()
+
+
+def _work():
+    while True:
+        tenant_id, using = _queue.get()
+        try:
+            # The Tenant may have been saved in a transaction that isn't committed yet;
+            # give it a few seconds to show up.
+            for attempt in range(20):
+                if claim_tenant(tenant_id, using=using):
+                    provision_tenant(tenant_id, using)
+                    break
+                time.sleep(0.5)
+        except Exception:
+            logger.exception('Provisioning of tenant %s failed.', tenant_id)
+        finally:
+            connections[using].close()
@@ -0,0 +1,111 @@
+"""
+Deleting a tenant and all of its instances, without loading them.
+
+Deleting a Tenant with django's delete() collects every related instance in memory first, and sends signals for
+each of them.  purge_tenant() deletes the tenant's instances model by model instead, dependents first, in batches
+of a bounded size by primary key, each batch in its own short transaction.  The Tenant itself goes last.
+
+    ./manage.py purge_tenant 42 --batch-size=1000 --pause=0.1
+
+If it's interrupted, run it again: it picks up with whatever is left.
+
+example:
+
+    from multitenant.purge import purge_tenant
+
+    purge_tenant(tenant, pause=0.1)
+"""
+
+import time
+
+from django.db import transaction, DEFAULT_DB_ALIAS
+from django.db.models.sql.subqueries import DeleteQuery
+
+from generations import bump_generation
+from middleware import forget_tenant
+from registry import get_foreign_keys, get_m2m_fields, get_storage_plan
+from routers import forget_placement, get_tenant_database
+from settings import BASE_TENANT_ID, BULK_BATCH_SIZE
+
+
+def _batches(queryset, batch_size):
+    """
+    Yields lists of at most batch_size primary keys from queryset, until it's empty.
+    Every batch must be dealt with before the next one is read.
+    """
+    while True:
+        pks = list(queryset.values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        yield pks
+
+
+def _cut_references(model_class, tenant_id, plan, batch_size, pause, using):
+    """
+    Clears the nullable foreign keys of model_class that point at instances deleted before its own, or along with
+    them (references to itself, and cycles), so that deleting a batch doesn't trip over references from the rest.
+    """
+    index = plan.index(model_class)
+    for field in get_foreign_keys(model_class):
+        if not field.null or field.rel.to not in plan or plan.index(field.rel.to) > index:
+            continue
+        queryset = model_class._base_manager.db_manager(using).filter(
+            tenant=tenant_id, **{'%s__isnull' % field.name: False})
+        for pks in _batches(queryset, batch_size):
+            with transaction.commit_on_success(using=using):
+                model_class._base_manager.db_manager(using).filter(pk__in=pks).update(**{field.name: None})
+            if pause:
+                time.sleep(pause)
+
+
+def purge_model(model_class, tenant_id, batch_size=BULK_BATCH_SIZE, pause=0, using=DEFAULT_DB_ALIAS):
+    """
+    Deletes tenant_id's instances of model_class, and their many-to-many links, batch_size at a time.
+    Returns the number of instances deleted.
+    """
+    queryset = model_class._base_manager.db_manager(using).filter(tenant=tenant_id)
+    m2m_fields = get_m2m_fields(model_class)
+    deleted = 0
+    for pks in _batches(queryset, batch_size):
+        with transaction.commit_on_success(using=using):
+            for field in m2m_fields:
+                through = field.rel.through
+                DeleteQuery(through).delete_batch(pks, using, field=through._meta.get_field(field.m2m_field_name()))
+            DeleteQuery(model_class).delete_batch(pks, using)
+        deleted += len(pks)
+        if pause:
+            time.sleep(pause)
+    return deleted
+
+
+def purge_tenant(tenant, batch_size=BULK_BATCH_SIZE, pause=0, using=None):
+    """
+    Deletes all of tenant's instances, then the Tenant itself.
+    pause is the number of seconds to wait between batches, to leave some room to other queries.
+    Returns a dict of {model class: number of instances deleted}.
+    """
+    from models import Tenant, TenantPlacement
+
+    tenant_id = getattr(tenant, 'pk', tenant)
+    if tenant_id == BASE_TENANT_ID:
+        raise ValueError('The base tenant cannot be purged.')
+    if using is None:
+        using = get_tenant_database(tenant_id)
+
+    # Dependents first, so that nothing points at the instances being deleted.
+    plan = list(reversed(get_storage_plan()))
+    for model_class in plan:
+        _cut_references(model_class, tenant_id, plan, batch_size, pause, using)
+    counts = {}
+    for model_class in plan:
+        counts[model_class] = purge_model(model_class, tenant_id, batch_size, pause, using)
+        bump_generation(model_class, tenant_id)
+
+    # Nothing refers to the Tenant anymore, so deleting it is quick.
+    if using != DEFAULT_DB_ALIAS:
+        Tenant.objects.using(using).filter(pk=tenant_id).delete()
+    Tenant.objects.using(DEFAULT_DB_ALIAS).filter(pk=tenant_id).delete()
+    TenantPlacement.objects.using(DEFAULT_DB_ALIAS).filter(tenant_id=tenant_id).delete()
+    forget_tenant(tenant_id)
+    forget_placement(tenant_id)
+    return counts
@@ -0,0 +1,99 @@
+"""
+Caching the results of tenant_objects queries in memory, for small per-tenant tables that are read on most
+requests and rarely change (lists of options, types, statuses...).
+
+Results are kept per tenant, model and query, in an in-process LRU cache bounded by TENANT_QUERY_CACHE_SIZE
+entries and TENANT_QUERY_CACHE_TIMEOUT seconds.  Every key includes the generation of the model for the tenant
+(see multitenant.generations), which is bumped whenever one of its instances is saved, deleted or has its
+many-to-many links changed, by any process: so a change is seen everywhere right away, and the cached results
+from before it are simply never found again.
+
+Turn it on for a manager:
+
+    class BugReportType(TenantModel):
+        tenant_objects = TenantMgr(cache_results=True)
+
+or for one query:
+
+    types = BugReportType.tenant_objects.cached().order_by('name')
+
+Only queries that return model instances are cached, and not those using select_related() or
+prefetch_related(), since changes to the related models wouldn't be noticed.  Every hit returns fresh copies of
+the instances.
+
+Results read inside a transaction are cached like any others; a change made in it bumps the generation right
+away, so what was cached before is not served again.  If the transaction is then rolled back, call
+bump_generation() for the models it changed.
+
+Note that changes made with QuerySet.update() outside of tenant_objects send no signals; call
+bump_generation() after them.
+"""
+
+import cPickle as pickle
+
+from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
+
+from copyonwrite import CopyOnWriteQuerySet, is_copy_on_write
+from generations import bump_generation, get_generation
+from lru import LRUCache
+from middleware import get_current_tenant_id
+from registry import get_model_label
+from settings import BASE_TENANT_ID, TENANT_QUERY_CACHE_SIZE, TENANT_QUERY_CACHE_TIMEOUT
+
+_results = LRUCache(max_size=TENANT_QUERY_CACHE_SIZE, timeout=TENANT_QUERY_CACHE_TIMEOUT)
+
+
+def clear_query_cache():
+    _results.clear()
+
+
+class CachedQuerySetMixin(object):
+    """
+    Serves the results of a queryset from the cache when the tenant's instances of its model haven't changed.
+    """
+    def _cache_key(self):
+        query = self.query
+        if query.select_related or self._prefetch_related_lookups or query.select_for_update:
+            return None
+        try:
+            sql = str(query)
+        except EmptyResultSet:
+            return None
+        tenant_id = get_current_tenant_id()
+        generations = [get_generation(self.model, tenant_id)]
+        if is_copy_on_write(self.model) and tenant_id != BASE_TENANT_ID:
+            # The base tenant's instances are shared, so its changes matter too.
+            generations.append(get_generation(self.model, BASE_TENANT_ID))
+        return (tenant_id, self.db, get_model_label(self.model), tuple(generations), sql)
+
+    def iterator(self):
+        key = self._cache_key()
+        if key is None:
+            return super(CachedQuerySetMixin, self).iterator()
+        data = _results.get(key)
+        if data is None:
+            results = list(super(CachedQuerySetMixin, self).iterator())
+            _results.set(key, pickle.dumps(results, pickle.HIGHEST_PROTOCOL))
+            return iter(results)
+        return iter(pickle.loads(data))
+
+    def update(self, **kwargs):
+        updated = super(CachedQuerySetMixin, self).update(**kwargs)
+        bump_generation(self.model, get_current_tenant_id())
+        return updated
+    update.alters_data = True
+
+
+class CachedQuerySet(CachedQuerySetMixin, QuerySet):
+    pass
+
+
+class CachedCopyOnWriteQuerySet(CachedQuerySetMixin, CopyOnWriteQuerySet):
+    pass
+
+
+def get_cached_queryset_class(model_class):
+    if is_copy_on_write(model_class):
+        return CachedCopyOnWriteQuerySet
+    return CachedQuerySet
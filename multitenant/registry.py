@@ -0,0 +1,219 @@
+"""
+Keeps track of which models are tenant-aware, which one is the user profile, and how the
+tenant-aware models depend on each other.
+
+These are looked up once, the first time they're needed, and then kept in memory; code that runs
+for every instance (TenantModel.clean(), cloning, forms) doesn't have to rediscover them.
+The lists are rebuilt if another model class gets defined afterwards.
+
+The "plan" is the list of tenant-aware models in dependency order: every model comes after the models
+it has a foreign key to.  Cloning or loading a tenant's instances should follow the plan; deleting them
+should follow it in reverse.
+
+example:
+
+    from multitenant.registry import get_plan, get_dependencies
+
+    for model_class in get_plan():
+        print model_class, get_dependencies(model_class)
+"""
+
+from django.conf import settings
+from django.db import models
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.signals import class_prepared
+
+
+_profile_class = None
+_tenant_model_classes = None
+_plan = None
+_foreign_keys = {}
+
+
+def get_profile_class():
+    """
+    The model class pointed to by AUTH_PROFILE_MODULE, or None if the setting isn't there.
+    """
+    global _profile_class
+    if _profile_class is None:
+        label = getattr(settings, 'AUTH_PROFILE_MODULE', '')
+        if not label:
+            return None
+        app_label, model = label.split('.')
+        _profile_class = models.get_model(app_label, model)
+    return _profile_class
+
+
+def _has_tenant_fk(model_class):
+    from models import Tenant
+    try:
+        field = model_class._meta.get_field('tenant')
+    except FieldDoesNotExist:
+        return False
+    return field.rel is not None and field.rel.to is Tenant
+
+
+def get_bookkeeping_model_classes():
+    """
+    multitenant's own models that keep rows per tenant, in the tenant's database.  They aren't the tenant's data,
+    so they aren't tenant-aware models, but they go wherever the tenant's instances go.
+    """
+    from models import BaseTenantLink, ProvisioningStep
+    return (BaseTenantLink, ProvisioningStep)
+
+
+def get_tenant_model_classes():
+    """
+    All the installed tenant-aware models: subclasses of TenantModel, and any other model with a
+    foreign key called tenant pointing at Tenant, except multitenant's bookkeeping.
+    """
+    global _tenant_model_classes
+    if _tenant_model_classes is None:
+        from models import TenantModel
+        bookkeeping = get_bookkeeping_model_classes()
+        _tenant_model_classes = tuple(
+            model_class for model_class in models.get_models()
+            if (issubclass(model_class, TenantModel) or _has_tenant_fk(model_class))
+            and model_class not in bookkeeping
+        )
+    return _tenant_model_classes
+
+
+def get_model_label(model_class):
+    """
+    A string that identifies model_class, e.g. "multitenant.testtenantawaremodel".
+    """
+    return '%s.%s' % (model_class._meta.app_label, model_class._meta.object_name.lower())
+
+
+def get_model_by_label(label):
+    app_label, model = label.split('.')
+    return models.get_model(app_label, model)
+
+
+def is_tenant_model(model_class):
+    return model_class in get_tenant_model_classes()
+
+
+def get_clone_model_classes():
+    """
+    The tenant-aware models whose base tenant instances get cloned for a new tenant.
+    That's the TenantModel subclasses, except the user profile and the copy-on-write models.
+    """
+    from models import TenantModel
+    user_profile_class = get_profile_class()
+    return [
+        model_class for model_class in get_tenant_model_classes()
+        if issubclass(model_class, TenantModel) and model_class is not user_profile_class
+        and not model_class.copy_on_write
+    ]
+
+
+def get_foreign_keys(model_class):
+    """
+    The foreign keys of model_class that point at the primary key of another model, other than Tenant.
+    These are the ones that must be remapped when instances are copied from one tenant to another.
+    """
+    fields = _foreign_keys.get(model_class)
+    if fields is None:
+        from models import Tenant
+        fields = []
+        for field in model_class._meta.fields:
+            if field.rel is None or field.rel.to is Tenant:
+                continue
+            if field.rel.field_name != field.rel.to._meta.pk.name:
+                continue
+            fields.append(field)
+        _foreign_keys[model_class] = fields
+    return fields
+
+
+def get_m2m_fields(model_class):
+    """
+    The many-to-many fields of model_class that use an auto-created intermediary table.
+    An explicit "through" model is a model in its own right.
+    """
+    return [field for field in model_class._meta.many_to_many if field.rel.through._meta.auto_created]
+
+
+def get_dependencies(model_class):
+    """
+    The tenant-aware models that model_class has a foreign key or many-to-many relation to, not counting itself.
+    """
+    tenant_model_classes = get_tenant_model_classes()
+    related = [field.rel.to for field in get_foreign_keys(model_class) + get_m2m_fields(model_class)]
+    return set(m for m in related if m is not model_class and m in tenant_model_classes)
+
+
+def get_dependents(model_class):
+    """
+    The tenant-aware models that have a foreign key or many-to-many relation to model_class.
+    """
+    return set(m for m in get_tenant_model_classes() if model_class in get_dependencies(m))
+
+
+def dependency_order(model_classes):
+    """
+    Sorts model classes so that every model comes after the models it has a foreign key to.
+    Self-referencing foreign keys are ignored, and cycles are broken by falling back to model name order;
+    whoever follows the order must fix those references up afterwards.
+    """
+    model_classes = list(model_classes)
+    remaining = {}
+    for model_class in model_classes:
+        remaining[model_class] = set(
+            field.rel.to for field in get_foreign_keys(model_class)
+            if field.rel.to is not model_class and field.rel.to in model_classes
+        )
+
+    def sort_key(model_class):
+        return (model_class._meta.app_label, model_class._meta.object_name)
+
+    ordered = []
+    while remaining:
+        ready = sorted([m for m, deps in remaining.items() if not deps], key=sort_key)
+        if not ready:
+            # A cycle; pick one to go first.
+            ready = sorted(remaining.keys(), key=sort_key)[:1]
+        for model_class in ready:
+            ordered.append(model_class)
+            del remaining[model_class]
+        for deps in remaining.values():
+            deps.difference_update(ready)
+    return ordered
+
+
+def get_plan():
+    """
+    All the tenant-aware models, in dependency order.
+    """
+    global _plan
+    if _plan is None:
+        _plan = tuple(dependency_order(get_tenant_model_classes()))
+    return _plan
+
+
+def get_storage_plan():
+    """
+    Every model with rows belonging to a tenant, in dependency order: the plan, then the bookkeeping, which only
+    depends on Tenant.  Moving or deleting all of a tenant's rows goes through these.
+    """
+    return list(get_plan()) + list(get_bookkeeping_model_classes())
+
+
+def get_clone_plan():
+    """
+    The models that get cloned for a new tenant, in dependency order.
+    """
+    clone_model_classes = get_clone_model_classes()
+    return [model_class for model_class in get_plan() if model_class in clone_model_classes]
+
+
+def reset(**kwargs):
+    global _profile_class, _tenant_model_classes, _plan
+    _profile_class = None
+    _tenant_model_classes = None
+    _plan = None
+    _foreign_keys.clear()
+
+class_prepared.connect(reset)
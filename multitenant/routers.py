@@ -0,0 +1,201 @@
+"""
+Horizontal sharding: keeping each tenant's instances in a database of its own choosing.
+
+With TENANT_SHARDING = True, a TenantPlacement names the database (an alias from settings.DATABASES) that holds a
+tenant's instances; tenants without one stay in the default database.  The placements themselves, the Tenant
+table and the other models that aren't tenant-aware stay in the default database.
+
+tenant_objects, TenantModel.save() and delete(), and the cloning code send their queries to the tenant's database.
+Add the router to your settings so that everything else does too (related instances, the objects manager, ...):
+
+    TENANT_SHARDING = True
+    DATABASE_ROUTERS = ['multitenant.routers.TenantRouter']
+
+To move a tenant to another database:
+
+    ./manage.py move_tenant 42 shard2
+
+Placements are cached in memory, like the tenants in the middleware; other processes pick up a move after
+TENANT_CACHE_TIMEOUT seconds, so stop writing to a tenant while it moves.
+"""
+
+from django.core.management.color import no_style
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+
+from lru import LRUCache
+from middleware import get_current_tenant_id
+from registry import get_bookkeeping_model_classes, get_m2m_fields, get_profile_class, get_storage_plan, is_tenant_model
+from settings import BULK_BATCH_SIZE, TENANT_CACHE_SIZE, TENANT_CACHE_TIMEOUT, TENANT_SHARDING
+
+_databases = LRUCache(max_size=TENANT_CACHE_SIZE, timeout=TENANT_CACHE_TIMEOUT)
+
+
+def get_tenant_database(tenant_id, default=DEFAULT_DB_ALIAS):
+    """
+    The alias of the database holding tenant_id's instances.
+    default is returned when sharding is off, or the tenant has no placement.
+    """
+    if not TENANT_SHARDING or tenant_id is None:
+        return default
+    tenant_id = getattr(tenant_id, 'pk', tenant_id)
+    database = _databases.get(tenant_id)
+    if database is None:
+        from models import TenantPlacement
+        placements = TenantPlacement.objects.using(DEFAULT_DB_ALIAS).filter(tenant_id=tenant_id)
+        # An empty string stands for "no placement", so that it's cached too.
+        database = (placements.values_list('database', flat=True) or [''])[0]
+        _databases.set(tenant_id, database)
+    return database or default
+
+
+def forget_placement(tenant_id):
+    _databases.delete(tenant_id)
+
+
+def is_sharded_model(model_class):
+    """
+    True for the models whose instances live in their tenant's database: the tenant-aware models, except the user
+    profile, which is needed to find the tenant in the first place, and multitenant's bookkeeping.
+    """
+    if model_class in get_bookkeeping_model_classes():
+        return True
+    return is_tenant_model(model_class) and model_class is not get_profile_class()
+
+
+def get_model_database(model_class, tenant_id):
+    """
+    The alias of the database holding tenant_id's instances of model_class, or None if sharding doesn't
+    decide where they are.
+    """
+    if not TENANT_SHARDING or not is_sharded_model(model_class):
+        return None
+    return get_tenant_database(tenant_id)
+
+
+class TenantRouter(object):
+    """
+    Sends the queries for tenant-aware models to the database of the tenant they belong to: the instance's
+    tenant when there is an instance, the current tenant otherwise.
+    """
+    def _db(self, model, **hints):
+        instance = hints.get('instance')
+        tenant_id = getattr(instance, 'tenant_id', None)
+        if tenant_id is None:
+            tenant_id = get_current_tenant_id()
+        return get_model_database(model, tenant_id)
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Tenants (and the other models that aren't tenant-aware) can be referenced from any database.
+        if not is_tenant_model(obj1.__class__) or not is_tenant_model(obj2.__class__):
+            return True
+        if obj1.tenant_id == obj2.tenant_id:
+            return True
+        return None
+
+    def allow_syncdb(self, db, model):
+        from models import TenantPlacement
+        if model is TenantPlacement:
+            return db == DEFAULT_DB_ALIAS
+        return None
+
+
+def _copy_rows(model_class, rows, source, database):
+    """
+    Inserts rows, read from source, into database as they are, primary keys included, with their
+    many-to-many links.  Rows that were already copied are skipped.
+    """
+    from cloning import _batch_size, _chunks
+    manager = model_class._base_manager.db_manager(database)
+    existing = dict(manager.filter(pk__in=[row.pk for row in rows]).values_list('pk', 'tenant'))
+    for row in rows:
+        if row.pk in existing and existing[row.pk] != row.tenant_id:
+            raise ValueError('Some %s instances of another tenant already exist in database "%s" with the same '
+                'primary keys.' % (model_class._meta.object_name, database))
+    rows = [row for row in rows if row.pk not in existing]
+    if not rows:
+        return
+    manager.bulk_create(rows)
+
+    pks = [row.pk for row in rows]
+    for field in get_m2m_fields(model_class):
+        through = field.rel.through
+        links = list(through._base_manager.db_manager(source).filter(**{'%s__in' % field.m2m_field_name(): pks}))
+        for batch in _chunks(links, _batch_size(through, database)):
+            through._base_manager.db_manager(database).bulk_create(batch)
+
+
+def copy_tenant(tenant_id, source, database):
+    """
+    Copies all of tenant_id's instances from the source database to another one, as they are, primary keys
+    included, in batches of TENANT_BULK_BATCH_SIZE.  It all goes in a single transaction: instances may refer to
+    others of their model, or of a model copied later (cycles), and those references can only be checked once
+    every instance is there.  Instances already in the other database are skipped.
+    Returns the number of instances copied.
+    """
+    from cloning import _batch_size
+    from models import Tenant
+
+    plan = [model_class for model_class in get_storage_plan() if is_sharded_model(model_class)]
+    copied = 0
+    with transaction.commit_on_success(using=database):
+        # The tenant's instances have a foreign key to it, so the Tenant must be there too.
+        if not Tenant.objects.using(database).filter(pk=tenant_id).exists():
+            Tenant.objects.using(database).bulk_create([Tenant.objects.using(DEFAULT_DB_ALIAS).get(pk=tenant_id)])
+
+        for model_class in plan:
+            batch_size = _batch_size(model_class, database)
+            rows = []
+            for row in model_class._base_manager.db_manager(source).filter(tenant=tenant_id).order_by('pk').iterator():
+                rows.append(row)
+                if len(rows) == batch_size:
+                    _copy_rows(model_class, rows, source, database)
+                    copied += len(rows)
+                    rows = []
+            _copy_rows(model_class, rows, source, database)
+            copied += len(rows)
+
+        # Inserting explicit primary keys doesn't move the sequences along (PostgreSQL, Oracle).
+        sequence_models = plan + [field.rel.through for model_class in plan for field in get_m2m_fields(model_class)]
+        cursor = connections[database].cursor()
+        for sql in connections[database].ops.sequence_reset_sql(no_style(), sequence_models):
+            cursor.execute(sql)
+    return copied
+
+
+def delete_tenant_rows(tenant_id, using, pause=0):
+    """
+    Deletes all of tenant_id's instances from one database, in batches, leaving the Tenant.
+    Like purge_tenant(), the references between the instances are cut first, so that no batch trips over them.
+    """
+    from purge import _cut_references, purge_model
+    plan = [model_class for model_class in reversed(get_storage_plan()) if is_sharded_model(model_class)]
+    for model_class in plan:
+        _cut_references(model_class, tenant_id, plan, BULK_BATCH_SIZE, pause, using)
+    for model_class in plan:
+        purge_model(model_class, tenant_id, pause=pause, using=using)
+
+
+def move_tenant(tenant, database):
+    """
+    Moves all of a tenant's instances to another database, keeping their primary keys, and updates the
+    tenant's placement.  The instances are copied first, then the placement is switched, and only then are
+    they deleted from the old database.
+    Returns the number of instances moved.
+    """
+    from models import TenantPlacement
+
+    tenant_id = getattr(tenant, 'pk', tenant)
+    source = get_tenant_database(tenant_id)
+    if source == database:
+        return 0
+    moved = copy_tenant(tenant_id, source, database)
+
+    TenantPlacement.objects.using(DEFAULT_DB_ALIAS).filter(tenant_id=tenant_id).delete()
+    TenantPlacement.objects.using(DEFAULT_DB_ALIAS).create(tenant_id=tenant_id, database=database)
+    forget_placement(tenant_id)
+
+    delete_tenant_rows(tenant_id, source)
+    return moved
@@ -1,3 +1,56 @@
 from django.conf import settings
 
 BASE_TENANT_ID = getattr(settings, 'BASE_TENANT_ID', 1)
+
+# Number of rows inserted or updated per query by the bulk operations (cloning etc.)
+BULK_BATCH_SIZE = getattr(settings, 'TENANT_BULK_BATCH_SIZE', 500)
+
+# The middleware keeps the tenant of recently seen users, and the tenants themselves, in memory.
+# Entries are dropped when the Tenant or user profile changes, or after TENANT_CACHE_TIMEOUT seconds
+# (None to keep them until they change); at most TENANT_CACHE_SIZE users are remembered.
+TENANT_CACHE_TIMEOUT = getattr(settings, 'TENANT_CACHE_TIMEOUT', 300)
+TENANT_CACHE_SIZE = getattr(settings, 'TENANT_CACHE_SIZE', 10000)
+
+# When True, the middleware doesn't look up the tenant until the request actually needs it.
+LAZY_TENANT_RESOLUTION = getattr(settings, 'TENANT_LAZY_RESOLUTION', False)
+
+# How long TenantModelForm keeps the choices of its fields in the cache, when cache_tenant_choices is set.
+# They're dropped earlier if an instance of the model is saved or deleted.
+TENANT_CHOICES_CACHE_TIMEOUT = getattr(settings, 'TENANT_CHOICES_CACHE_TIMEOUT', 300)
+
+# How ThreadLocals finds the request's tenant: each function is given the request in turn, and the first one that
+# returns a tenant id wins; with none, it's the base tenant.  The other resolvers in multitenant.middleware are
+# resolve_by_host (Tenant.hostname, or its subdomain of TENANT_DOMAIN) and resolve_by_header (TENANT_HEADER).
+TENANT_RESOLVERS = getattr(settings, 'TENANT_RESOLVERS', ('multitenant.middleware.resolve_by_profile',))
+TENANT_DOMAIN = getattr(settings, 'TENANT_DOMAIN', None)
+TENANT_HEADER = getattr(settings, 'TENANT_HEADER', 'X-Tenant-ID')
+
+# How many query results TenantMgr(cache_results=True) keeps in memory, per process, and for how many seconds at
+# most; see multitenant.querycache.
+TENANT_QUERY_CACHE_SIZE = getattr(settings, 'TENANT_QUERY_CACHE_SIZE', 1000)
+TENANT_QUERY_CACHE_TIMEOUT = getattr(settings, 'TENANT_QUERY_CACHE_TIMEOUT', 300)
+
+# How new tenants get their copy of the base tenant:
+#   'sync'   - right away, while the Tenant is being saved
+#   'thread' - in a background thread of the same process
+#   'queue'  - by the provision_tenants management command
+TENANT_PROVISIONING = getattr(settings, 'TENANT_PROVISIONING', 'sync')
+
+# A tenant still being provisioned after this many seconds is assumed to have been abandoned by its worker.
+TENANT_PROVISIONING_TIMEOUT = getattr(settings, 'TENANT_PROVISIONING_TIMEOUT', 600)
+
+# When True, each tenant's instances live in the database named by its TenantPlacement (the default database
+# if it has none); see multitenant.routers.
+TENANT_SHARDING = getattr(settings, 'TENANT_SHARDING', False)
+
+# The database (an alias from settings.DATABASES) that archived tenants' instances are moved to; see multitenant.archive.
+TENANT_ARCHIVE_DATABASE = getattr(settings, 'TENANT_ARCHIVE_DATABASE', None)
+
+# How long, in seconds, a request waits for an archived tenant that's being archived or rehydrated by someone else.
+TENANT_REHYDRATE_WAIT = getattr(settings, 'TENANT_REHYDRATE_WAIT', 30)
+
+# When True, queries and requests are counted and timed per tenant; see multitenant.instrumentation.
+TENANT_INSTRUMENTATION = getattr(settings, 'TENANT_INSTRUMENTATION', False)
+
+# How often, in seconds, each process adds its counters to the TenantStats table.
+TENANT_STATS_FLUSH_INTERVAL = getattr(settings, 'TENANT_STATS_FLUSH_INTERVAL', 60)
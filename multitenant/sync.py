@@ -0,0 +1,358 @@
+"""
+Propagating changes made to the base tenant to the tenants that were cloned from it.
+
+A new tenant gets a copy of the base tenant once, when it is created.  After adding or fixing base tenant
+instances, run:
+
+    ./manage.py sync_base_tenant
+
+Every tenant then gets the base tenant instances that were added since its last sync, and the changes made to
+the base tenant instances it has a copy of.  A copy that the tenant has changed is customized, and left alone;
+so is a copy the tenant has deleted.  Base tenant instances that were deleted are not deleted from the tenants.
+
+How it works: when a tenant is cloned from the base tenant, a BaseTenantLink records which of its instances
+came from which base tenant instance.  Each sync keeps the values of every base tenant instance in a
+BaseTenantSnapshot, and the next sync compares the base tenant against them.  A copy is customized when its
+values no longer match the snapshot.  Changes are applied one base tenant instance at a time, to all the
+tenants at once, with bulk inserts and a single UPDATE, in one transaction per model.
+
+Tenants created before the links were recorded have no template_version, and are left out: there's no way to
+tell which of their instances came from the base tenant.  sync_base_tenant --adopt makes them receive the base
+tenant instances added after that sync.
+
+Many-to-many links are not synced, only the fields of the instances.
+"""
+
+import json
+import logging
+
+from django.db import connections, transaction, DEFAULT_DB_ALIAS
+from django.db.models import Max
+
+from cloning import _batch_size, _chunks, _update_fk
+from generations import bump_generation
+from middleware import forget_tenant
+from registry import get_clone_plan, get_foreign_keys, get_model_label, is_tenant_model
+from settings import BASE_TENANT_ID
+
+logger = logging.getLogger('multitenant')
+
+
+def get_template_version(using=DEFAULT_DB_ALIAS):
+    """
+    The version of the base tenant as of the last sync; 0 before the first one.
+    """
+    from models import BaseTenantSnapshot
+    return BaseTenantSnapshot.objects.using(using).aggregate(version=Max('version'))['version'] or 0
+
+
+def record_links(tenant_id, pk_maps, using=DEFAULT_DB_ALIAS):
+    """
+    Records which of tenant_id's instances were cloned from which base tenant instances.
+    pk_maps is a dict of {model class: {base pk: new pk}}, as returned by clone_tenant().
+    """
+    from models import BaseTenantLink, Tenant
+
+    links = []
+    for model_class, pk_map in pk_maps.items():
+        label = get_model_label(model_class)
+        for base_pk, local_pk in (pk_map or {}).items():
+            links.append(BaseTenantLink(tenant_id=tenant_id, model=label, base_pk=base_pk, local_pk=local_pk))
+    for batch in _chunks(links, _batch_size(BaseTenantLink, using)):
+        BaseTenantLink.objects.using(using).bulk_create(batch)
+
+    Tenant.objects.using(using).filter(pk=tenant_id).update(template_version=get_template_version(using))
+    forget_tenant(tenant_id)
+
+
+def _sync_fields(model_class):
+    return [field for field in model_class._meta.local_fields if not field.primary_key and field.name != 'tenant']
+
+
+def _values(obj, fields):
+    return dict((field.attname, field.value_to_string(obj)) for field in fields)
+
+
+def _links(model_class, base_pk, using):
+    """
+    {tenant id: pk of the tenant's copy} for every tenant that still has a copy of base_pk.
+    """
+    from models import BaseTenantLink
+    return dict(
+        BaseTenantLink.objects.using(using)
+        .filter(model=get_model_label(model_class), base_pk=base_pk, local_pk__isnull=False)
+        .values_list('tenant', 'local_pk')
+    )
+
+
+class _Mapper(object):
+    """
+    Translates foreign key values from the base tenant to a given tenant, looking up the links once per value.
+    A reference to a cloned model maps to the tenant's copy, or None if the tenant has none; a reference to a
+    shared model (copy-on-write, or not tenant-aware) stays as it is unless the tenant has its own copy.
+    """
+    def __init__(self, using):
+        self.using = using
+        self.clone_plan = get_clone_plan()
+        self.cache = {}
+
+    def map(self, field, value, tenant_id):
+        if value is None:
+            return None
+        target = field.rel.to
+        if not is_tenant_model(target):
+            return value
+        key = (target, value)
+        if key not in self.cache:
+            self.cache[key] = _links(target, value, self.using)
+        local_pk = self.cache[key].get(tenant_id)
+        if local_pk is None and target not in self.clone_plan:
+            return value
+        return local_pk
+
+    def forget(self, model_class, base_pk):
+        self.cache.pop((model_class, base_pk), None)
+
+
+def _diff(model_class, using):
+    """
+    Compares the base tenant instances of model_class with their snapshots.
+    Returns (added, changed, removed): lists of (instance, values), (instance, old values, values) and snapshots.
+    """
+    from models import BaseTenantSnapshot
+    fields = _sync_fields(model_class)
+    snapshots = dict(
+        (snapshot.base_pk, snapshot)
+        for snapshot in BaseTenantSnapshot.objects.using(using).filter(model=get_model_label(model_class))
+    )
+    added, changed = [], []
+    for obj in model_class._base_manager.db_manager(using).filter(tenant=BASE_TENANT_ID).order_by('pk'):
+        values = _values(obj, fields)
+        snapshot = snapshots.pop(obj.pk, None)
+        if snapshot is None:
+            added.append((obj, values))
+        else:
+            old_values = json.loads(snapshot.data)
+            if old_values != values:
+                changed.append((obj, old_values, values))
+    return added, changed, snapshots.values()
+
+
+def _insert(model_class, obj, tenant_ids, mapper, deferred, using):
+    """
+    Copies the base tenant instance obj to every tenant in tenant_ids that doesn't have it yet.
+    Returns the ids of the tenants that got a copy.
+    """
+    from models import BaseTenantLink
+
+    label = get_model_label(model_class)
+    linked = set(
+        BaseTenantLink.objects.using(using).filter(model=label, base_pk=obj.pk).values_list('tenant', flat=True))
+    fks = [field for field in get_foreign_keys(model_class) if field in _sync_fields(model_class)]
+
+    copies, pending = [], []
+    for tenant_id in tenant_ids:
+        if tenant_id in linked:
+            continue
+        copy = model_class(**dict((field.attname, getattr(obj, field.attname)) for field in model_class._meta.local_fields))
+        copy.pk = None
+        copy.tenant_id = tenant_id
+        skip = False
+        unresolved = []
+        for field in fks:
+            value = getattr(obj, field.attname)
+            mapped = mapper.map(field, value, tenant_id)
+            if value is not None and mapped is None:
+                if not field.null:
+                    logger.warning('Not syncing %s %s to tenant %s: it has no copy of %s %s.',
+                        label, obj.pk, tenant_id, field.rel.to._meta.object_name, value)
+                    skip = True
+                    break
+                # Maybe the target gets synced later in this run; try again at the end.
+                unresolved.append((len(copies), field, value))
+            setattr(copy, field.attname, mapped)
+        if not skip:
+            pending.extend(unresolved)
+            copies.append(copy)
+    if not copies:
+        return []
+
+    manager = model_class._base_manager.db_manager(using)
+    pk_name = model_class._meta.pk.name
+    before = manager.aggregate(max_pk=Max(pk_name))['max_pk']
+    for batch in _chunks(copies, _batch_size(model_class, using)):
+        manager.bulk_create(batch)
+
+    # bulk_create doesn't set the primary keys; read them back, one new instance per tenant.  Only rows of those
+    # tenants, above the previous maximum, with the values just inserted will do: anything else was added meanwhile.
+    # auto_now and auto_now_add fields got a new value on the way in, so they can't be matched.
+    plain = dict((field.attname, getattr(obj, field.attname)) for field in _sync_fields(model_class)
+                 if field not in fks and not getattr(field, 'auto_now', False)
+                 and not getattr(field, 'auto_now_add', False))
+    inserted = manager.filter(**plain)
+    if before is not None:
+        inserted = inserted.filter(pk__gt=before)
+    new_pks = {}
+    for batch in _chunks(copies, _batch_size(model_class, using, params_per_row=1)):
+        for pk, tenant_id in inserted.filter(tenant__in=[copy.tenant_id for copy in batch]).values_list('pk', 'tenant'):
+            new_pks.setdefault(tenant_id, []).append(pk)
+    for copy in copies:
+        pks = new_pks.get(copy.tenant_id, [])
+        if len(pks) != 1:
+            raise ValueError('Could not read back the primary key of the %s instance synced to tenant %s: %s rows '
+                'match.' % (model_class._meta.object_name, copy.tenant_id, len(pks)))
+        copy.pk = pks[0]
+    for index, field, value in pending:
+        deferred.append((model_class, field, copies[index].tenant_id, copies[index].pk, value))
+
+    links = [BaseTenantLink(tenant_id=copy.tenant_id, model=label, base_pk=obj.pk, local_pk=copy.pk) for copy in copies]
+    for batch in _chunks(links, _batch_size(BaseTenantLink, using)):
+        BaseTenantLink.objects.using(using).bulk_create(batch)
+    mapper.forget(model_class, obj.pk)
+    return [copy.tenant_id for copy in copies]
+
+
+def _update(model_class, obj, old_values, values, mapper, using):
+    """
+    Applies the changes made to the base tenant instance obj to the tenants' copies that weren't customized,
+    with a single UPDATE: the copies are found through their links, and only those whose values still match the
+    snapshot are changed.  Foreign keys are mapped to each tenant's copy of their target in SQL, as _Mapper
+    would.  Returns the number of copies updated.
+    """
+    from models import BaseTenantLink
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    table = qn(model_class._meta.db_table)
+    links = BaseTenantLink._meta
+    link_table = qn(links.db_table)
+    link_tenant, link_model, link_base_pk, link_local_pk = [
+        qn(links.get_field(name).column) for name in ('tenant', 'model', 'base_pk', 'local_pk')]
+    tenant_column = '%s.%s' % (table, qn(model_class._meta.get_field('tenant').column))
+    fields = _sync_fields(model_class)
+    fks = set(get_foreign_keys(model_class))
+    changed = [field for field in fields if old_values.get(field.attname) != values[field.attname]]
+
+    def mapped(field, value, params):
+        # The row's tenant's copy of what value, a base tenant pk, points at.
+        target = field.rel.to
+        if not is_tenant_model(target):
+            params.append(value)
+            return '%s'
+        sql = '(SELECT l.%s FROM %s l WHERE l.%s = %s AND l.%s = %%s AND l.%s = %%s AND l.%s IS NOT NULL)' % (
+            link_local_pk, link_table, link_tenant, tenant_column, link_model, link_base_pk, link_local_pk)
+        params.extend([get_model_label(target), value])
+        if target not in mapper.clone_plan:
+            # Shared targets stay as they are, unless the tenant has its own copy.
+            params.append(value)
+            return 'COALESCE(%s, %%s)' % sql
+        return sql
+
+    assignments, assignment_params = [], []
+    where, where_params = [], []
+    for field in changed:
+        value = getattr(obj, field.attname)
+        if field in fks and value is not None:
+            assignments.append('%s = %s' % (qn(field.column), mapped(field, value, assignment_params)))
+            if not field.null:
+                # A copy whose tenant has nothing to point at is left alone.
+                where.append('%s IS NOT NULL' % mapped(field, value, where_params))
+        else:
+            assignments.append('%s = %%s' % qn(field.column))
+            assignment_params.append(field.get_db_prep_save(value, connection=connection))
+    if not assignments:
+        return 0
+
+    # Copies that were customized no longer match the snapshot.
+    for field in fields:
+        column = '%s.%s' % (table, qn(field.column))
+        old_value = old_values.get(field.attname)
+        # value_to_string() puts None as u'None', or as u'' for fields that don't take empty strings (dates...).
+        if old_value in (None, u'None') or (old_value == u'' and not field.empty_strings_allowed):
+            where.append('%s IS NULL' % column)
+        elif field in fks:
+            params = []
+            expected = mapped(field, field.rel.to._meta.pk.to_python(old_value), params)
+            where.append('(%s = %s OR (%s IS NULL AND %s IS NULL))' % (column, expected, column, expected))
+            where_params.extend(params + params)
+        else:
+            where.append('%s = %%s' % column)
+            where_params.append(field.get_db_prep_save(field.to_python(old_value), connection=connection))
+
+    sql = 'UPDATE %s SET %s WHERE %s.%s IN (SELECT %s FROM %s WHERE %s = %%s AND %s = %%s AND %s IS NOT NULL)' % (
+        table, ', '.join(assignments), table, qn(model_class._meta.pk.column),
+        link_local_pk, link_table, link_model, link_base_pk, link_local_pk)
+    sql = ' AND '.join([sql] + where)
+    cursor = connection.cursor()
+    cursor.execute(sql, assignment_params + [get_model_label(model_class), obj.pk] + where_params)
+    return cursor.rowcount
+
+
+def sync_base_tenant(adopt=False, using=DEFAULT_DB_ALIAS):
+    """
+    Propagates the changes made to the base tenant since the last sync to all the tenants that were cloned from it.
+    With adopt, tenants that have no template_version yet will receive base tenant instances added from now on.
+    Returns a dict of {model class: (number of copies inserted, number of copies updated)}.
+    """
+    from models import BaseTenantSnapshot, Tenant
+
+    version = get_template_version(using) + 1
+    tenants = Tenant.objects.using(using).exclude(pk=BASE_TENANT_ID)
+    tenant_ids = list(tenants.filter(template_version__lt=version).values_list('pk', flat=True))
+    mapper = _Mapper(using)
+    deferred = []
+    counts = {}
+    snapshots = []
+
+    for model_class in get_clone_plan():
+        added, changed, removed = _diff(model_class, using)
+        inserted = updated = 0
+        touched = set()
+        with transaction.commit_on_success(using=using):
+            for obj, values in added:
+                done = _insert(model_class, obj, tenant_ids, mapper, deferred, using)
+                inserted += len(done)
+                touched.update(done)
+            for obj, old_values, values in changed:
+                updated += _update(model_class, obj, old_values, values, mapper, using)
+        if updated:
+            # Which tenants' copies changed isn't known, only how many did.
+            touched.update(tenant_ids)
+        for tenant_id in touched:
+            bump_generation(model_class, tenant_id)
+        counts[model_class] = (inserted, updated)
+        snapshots.append((model_class, added, changed, removed))
+
+    with transaction.commit_on_success(using=using):
+        # References to instances that were synced after the instance holding them.
+        grouped = {}
+        for model_class, field, tenant_id, pk, value in deferred:
+            mapper.forget(field.rel.to, value)
+            mapped = mapper.map(field, value, tenant_id)
+            if mapped is not None:
+                grouped.setdefault((model_class, field), []).append((pk, mapped))
+        for (model_class, field), assignments in grouped.items():
+            _update_fk(model_class, field, assignments, using)
+
+        # Only now that every tenant has the changes, remember them as synced.
+        for model_class, added, changed, removed in snapshots:
+            label = get_model_label(model_class)
+            manager = BaseTenantSnapshot.objects.using(using)
+            for batch in _chunks([snapshot.pk for snapshot in removed], _batch_size(BaseTenantSnapshot, using, params_per_row=1)):
+                manager.filter(pk__in=batch).delete()
+            for obj, old_values, values in changed:
+                manager.filter(model=label, base_pk=obj.pk).update(data=json.dumps(values), version=version)
+            new = [BaseTenantSnapshot(model=label, base_pk=obj.pk, data=json.dumps(values), version=version) for obj, values in added]
+            for batch in _chunks(new, _batch_size(BaseTenantSnapshot, using)):
+                manager.bulk_create(batch)
+
+        if get_template_version(using) < version:
+            # Nothing changed; keep the current version.
+            version -= 1
+        for batch in _chunks(tenant_ids, _batch_size(Tenant, using, params_per_row=1)):
+            tenants.filter(pk__in=batch).update(template_version=version)
+        if adopt:
+            tenants.filter(template_version__isnull=True).update(template_version=version)
+
+    for tenant_id in tenant_ids:
+        forget_tenant(tenant_id)
+    return counts
@@ -0,0 +1,56 @@
+"""
+The tenant_cache tag: like django's cache tag, with a separate copy of the fragment for each tenant.
+
+    {% load multitenant_cache %}
+    {% tenant_cache 500 sidebar request.user.username %}
+        .. sidebar for logged in user ..
+    {% endtenant_cache %}
+"""
+
+import hashlib
+
+from django import template
+from django.template import resolve_variable
+from django.utils.http import urlquote
+
+from multitenant.cache import tenant_cache
+
+register = template.Library()
+
+
+def make_fragment_key(fragment_name, vary_on=None):
+    """
+    The key of a fragment in tenant_cache, e.g. to delete it after a change.
+    """
+    args = hashlib.md5(u':'.join([urlquote(var) for var in vary_on or ()]).encode('utf-8'))
+    return 'template.cache.%s.%s' % (fragment_name, args.hexdigest())
+
+
+class TenantCacheNode(template.Node):
+    def __init__(self, nodelist, expire_time_var, fragment_name, vary_on):
+        self.nodelist = nodelist
+        self.expire_time_var = expire_time_var
+        self.fragment_name = fragment_name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        try:
+            expire_time = int(self.expire_time_var.resolve(context))
+        except (template.VariableDoesNotExist, ValueError, TypeError):
+            raise template.TemplateSyntaxError('"tenant_cache" tag got an unknown or non-integer timeout value: %r' % self.expire_time_var.var)
+        key = make_fragment_key(self.fragment_name, [resolve_variable(var, context) for var in self.vary_on])
+        value = tenant_cache.get(key)
+        if value is None:
+            value = self.nodelist.render(context)
+            tenant_cache.set(key, value, expire_time)
+        return value
+
+
+@register.tag('tenant_cache')
+def do_tenant_cache(parser, token):
+    nodelist = parser.parse(('endtenant_cache',))
+    parser.delete_first_token()
+    tokens = token.contents.split()
+    if len(tokens) < 3:
+        raise template.TemplateSyntaxError(u"'%r' tag requires at least 2 arguments." % tokens[0])
+    return TenantCacheNode(nodelist, parser.compile_filter(tokens[1]), tokens[2], tokens[3:])
@@ -2,3 +2,20 @@ from multitenant.tests.forms import *
 from multitenant.tests.middleware import *
 from multitenant.tests.models import *
 from multitenant.tests.utils import *
+from multitenant.tests.cloning import *
+from multitenant.tests.registry import *
+from multitenant.tests.provisioning import *
+from multitenant.tests.copyonwrite import *
+from multitenant.tests.sync import *
+from multitenant.tests.routers import *
+from multitenant.tests.transfer import *
+from multitenant.tests.purge import *
+from multitenant.tests.archive import *
+from multitenant.tests.instrumentation import *
+from multitenant.tests.cache import *
+from multitenant.tests.querycache import *
+from multitenant.tests.indexes import *
+from multitenant.tests.batch import *
+from multitenant.tests.integrity import *
+from multitenant.tests.metering import *
+from multitenant.tests.admin import *
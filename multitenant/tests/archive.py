@@ -0,0 +1,67 @@
+import datetime
+
+from django.conf import settings
+from django.test import TestCase
+from django.utils import unittest
+
+from multitenant.models import *
+from multitenant import archive
+from multitenant.archive import TenantBusy, archive_tenant, dormant_tenants, rehydrate_tenant
+from multitenant.middleware import ThreadLocals, get_current_tenant, set_tenant_to_default
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+@unittest.skipUnless('other' in settings.DATABASES, "Needs a second database called 'other'.")
+class TenantArchiveTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.user = User.objects.create_user(username='user1', email='user1@example.com', password='123')
+        get_profile_class().objects.create(user=self.user, tenant=self.tenant)
+        parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.tenant)
+        self.child = TestTenantAwareModel.objects.create(name='child', tenant=self.tenant, fkfield=parent)
+        self.database = archive.TENANT_ARCHIVE_DATABASE
+        archive.TENANT_ARCHIVE_DATABASE = 'other'
+
+    def tearDown(self):
+        archive.TENANT_ARCHIVE_DATABASE = self.database
+        set_tenant_to_default()
+
+    def test_archive_and_rehydrate(self):
+        self.assertEqual(archive_tenant(self.tenant), 2)
+        self.assertTrue(Tenant.objects.get(pk=self.tenant.pk).archived)
+        self.assertFalse(TestTenantAwareModel.objects.using('default').filter(tenant=self.tenant).exists())
+        self.assertEqual(TestTenantAwareModel.objects.using('other').filter(tenant=self.tenant).count(), 2)
+
+        self.assertEqual(rehydrate_tenant(self.tenant), 2)
+        self.assertFalse(Tenant.objects.get(pk=self.tenant.pk).archived)
+        self.assertEqual(TestTenantAwareModel.objects.using('default').get(pk=self.child.pk).fkfield.name, 'parent')
+        self.assertFalse(TestTenantAwareModel.objects.using('other').filter(tenant=self.tenant).exists())
+
+    def test_one_transition_at_a_time(self):
+        archive_tenant(self.tenant)
+        Tenant.objects.filter(pk=self.tenant.pk).update(archive_transition='rehydrating')
+        self.assertRaises(TenantBusy, rehydrate_tenant, self.tenant)
+        self.assertEqual(TestTenantAwareModel.objects.using('other').filter(tenant=self.tenant).count(), 2)
+
+        Tenant.objects.filter(pk=self.tenant.pk).update(archive_transition='')
+        self.assertEqual(rehydrate_tenant(self.tenant), 2)
+        # A second request coming in after the first one brought the tenant back has nothing left to do.
+        self.assertEqual(rehydrate_tenant(self.tenant), 0)
+
+    def test_middleware_rehydrates(self):
+        archive_tenant(self.tenant)
+        request = type('Request', (object,), {'user': self.user})()
+        middleware = ThreadLocals()
+        middleware.process_request(request)
+        self.assertEqual(get_current_tenant(), self.tenant)
+        self.assertEqual(TestTenantAwareModel.tenant_objects.count(), 2)
+        middleware.process_response(request, None)
+
+    def test_dormant_tenants(self):
+        self.assertEqual(list(dormant_tenants(30)), [])
+        User.objects.filter(pk=self.user.pk).update(last_login=datetime.datetime.now() - datetime.timedelta(days=60))
+        self.assertEqual(list(dormant_tenants(30)), [self.tenant])
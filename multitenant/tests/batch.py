@@ -0,0 +1,51 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.batch import CommandJob, for_each_tenant, get_tenants
+from multitenant.middleware import get_current_tenant_id
+from multitenant.settings import BASE_TENANT_ID
+
+
+def current_tenant_id(tenant):
+    return get_current_tenant_id()
+
+
+def fail_for_tenant2(tenant):
+    if tenant.name == 'Tenant2':
+        raise ValueError('Tenant2')
+    return tenant.pk
+
+
+
+class ForEachTenantTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        self.tenant3 = Tenant.objects.create(name='Tenant3', email='tenant3@example.com', archived=True)
+
+    def test_get_tenants(self):
+        self.assertEqual(list(get_tenants()), [self.tenant1, self.tenant2])
+        self.assertEqual(list(get_tenants(exclude=[self.tenant1.pk])), [self.tenant2])
+        self.assertEqual(list(get_tenants([self.base.pk, self.tenant3.pk], include_base=True, include_archived=True)), [self.base, self.tenant3])
+
+    def test_current_tenant_is_set(self):
+        report = for_each_tenant(current_tenant_id)
+        self.assertEqual(report.results, {self.tenant1.pk: self.tenant1.pk, self.tenant2.pk: self.tenant2.pk})
+
+    def test_errors_are_isolated(self):
+        report = for_each_tenant(fail_for_tenant2, get_tenants(include_base=True))
+        self.assertEqual(sorted(report.results), [self.base.pk, self.tenant1.pk])
+        self.assertEqual(report.errors.keys(), [self.tenant2.pk])
+        self.assertTrue('ValueError: Tenant2' in report.errors[self.tenant2.pk])
+        self.assertTrue('1 failed' in report.summary())
+
+    def test_callback(self):
+        seen = []
+        for_each_tenant(current_tenant_id, callback=lambda tenant_id, ok, value: seen.append((tenant_id, ok)))
+        self.assertEqual(sorted(seen), [(self.tenant1.pk, True), (self.tenant2.pk, True)])
+
+    def test_command_job(self):
+        report = for_each_tenant(CommandJob('tenant_stats', ['--hours=1']), [self.tenant1])
+        self.assertEqual(report.errors, {})
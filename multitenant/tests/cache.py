@@ -0,0 +1,102 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import get_cache
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import TestCase
+from django.test.client import RequestFactory
+
+from multitenant.models import *
+from multitenant.cache import TenantCache, invalidate_tenant, tenant_cache_page
+from multitenant.cache import TenantFetchFromCacheMiddleware, TenantUpdateCacheMiddleware
+from multitenant.middleware import ThreadLocals, get_current_tenant_id, set_current_tenant, set_tenant_to_default
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class TenantCacheTests(TestCase):
+
+    def setUp(self):
+        self.backend = get_cache('django.core.cache.backends.locmem.LocMemCache', LOCATION='multitenant-tests')
+        self.backend.clear()
+        self.cache = TenantCache(self.backend)
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        # The pages and fragments go to the default cache, which outlives the test's tenant ids.
+        invalidate_tenant(self.tenant1)
+        invalidate_tenant(self.tenant2)
+
+    def tearDown(self):
+        set_tenant_to_default()
+
+    def test_keys_are_kept_apart(self):
+        set_current_tenant(self.tenant1)
+        self.cache.set('sidebar', 'one')
+        set_current_tenant(self.tenant2)
+        self.assertEqual(self.cache.get('sidebar'), None)
+        self.cache.set('sidebar', 'two')
+        self.assertEqual(self.cache.for_tenant(self.tenant1).get('sidebar'), 'one')
+        self.assertEqual(self.cache.get('sidebar'), 'two')
+
+    def test_many(self):
+        set_current_tenant(self.tenant1)
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2})
+        self.cache.delete_many(['a'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {'b': 2})
+
+    def test_invalidate_tenant(self):
+        self.cache.for_tenant(self.tenant1).set('sidebar', 'one')
+        self.cache.for_tenant(self.tenant2).set('sidebar', 'two')
+        invalidate_tenant(self.tenant1, self.backend)
+        self.assertEqual(self.cache.for_tenant(self.tenant1).get('sidebar'), None)
+        self.assertEqual(self.cache.for_tenant(self.tenant2).get('sidebar'), 'two')
+
+    def test_template_fragment(self):
+        template = Template('{% load multitenant_cache %}{% tenant_cache 60 greeting %}{{ name }}{% endtenant_cache %}')
+        set_current_tenant(self.tenant1)
+        self.assertEqual(template.render(Context({'name': 'one'})), 'one')
+        self.assertEqual(template.render(Context({'name': 'changed'})), 'one')
+        set_current_tenant(self.tenant2)
+        self.assertEqual(template.render(Context({'name': 'two'})), 'two')
+
+    def test_cache_page(self):
+        calls = []
+        @tenant_cache_page(60)
+        def view(request):
+            calls.append(request)
+            return HttpResponse('page')
+
+        request = RequestFactory().get('/bugs/')
+        set_current_tenant(self.tenant1)
+        view(request)
+        view(request)
+        self.assertEqual(len(calls), 1)
+        set_current_tenant(self.tenant2)
+        view(request)
+        self.assertEqual(len(calls), 2)
+
+    def test_site_wide_middleware(self):
+        # As in MIDDLEWARE_CLASSES: TenantUpdateCacheMiddleware, ..., ThreadLocals, TenantFetchFromCacheMiddleware.
+        Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={'name': 'Base Tenant', 'email': 'base@example.com'})
+        invalidate_tenant(BASE_TENANT_ID)
+        update, thread_locals, fetch = TenantUpdateCacheMiddleware(), ThreadLocals(), TenantFetchFromCacheMiddleware()
+        user = User.objects.create_user(username='user1', email='user1@example.com', password='123')
+        get_profile_class().objects.create(user=user, tenant=self.tenant1)
+
+        def get(user):
+            request = RequestFactory().get('/bugs/')
+            request.user = user
+            thread_locals.process_request(request)
+            response = fetch.process_request(request)
+            if response is None:
+                response = HttpResponse('tenant %s' % get_current_tenant_id())
+            response = thread_locals.process_response(request, response)
+            return update.process_response(request, response).content
+
+        set_tenant_to_default()
+        self.assertEqual(get(User.objects.get(pk=user.pk)), 'tenant %s' % self.tenant1.pk)
+        # The page was stored for tenant1, not for the tenant left current once ThreadLocals was done.
+        self.assertEqual(get(AnonymousUser()), 'tenant %s' % BASE_TENANT_ID)
+        set_current_tenant(self.tenant2)
+        self.assertEqual(get(User.objects.get(pk=user.pk)), 'tenant %s' % self.tenant1.pk)
+        self.assertEqual(get(AnonymousUser()), 'tenant %s' % BASE_TENANT_ID)
@@ -0,0 +1,47 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.cloning import clone_tenant
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class TenantCloningTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.base)
+        self.child = TestTenantAwareModel.objects.create(name='child', tenant=self.base, fkfield=self.parent)
+        self.child.m2mfield.add(self.parent)
+
+    def tearDown(self):
+        pass
+
+    def test_foreign_keys_are_remapped(self):
+        new_tenant = Tenant.objects.create(name='new', email='new@example.com')
+        child = TestTenantAwareModel.objects.get(tenant=new_tenant, name='child')
+        self.assertEqual(child.fkfield.name, 'parent')
+        self.assertEqual(child.fkfield.tenant, new_tenant, "Cloned foreign key still points at the base tenant.")
+
+    def test_m2m_links_are_remapped(self):
+        new_tenant = Tenant.objects.create(name='new', email='new@example.com')
+        child = TestTenantAwareModel.objects.get(tenant=new_tenant, name='child')
+        linked = child.m2mfield.all()
+        self.assertEqual(len(linked), 1, "Expected the cloned m2m link.")
+        self.assertEqual(linked[0].tenant, new_tenant, "Cloned m2m link still points at the base tenant.")
+
+    def test_base_tenant_is_untouched(self):
+        Tenant.objects.create(name='new', email='new@example.com')
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.base).count(), 2)
+        self.assertEqual(TestTenantAwareModel.objects.get(pk=self.child.pk).fkfield, self.parent)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        for i in range(20):
+            TestTenantAwareModel.objects.create(name='extra%d' % i, tenant=self.base)
+        other_tenant = Tenant.objects.create(name='other', email='other@example.com')
+        TestTenantAwareModel.objects.filter(tenant=other_tenant).delete()
+
+        # Select, max pk, insert, read back pks, fix self references, select and insert m2m links.
+        with self.assertNumQueries(7):
+            clone_tenant(self.base, other_tenant, [TestTenantAwareModel])
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=other_tenant).count(), 22)
@@ -0,0 +1,77 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.middleware import set_current_tenant, set_tenant_to_default
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class CopyOnWriteTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.shared = TestCopyOnWriteModel.objects.create(name='shared', tenant=self.base)
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        set_current_tenant(self.tenant1)
+
+    def tearDown(self):
+        set_tenant_to_default()
+
+    def test_base_instances_are_not_cloned(self):
+        self.assertEqual(TestCopyOnWriteModel.objects.filter(tenant=self.tenant1).count(), 0)
+
+    def test_base_instances_are_visible(self):
+        self.assertEqual(list(TestCopyOnWriteModel.tenant_objects.all()), [self.shared])
+
+    def test_save_makes_a_copy(self):
+        obj = TestCopyOnWriteModel.tenant_objects.get(name='shared')
+        obj.name = 'changed'
+        obj.save()
+
+        self.assertNotEqual(obj.pk, self.shared.pk)
+        self.assertEqual(obj.tenant_id, self.tenant1.pk)
+        self.assertEqual(TestCopyOnWriteModel.objects.get(pk=self.shared.pk).name, 'shared', "The base tenant's instance was changed.")
+        self.assertEqual([o.name for o in TestCopyOnWriteModel.tenant_objects.all()], ['changed'])
+
+        set_current_tenant(self.tenant2)
+        self.assertEqual([o.name for o in TestCopyOnWriteModel.tenant_objects.all()], ['shared'])
+
+    def test_references_follow_the_copy(self):
+        own = TestCopyOnWriteModel.objects.create(name='own', tenant=self.tenant1, fkfield=self.shared)
+        obj = TestCopyOnWriteModel.tenant_objects.get(name='shared')
+        obj.save()
+        self.assertEqual(TestCopyOnWriteModel.objects.get(pk=own.pk).fkfield_id, obj.pk)
+
+    def test_delete_hides(self):
+        TestCopyOnWriteModel.tenant_objects.get(name='shared').delete()
+
+        self.assertEqual(TestCopyOnWriteModel.tenant_objects.count(), 0)
+        self.assertTrue(TestCopyOnWriteModel.objects.filter(pk=self.shared.pk).exists(), "The base tenant's instance was deleted.")
+        set_current_tenant(self.tenant2)
+        self.assertEqual(TestCopyOnWriteModel.tenant_objects.count(), 1)
+
+    def test_queryset_update_and_delete(self):
+        TestCopyOnWriteModel.objects.create(name='own', tenant=self.tenant1)
+        self.assertEqual(TestCopyOnWriteModel.tenant_objects.update(name='renamed'), 2)
+        self.assertEqual(TestCopyOnWriteModel.objects.get(pk=self.shared.pk).name, 'shared')
+        self.assertEqual(set(o.name for o in TestCopyOnWriteModel.tenant_objects.all()), set(['renamed']))
+
+        TestCopyOnWriteModel.tenant_objects.all().delete()
+        self.assertEqual(TestCopyOnWriteModel.tenant_objects.count(), 0)
+        self.assertTrue(TestCopyOnWriteModel.objects.filter(pk=self.shared.pk).exists())
+
+    def test_base_tenant_edits_in_place(self):
+        set_current_tenant(self.base)
+        obj = TestCopyOnWriteModel.tenant_objects.get(name='shared')
+        obj.name = 'changed'
+        obj.save()
+        self.assertEqual(obj.pk, self.shared.pk)
+
+    def test_base_tenant_queryset_update_and_delete(self):
+        set_current_tenant(self.base)
+        self.assertEqual(TestCopyOnWriteModel.tenant_objects.update(name='renamed'), 1)
+        self.assertEqual(TestCopyOnWriteModel.objects.get(pk=self.shared.pk).name, 'renamed')
+
+        TestCopyOnWriteModel.tenant_objects.all().delete()
+        self.assertFalse(TestCopyOnWriteModel.objects.filter(pk=self.shared.pk).exists())
@@ -56,4 +56,29 @@ class TenantFormTests(TestCase):
         self.assertEqual(form.is_valid(), True, 'Form is not valid')
         instance = form.save()
         self.assertEqual(instance.tenant, self.tenant1)
-        
\ No newline at end of file
+
+    def test_cached_choices(self):
+        set_current_tenant(self.tenant1)
+        obj1 = TestTenantAwareModel.objects.create(name='obj1', tenant=self.tenant1)
+        obj2 = TestTenantAwareModel.objects.create(name='obj2', tenant=self.tenant2)
+
+        class TestForm(TenantModelForm):
+            cache_tenant_choices = True
+
+            class Meta:
+                model = TestTenantAwareModel
+                exclude = ['tenant']
+
+        form = TestForm()
+        self.assertEqual([label for value, label in form.fields['fkfield'].choices if value], [unicode(obj1)])
+
+        # The choices come from the cache now
+        form = TestForm()
+        with self.assertNumQueries(0):
+            form.as_p()
+
+        # Until an instance is saved for this tenant
+        obj3 = TestTenantAwareModel.objects.create(name='obj3', tenant=self.tenant1)
+        form = TestForm()
+        self.assertEqual(len([value for value, label in form.fields['fkfield'].choices if value]), 2)
+        self.assertTrue(TestForm({ 'name': 'blah', 'fkfield': obj3.id, 'm2mfield': [obj1.id] }).is_valid())
@@ -0,0 +1,40 @@
+from django.db import models
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.indexes import get_index_columns, make_migration, missing_indexes, wanted_indexes
+
+
+class IndexedModel(TenantModel):
+    name = models.CharField(max_length=10, db_index=True)
+    code = models.CharField(max_length=10)
+    created = models.DateTimeField(db_index=True)
+
+    class Meta:
+        abstract = True
+        ordering = ('name', '-created')
+        unique_together = (('code', 'tenant'),)
+
+
+
+class TenantIndexTests(TestCase):
+
+    def test_wanted_indexes(self):
+        self.assertEqual(sorted(wanted_indexes(IndexedModel)), [
+            ('tenant_id', 'code'),
+            ('tenant_id', 'created'),
+            ('tenant_id', 'name', 'created'),
+        ])
+
+    def test_no_ordering(self):
+        self.assertEqual(wanted_indexes(TestTenantAwareModel), [])
+
+    def test_existing_indexes(self):
+        self.assertTrue(('tenant_id',) in get_index_columns(TestTenantAwareModel._meta.db_table))
+        self.assertEqual(missing_indexes([TestTenantAwareModel]), [])
+
+    def test_make_migration(self):
+        source = make_migration('multitenant', [(TestTenantAwareModel, ('tenant_id', 'name'))])
+        self.assertTrue("db.create_index('multitenant_testtenantawaremodel', ['tenant_id', 'name'])" in source)
+        self.assertTrue("'multitenant.testtenantawaremodel': {" in source)
+        compile(source, 'migration', 'exec')
@@ -0,0 +1,80 @@
+import datetime
+
+from django.db import connection, transaction, DatabaseError
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant import instrumentation
+from multitenant.instrumentation import _TimingCursor, flush, get_stats, record_query, record_request, stats_flushed
+from multitenant.middleware import set_current_tenant, set_tenant_to_default
+
+
+
+class InstrumentationTests(TestCase):
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        set_current_tenant(self.tenant)
+        instrumentation._stats.clear()
+
+    def tearDown(self):
+        instrumentation._stats.clear()
+        set_tenant_to_default()
+
+    def test_queries_are_counted_by_tenant_and_model(self):
+        record_query('SELECT "id" FROM "multitenant_testtenantawaremodel" WHERE "tenant_id" = 2', 0.5)
+        record_query('UPDATE "multitenant_testtenantawaremodel" SET "name" = 1', 0.25)
+        self.assertEqual(get_stats()[(self.tenant.pk, 'multitenant.testtenantawaremodel')], [2, 0.75, 0, 0.0])
+
+    def test_timing_cursor(self):
+        cursor = _TimingCursor(connection.cursor())
+        cursor.execute('SELECT COUNT(*) FROM multitenant_tenant')
+        self.assertEqual(cursor.fetchone()[0], 1)
+        self.assertEqual(get_stats()[(self.tenant.pk, 'multitenant.tenant')][0], 1)
+
+    def test_flush(self):
+        received = []
+        def receiver(sender, stats, **kwargs):
+            received.append(stats)
+        stats_flushed.connect(receiver)
+        try:
+            record_request(self.tenant.pk, 2.0)
+            flush(force=True)
+            record_request(self.tenant.pk, 1.0)
+            flush(force=True)
+        finally:
+            stats_flushed.disconnect(receiver)
+
+        self.assertEqual(len(received), 2)
+        stats = TenantStats.objects.get(tenant_id=self.tenant.pk, model='')
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(stats.request_time, 3.0)
+
+    def test_flush_after_another_process(self):
+        # Another process creates the row between our update and our insert.
+        hour = datetime.datetime.now().replace(minute=0, second=0, microsecond=0)
+        savepoint = transaction.savepoint
+        def racing_savepoint(*args, **kwargs):
+            TenantStats.objects.create(hour=hour, tenant_id=self.tenant.pk, model='', requests=1, request_time=1.0)
+            return savepoint(*args, **kwargs)
+        transaction.savepoint = racing_savepoint
+        try:
+            record_request(self.tenant.pk, 2.0)
+            flush(force=True)
+        finally:
+            transaction.savepoint = savepoint
+        stats = TenantStats.objects.get(tenant_id=self.tenant.pk, model='')
+        self.assertEqual(stats.requests, 2)
+        self.assertEqual(stats.request_time, 3.0)
+
+    def test_flush_errors_are_kept_for_later(self):
+        save = instrumentation._save
+        def broken_save(*args):
+            raise DatabaseError('The database went away.')
+        instrumentation._save = broken_save
+        try:
+            record_request(self.tenant.pk, 2.0)
+            flush(force=True)
+        finally:
+            instrumentation._save = save
+        self.assertEqual(get_stats()[(self.tenant.pk, '')], [0, 0.0, 1, 2.0])
@@ -0,0 +1,53 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.integrity import check_integrity, get_relations
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class IntegrityTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        self.own = TestTenantAwareModel.objects.create(name='own', tenant=self.tenant1)
+        self.other = TestTenantAwareModel.objects.create(name='other', tenant=self.tenant2)
+
+    def problems(self):
+        return dict((relation.field.name, (count, list(sample))) for relation, count, sample in check_integrity(
+            [relation for relation in get_relations() if relation.model_class in (TestTenantAwareModel, TestCopyOnWriteModel)]))
+
+    def test_relations(self):
+        names = [(relation.model_class, relation.field.name) for relation in get_relations()]
+        self.assertTrue((TestTenantAwareModel, 'fkfield') in names)
+        self.assertTrue((TestTenantAwareModel, 'm2mfield') in names)
+
+    def test_clean(self):
+        TestTenantAwareModel.objects.create(name='child', tenant=self.tenant1, fkfield=self.own)
+        self.own.m2mfield.add(self.own)
+        self.assertEqual(self.problems(), {})
+
+    def test_foreign_key(self):
+        child = TestTenantAwareModel.objects.create(name='child', tenant=self.tenant1, fkfield=self.other)
+        self.assertEqual(self.problems(), {'fkfield': (1, [(child.pk, self.tenant1.pk, self.other.pk, self.tenant2.pk)])})
+
+    def test_many_to_many(self):
+        self.own.m2mfield.add(self.other)
+        # Symmetrical: the link is there both ways.
+        self.assertEqual(self.problems()['m2mfield'][0], 2)
+
+    def test_shared_copy_on_write_instances_are_fine(self):
+        shared = TestCopyOnWriteModel.objects.create(name='shared', tenant=self.base)
+        TestCopyOnWriteModel.objects.create(name='mine', tenant=self.tenant1, fkfield=shared)
+        self.assertEqual(self.problems(), {})
+
+    def test_fix(self):
+        child = TestTenantAwareModel.objects.create(name='child', tenant=self.tenant1, fkfield=self.other)
+        self.own.m2mfield.add(self.other)
+        for relation, count, sample in check_integrity([relation for relation in get_relations() if relation.model_class is TestTenantAwareModel]):
+            self.assertEqual(relation.fix(batch_size=1), count)
+        self.assertEqual(self.problems(), {})
+        self.assertEqual(TestTenantAwareModel.objects.get(pk=child.pk).fkfield, None)
+        self.assertEqual(list(self.own.m2mfield.all()), [])
@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant import metering
+from multitenant.metering import get_usage, prune_snapshots, take_snapshot
+
+
+
+class MeteringTests(TestCase):
+
+    def setUp(self):
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        for name in ('a', 'b'):
+            TestTenantAwareModel.objects.create(name=name, tenant=self.tenant1)
+        TestTenantAwareModel.objects.create(name='c', tenant=self.tenant2)
+        metering._usage.clear()
+
+    def tearDown(self):
+        metering._usage.clear()
+
+    def test_snapshot(self):
+        take_snapshot([TestTenantAwareModel])
+        self.assertEqual(get_usage(self.tenant1)['multitenant.testtenantawaremodel'][0], 2)
+        self.assertEqual(get_usage(self.tenant2.pk)['multitenant.testtenantawaremodel'][0], 1)
+        total = TenantUsage.objects.get(tenant_id=None)
+        self.assertEqual(total.rows, 3)
+
+    def test_unchanged_models_are_skipped(self):
+        self.assertEqual(take_snapshot([TestTenantAwareModel]), ['multitenant.testtenantawaremodel'])
+        self.assertEqual(take_snapshot([TestTenantAwareModel]), [])
+        self.assertEqual(take_snapshot([TestTenantAwareModel], full=True), ['multitenant.testtenantawaremodel'])
+
+        TestTenantAwareModel.objects.create(name='d', tenant=self.tenant2)
+        self.assertEqual(take_snapshot([TestTenantAwareModel]), ['multitenant.testtenantawaremodel'])
+        self.assertEqual(get_usage(self.tenant2)['multitenant.testtenantawaremodel'][0], 2)
+
+        TestTenantAwareModel.objects.get(name='a').delete()
+        self.assertEqual(take_snapshot([TestTenantAwareModel]), ['multitenant.testtenantawaremodel'])
+        self.assertEqual(get_usage(self.tenant1)['multitenant.testtenantawaremodel'][0], 1)
+
+    def test_skipping_does_not_read_the_table(self):
+        take_snapshot([TestTenantAwareModel])
+        # The latest total (two queries) and the tenant ids; the model's table is left alone.
+        with self.assertNumQueries(3):
+            self.assertEqual(take_snapshot([TestTenantAwareModel]), [])
+
+    def test_usage_is_cached(self):
+        take_snapshot([TestTenantAwareModel])
+        get_usage(self.tenant1)
+        with self.assertNumQueries(0):
+            get_usage(self.tenant1)
+
+    def test_prune(self):
+        take_snapshot([TestTenantAwareModel])
+        take_snapshot([TestTenantAwareModel], full=True)
+        self.assertEqual(prune_snapshots(0), 3)
+        self.assertEqual(get_usage(self.tenant1)['multitenant.testtenantawaremodel'][0], 2)
@@ -1,3 +1,181 @@
+from django.core.exceptions import PermissionDenied
 from django.test import TestCase
+from django.test.client import RequestFactory
+from django.contrib.auth.models import AnonymousUser
 
-# TODO: Add middleware tests.
+from multitenant.models import *
+from multitenant.settings import BASE_TENANT_ID
+from multitenant import middleware
+from multitenant.middleware import ThreadLocals, tenant_context, set_current_tenant, _tenants, _user_tenant_ids
+from multitenant.middleware import forget_hostnames, resolve_by_header, resolve_by_host, resolve_by_profile
+
+
+
+class ThreadLocalsTests(TestCase):
+
+    def setUp(self):
+        # Tenant and logged in user setup
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        self.user = User.objects.create_user(username='user1', email='user1@example.com', password='123')
+        self.profile = get_profile_class().objects.create(user=self.user, tenant=self.tenant1)
+        self.factory = RequestFactory()
+        self.middleware = ThreadLocals()
+        _tenants.clear()
+        _user_tenant_ids.clear()
+
+    def tearDown(self):
+        pass
+
+    def request_for(self, user):
+        request = self.factory.get('/')
+        request.user = user
+        return request
+
+    def test_anonymous_user_gets_base_tenant_from_cache(self):
+        self.middleware.process_request(self.request_for(AnonymousUser()))
+        self.assertEqual(get_current_tenant(), self.base)
+
+        with self.assertNumQueries(0):
+            self.middleware.process_request(self.request_for(AnonymousUser()))
+        self.assertEqual(get_current_tenant(), self.base)
+
+    def test_user_tenant_is_cached(self):
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk)))
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+        user = User.objects.get(pk=self.user.pk)
+        with self.assertNumQueries(0):
+            self.middleware.process_request(self.request_for(user))
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+    def test_profile_change_invalidates_cache(self):
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk)))
+        self.profile.tenant = self.tenant2
+        self.profile.save()
+
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk)))
+        self.assertEqual(get_current_tenant(), self.tenant2)
+
+    def test_tenant_change_invalidates_cache(self):
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk)))
+        self.tenant1.email = 'changed@example.com'
+        self.tenant1.save()
+
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk)))
+        self.assertEqual(get_current_tenant().email, 'changed@example.com')
+
+    def test_lazy_resolution_skips_queries_until_needed(self):
+        self.middleware.lazy = True
+        request = self.request_for(User.objects.get(pk=self.user.pk))
+        with self.assertNumQueries(0):
+            self.middleware.process_request(request)
+
+        # Filtering by tenant needs the profile, but not the Tenant instance.
+        with self.assertNumQueries(1):
+            self.assertEqual(get_current_tenant_id(), self.tenant1.pk)
+        with self.assertNumQueries(1):
+            list(TestTenantAwareModel.tenant_objects.all())
+
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+    def test_lazy_resolution_for_anonymous_user(self):
+        self.middleware.lazy = True
+        with self.assertNumQueries(0):
+            self.middleware.process_request(self.request_for(AnonymousUser()))
+            self.assertEqual(get_current_tenant_id(), BASE_TENANT_ID)
+
+    def test_context_is_reset_after_response(self):
+        set_current_tenant(self.tenant2)
+        request = self.request_for(User.objects.get(pk=self.user.pk))
+        self.middleware.process_request(request)
+        self.assertEqual(get_current_tenant(), self.tenant1)
+        self.middleware.process_response(request, None)
+        self.assertEqual(get_current_tenant(), self.tenant2)
+
+    def test_tenant_context(self):
+        set_current_tenant(self.tenant1)
+        with tenant_context(self.tenant2):
+            self.assertEqual(get_current_tenant(), self.tenant2)
+            with tenant_context(self.base.pk):
+                self.assertEqual(get_current_tenant_id(), self.base.pk)
+            self.assertEqual(get_current_tenant(), self.tenant2)
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+    def test_tenant_context_as_decorator(self):
+        set_current_tenant(self.tenant1)
+
+        @tenant_context(self.tenant2)
+        def current():
+            return get_current_tenant()
+
+        self.assertEqual(current(), self.tenant2)
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+
+
+class TenantResolverTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com', hostname='bugs.acme.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com', hostname='tenant2')
+        self.user = User.objects.create_user(username='user1', email='user1@example.com', password='123')
+        get_profile_class().objects.create(user=self.user, tenant=self.tenant1)
+        self.factory = RequestFactory()
+        self.middleware = ThreadLocals()
+        self.domain = middleware.TENANT_DOMAIN
+        middleware.TENANT_DOMAIN = 'example.com'
+        middleware._resolvers[:] = [resolve_by_host, resolve_by_header, resolve_by_profile]
+        forget_hostnames()
+        _tenants.clear()
+        _user_tenant_ids.clear()
+
+    def tearDown(self):
+        middleware.TENANT_DOMAIN = self.domain
+        del middleware._resolvers[:]
+        forget_hostnames()
+
+    def request_for(self, user, host, **extra):
+        request = self.factory.get('/', HTTP_HOST=host, **extra)
+        request.user = user
+        return request
+
+    def test_hostname(self):
+        self.middleware.process_request(self.request_for(AnonymousUser(), 'bugs.acme.com:8000'))
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+    def test_subdomain(self):
+        self.middleware.process_request(self.request_for(AnonymousUser(), 'Tenant2.example.com'))
+        self.assertEqual(get_current_tenant(), self.tenant2)
+
+    def test_hostnames_are_kept_in_memory(self):
+        self.middleware.process_request(self.request_for(AnonymousUser(), 'tenant2.example.com'))
+        with self.assertNumQueries(0):
+            self.middleware.process_request(self.request_for(AnonymousUser(), 'tenant2.example.com'))
+            self.assertEqual(get_current_tenant(), self.tenant2)
+
+    def test_hostname_change(self):
+        resolve_by_host(self.request_for(AnonymousUser(), 'tenant2.example.com'))
+        self.tenant2.hostname = 'other'
+        self.tenant2.save()
+        self.assertEqual(resolve_by_host(self.request_for(AnonymousUser(), 'other.example.com')), self.tenant2.pk)
+        self.assertEqual(resolve_by_host(self.request_for(AnonymousUser(), 'tenant2.example.com')), None)
+
+    def test_unknown_host_falls_through(self):
+        self.middleware.process_request(self.request_for(AnonymousUser(), 'www.example.com'))
+        self.assertEqual(get_current_tenant(), self.base)
+        self.middleware.process_request(self.request_for(User.objects.get(pk=self.user.pk), 'www.example.com'))
+        self.assertEqual(get_current_tenant(), self.tenant1)
+
+    def test_header(self):
+        request = self.request_for(AnonymousUser(), 'www.example.com', HTTP_X_TENANT_ID=str(self.tenant2.pk))
+        self.middleware.process_request(request)
+        self.assertEqual(get_current_tenant(), self.tenant2)
+
+    def test_users_stay_in_their_tenant(self):
+        user = User.objects.get(pk=self.user.pk)
+        self.middleware.process_request(self.request_for(user, 'bugs.acme.com'))
+        self.assertEqual(get_current_tenant(), self.tenant1)
+        self.assertRaises(PermissionDenied, self.middleware.process_request, self.request_for(user, 'tenant2.example.com'))
@@ -1,3 +1,5 @@
+import datetime
+
 from django.test import TestCase
 from django.test.client import Client
 
@@ -61,5 +63,71 @@ class TenantModelTests(TestCase):
         self.assertEqual(len(cloned_objects), 1, "While creating new tenant: Expected to clone just one object from base tenant.")
         self.assertEqual(cloned_objects[0].name, 'be_cloned', "While creating new tenant: Cloned object is not the right one.")
 
+    def test_clean_runs_no_metadata_queries(self):
+        set_current_tenant(self.tenant1)
+        get_profile_class()
+        obj = TestTenantAwareModel(name='obj')
+        with self.assertNumQueries(0):
+            obj.clean()
+        self.assertEqual(obj.tenant, self.tenant1)
+
+    def test_bulk_create_sets_tenant(self):
+        set_current_tenant(self.tenant1)
+        objs = TestTenantAwareModel.tenant_objects.bulk_create([TestTenantAwareModel(name='obj%d' % i) for i in range(5)])
+        self.assertEqual([obj.tenant_id for obj in objs], [self.tenant1.id] * 5)
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.tenant1).count(), 5)
+
+    def test_bulk_create_refuses_other_tenants(self):
+        set_current_tenant(self.tenant1)
+        objs = [TestTenantAwareModel(name='obj1'), TestTenantAwareModel(name='obj2', tenant=self.tenant2)]
+        self.assertRaises(ValueError, TestTenantAwareModel.tenant_objects.bulk_create, objs)
+        self.assertEqual(TestTenantAwareModel.objects.count(), 0)
+
+    def test_bulk_update(self):
+        set_current_tenant(self.tenant1)
+        TestTenantAwareModel.tenant_objects.bulk_create([TestTenantAwareModel(name='obj%d' % i) for i in range(4)])
+        objs = list(TestTenantAwareModel.tenant_objects.order_by('id'))
+        for obj in objs:
+            obj.name = 'renamed'
+        with self.assertNumQueries(1):
+            self.assertEqual(TestTenantAwareModel.tenant_objects.bulk_update(objs, ['name']), 4)
+        self.assertEqual(TestTenantAwareModel.objects.filter(name='renamed').count(), 4)
+
+    def test_bulk_update_distinct_values(self):
+        set_current_tenant(self.tenant1)
+        TestTenantAwareModel.tenant_objects.bulk_create([TestTenantAwareModel(name='obj%d' % i) for i in range(4)])
+        objs = list(TestTenantAwareModel.tenant_objects.order_by('id'))
+        for i, obj in enumerate(objs):
+            obj.name = 'new%d' % i
+            obj.fkfield = objs[0]
+        # Every instance has a value of its own, and still it's a single query.
+        with self.assertNumQueries(1):
+            self.assertEqual(TestTenantAwareModel.tenant_objects.bulk_update(objs, ['name', 'fkfield']), 4)
+        self.assertEqual([(obj.name, obj.fkfield_id) for obj in TestTenantAwareModel.objects.order_by('id')],
+                         [('new%d' % i, objs[0].pk) for i in range(4)])
+
+    def test_bulk_update_dates(self):
+        set_current_tenant(self.tenant1)
+        TestTenantAwareModel.tenant_objects.bulk_create([TestTenantAwareModel(name='obj%d' % i) for i in range(3)])
+        objs = list(TestTenantAwareModel.tenant_objects.order_by('id'))
+        for i, obj in enumerate(objs):
+            obj.datefield = datetime.date(2012, 1, i + 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(TestTenantAwareModel.tenant_objects.bulk_update(objs, ['datefield']), 3)
+        self.assertEqual(list(TestTenantAwareModel.objects.order_by('id').values_list('datefield', flat=True)),
+                         [datetime.date(2012, 1, i + 1) for i in range(3)])
+
+    def test_update_refuses_tenant_change(self):
+        set_current_tenant(self.tenant1)
+        self.assertRaises(ValueError, TestTenantAwareModel.tenant_objects.update, tenant=self.tenant2)
+
+    def test_get_or_create_sets_tenant(self):
+        set_current_tenant(self.tenant1)
+        obj, created = TestTenantAwareModel.tenant_objects.get_or_create(name='obj1')
+        self.assertTrue(created)
+        self.assertEqual(obj.tenant, self.tenant1)
+        obj, created = TestTenantAwareModel.tenant_objects.get_or_create(name='obj1')
+        self.assertFalse(created)
+
 
 
@@ -0,0 +1,65 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant import provisioning
+from multitenant.provisioning import claim_tenant, provision_tenant, provision_waiting_tenants
+from multitenant.registry import get_model_label
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class TenantProvisioningTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.base)
+        self.child = TestTenantAwareModel.objects.create(name='child', tenant=self.base, fkfield=self.parent)
+        self.child.m2mfield.add(self.parent)
+        self.mode = provisioning.TENANT_PROVISIONING
+        provisioning.TENANT_PROVISIONING = 'queue'
+
+    def tearDown(self):
+        provisioning.TENANT_PROVISIONING = self.mode
+
+    def test_new_tenant_is_pending(self):
+        tenant = Tenant.objects.create(name='new', email='new@example.com')
+        self.assertEqual(Tenant.objects.get(pk=tenant.pk).provisioning_status, Tenant.PROVISIONING_PENDING)
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=tenant).count(), 0)
+
+    def test_provision_waiting_tenants(self):
+        tenant = Tenant.objects.create(name='new', email='new@example.com')
+        self.assertEqual(provision_waiting_tenants(), [tenant.pk])
+
+        tenant = Tenant.objects.get(pk=tenant.pk)
+        self.assertEqual(tenant.provisioning_status, Tenant.PROVISIONING_READY)
+        self.assertEqual(tenant.provisioning_progress, 100)
+        child = TestTenantAwareModel.objects.get(tenant=tenant, name='child')
+        self.assertEqual(child.fkfield.tenant, tenant)
+        self.assertEqual(child.m2mfield.get().tenant, tenant)
+        self.assertEqual(ProvisioningStep.objects.filter(tenant=tenant).count(), 0)
+
+        # Nothing left to do
+        self.assertEqual(provision_waiting_tenants(), [])
+
+    def test_resume_after_failure(self):
+        tenant = Tenant.objects.create(name='new', email='new@example.com')
+        self.assertTrue(claim_tenant(tenant.pk))
+        self.assertFalse(claim_tenant(tenant.pk), 'A running tenant should not be claimed twice.')
+
+        # Make the last step fail, after the model has been cloned.
+        def fail(*args, **kwargs):
+            raise RuntimeError('worker died')
+        clone_m2m = provisioning.clone_m2m
+        provisioning.clone_m2m = fail
+        try:
+            self.assertRaises(RuntimeError, provision_tenant, tenant.pk)
+        finally:
+            provisioning.clone_m2m = clone_m2m
+        self.assertEqual(Tenant.objects.get(pk=tenant.pk).provisioning_status, Tenant.PROVISIONING_FAILED)
+        self.assertTrue(ProvisioningStep.objects.filter(tenant=tenant, model=get_model_label(TestTenantAwareModel)).exists())
+
+        self.assertEqual(provision_waiting_tenants(retry_failed=True), [tenant.pk])
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=tenant).count(), 2, 'Completed steps must not run again.')
+        child = TestTenantAwareModel.objects.get(tenant=tenant, name='child')
+        self.assertEqual(child.fkfield.tenant, tenant)
+        self.assertEqual(child.m2mfield.get().tenant, tenant)
@@ -0,0 +1,38 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.purge import purge_tenant
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class TenantPurgeTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        for tenant in (self.tenant1, self.tenant2):
+            parent = TestTenantAwareModel.objects.create(name='parent', tenant=tenant)
+            child = TestTenantAwareModel.objects.create(name='child', tenant=tenant, fkfield=parent)
+            parent.fkfield = child
+            parent.save()
+            child.m2mfield.add(parent)
+
+    def tearDown(self):
+        pass
+
+    def test_purge(self):
+        counts = purge_tenant(self.tenant1, batch_size=1)
+        self.assertEqual(counts[TestTenantAwareModel], 2)
+        self.assertFalse(Tenant.objects.filter(pk=self.tenant1.pk).exists())
+        self.assertFalse(TestTenantAwareModel.objects.filter(tenant=self.tenant1.pk).exists())
+
+    def test_other_tenants_are_untouched(self):
+        purge_tenant(self.tenant1, batch_size=1)
+        child = TestTenantAwareModel.objects.get(tenant=self.tenant2, name='child')
+        self.assertEqual(child.fkfield.name, 'parent')
+        self.assertEqual(child.m2mfield.count(), 1)
+
+    def test_base_tenant_cannot_be_purged(self):
+        self.assertRaises(ValueError, purge_tenant, BASE_TENANT_ID)
@@ -0,0 +1,61 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.middleware import set_current_tenant, set_tenant_to_default
+from multitenant.querycache import clear_query_cache
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class QueryCacheTests(TestCase):
+
+    def setUp(self):
+        clear_query_cache()
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        self.obj = TestTenantAwareModel.objects.create(name='one', tenant=self.tenant1)
+        set_current_tenant(self.tenant1)
+
+    def tearDown(self):
+        clear_query_cache()
+        set_tenant_to_default()
+
+    def names(self):
+        return [obj.name for obj in TestTenantAwareModel.tenant_objects.cached().order_by('name')]
+
+    def test_results_are_cached(self):
+        self.assertEqual(self.names(), ['one'])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.names(), ['one'])
+
+    def test_hits_are_copies(self):
+        TestTenantAwareModel.tenant_objects.cached().get(pk=self.obj.pk).name = 'changed'
+        self.assertEqual(TestTenantAwareModel.tenant_objects.cached().get(pk=self.obj.pk).name, 'one')
+
+    def test_tenants_are_kept_apart(self):
+        self.assertEqual(self.names(), ['one'])
+        set_current_tenant(self.tenant2)
+        self.assertEqual(self.names(), [])
+
+    def test_save_invalidates(self):
+        self.assertEqual(self.names(), ['one'])
+        TestTenantAwareModel.objects.create(name='two', tenant=self.tenant1)
+        self.assertEqual(self.names(), ['one', 'two'])
+
+    def test_m2m_change_invalidates(self):
+        other = TestTenantAwareModel.objects.create(name='two', tenant=self.tenant1)
+        links = lambda: [o.pk for o in TestTenantAwareModel.tenant_objects.cached().filter(m2mfield=other)]
+        self.assertEqual(links(), [])
+        self.obj.m2mfield.add(other)
+        self.assertEqual(links(), [self.obj.pk])
+
+    def test_copy_on_write_sees_base_changes(self):
+        base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        shared = TestCopyOnWriteModel.objects.create(name='shared', tenant=base)
+        names = lambda: [o.name for o in TestCopyOnWriteModel.tenant_objects.cached()]
+        self.assertEqual(names(), ['shared'])
+        set_current_tenant(base)
+        shared.name = 'renamed'
+        shared.save()
+        set_current_tenant(self.tenant1)
+        self.assertEqual(names(), ['renamed'])
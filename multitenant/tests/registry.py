@@ -0,0 +1,49 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+
+from multitenant.models import *
+from multitenant import registry
+from multitenant.registry import *
+
+
+
+class TenantRegistryTests(TestCase):
+
+    def test_tenant_models_are_registered(self):
+        self.assertTrue(is_tenant_model(TestTenantAwareModel))
+        self.assertTrue(is_tenant_model(get_profile_class()))
+        self.assertFalse(is_tenant_model(Tenant))
+
+    def test_plan(self):
+        plan = get_plan()
+        self.assertEqual(set(plan), set(get_tenant_model_classes()))
+        for index, model_class in enumerate(plan):
+            for dependency in get_dependencies(model_class):
+                if model_class not in get_dependencies(dependency):
+                    self.assertTrue(plan.index(dependency) < index, '%s should come before %s' % (dependency, model_class))
+
+    def test_clone_plan_leaves_out_user_profile(self):
+        self.assertTrue(TestTenantAwareModel in get_clone_plan())
+        self.assertFalse(get_profile_class() in get_clone_plan())
+
+    def test_self_references_are_not_dependencies(self):
+        self.assertEqual(get_dependencies(TestTenantAwareModel), set())
+        self.assertEqual([f.name for f in get_foreign_keys(TestTenantAwareModel)], ['fkfield'])
+        self.assertEqual([f.name for f in get_m2m_fields(TestTenantAwareModel)], ['m2mfield'])
+
+    def test_bookkeeping_is_not_tenant_data(self):
+        for model_class in (BaseTenantLink, ProvisioningStep):
+            self.assertFalse(is_tenant_model(model_class))
+            self.assertFalse(model_class in get_plan())
+            self.assertTrue(model_class in get_storage_plan())
+
+    def test_no_profile_module(self):
+        saved = registry._profile_class
+        registry._profile_class = None
+        try:
+            with override_settings(AUTH_PROFILE_MODULE=''):
+                self.assertEqual(get_profile_class(), None)
+                tenant = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+                TestTenantAwareModel.objects.create(name='saved', tenant=tenant)
+        finally:
+            registry._profile_class = saved
@@ -0,0 +1,70 @@
+from django.conf import settings
+from django.test import TestCase
+from django.utils import unittest
+
+from multitenant.models import *
+from multitenant import routers
+from multitenant.middleware import set_current_tenant, set_tenant_to_default
+from multitenant.routers import TenantRouter, get_model_database, get_tenant_database, move_tenant
+
+
+
+class TenantRouterTests(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.tenant = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.sharding = routers.TENANT_SHARDING
+        routers.TENANT_SHARDING = True
+
+    def tearDown(self):
+        routers.TENANT_SHARDING = self.sharding
+        routers._databases.clear()
+        set_tenant_to_default()
+
+    def test_no_sharding(self):
+        routers.TENANT_SHARDING = False
+        TenantPlacement.objects.create(tenant_id=self.tenant.pk, database='other')
+        self.assertEqual(get_tenant_database(self.tenant.pk), 'default')
+        self.assertEqual(get_model_database(TestTenantAwareModel, self.tenant.pk), None)
+
+    def test_placement(self):
+        self.assertEqual(get_tenant_database(self.tenant.pk), 'default')
+        placement = TenantPlacement.objects.create(tenant_id=self.tenant.pk, database='other')
+        self.assertEqual(get_tenant_database(self.tenant.pk), 'other', "The cached placement wasn't dropped.")
+        placement.delete()
+        self.assertEqual(get_tenant_database(self.tenant.pk), 'default')
+
+    def test_router(self):
+        TenantPlacement.objects.create(tenant_id=self.tenant.pk, database='other')
+        router = TenantRouter()
+        self.assertEqual(router.db_for_write(TestTenantAwareModel, instance=TestTenantAwareModel(tenant=self.tenant)), 'other')
+        self.assertEqual(router.db_for_read(Tenant), None)
+        self.assertEqual(router.db_for_read(get_profile_class()), None)
+
+        set_current_tenant(self.tenant)
+        self.assertEqual(router.db_for_read(TestTenantAwareModel), 'other')
+        self.assertEqual(TestTenantAwareModel.tenant_objects.all().db, 'other')
+
+    @unittest.skipUnless('other' in settings.DATABASES, "Needs a second database called 'other'.")
+    def test_move_tenant(self):
+        parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.tenant)
+        child = TestTenantAwareModel.objects.create(name='child', tenant=self.tenant, fkfield=parent)
+        child.m2mfield.add(parent)
+
+        self.assertEqual(move_tenant(self.tenant, 'other'), 2)
+        self.assertEqual(get_tenant_database(self.tenant.pk), 'other')
+        self.assertFalse(TestTenantAwareModel.objects.using('default').filter(tenant=self.tenant).exists())
+        moved = TestTenantAwareModel.objects.using('other').get(pk=child.pk)
+        self.assertEqual(moved.fkfield_id, parent.pk)
+        self.assertEqual([o.pk for o in moved.m2mfield.all()], [parent.pk])
+
+    @unittest.skipUnless('other' in settings.DATABASES, "Needs a second database called 'other'.")
+    def test_move_tenant_with_cycle(self):
+        first = TestTenantAwareModel.objects.create(name='first', tenant=self.tenant)
+        second = TestTenantAwareModel.objects.create(name='second', tenant=self.tenant, fkfield=first)
+        TestTenantAwareModel.objects.filter(pk=first.pk).update(fkfield=second)
+
+        self.assertEqual(move_tenant(self.tenant, 'other'), 2)
+        self.assertFalse(TestTenantAwareModel.objects.using('default').filter(tenant=self.tenant).exists())
+        self.assertEqual(TestTenantAwareModel.objects.using('other').get(pk=first.pk).fkfield_id, second.pk)
@@ -0,0 +1,38 @@
+"""
+Settings for running the tests on their own, with a second database for sharding and archiving:
+
+    django-admin.py test multitenant --settings=multitenant.tests.settings
+"""
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'multitenant-tests.db',
+    },
+    'other': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': 'multitenant-tests-other.db',
+    },
+}
+
+INSTALLED_APPS = (
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.admin',
+    'south',
+    'multitenant',
+)
+
+AUTH_PROFILE_MODULE = 'multitenant.TestUserProfile'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+
+SECRET_KEY = 'multitenant-tests'
+
+# syncdb is quicker, and the tests don't depend on the migrations.
+SOUTH_TESTS_MIGRATE = False
@@ -0,0 +1,76 @@
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.sync import sync_base_tenant
+from multitenant.settings import BASE_TENANT_ID
+
+
+
+class BaseTenantSyncTests(TestCase):
+
+    def setUp(self):
+        self.base, created = Tenant.objects.get_or_create(id=BASE_TENANT_ID, defaults={ 'name':'Base Tenant', 'email':'base@example.com' })
+        self.parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.base)
+        self.child = TestTenantAwareModel.objects.create(name='child', tenant=self.base, fkfield=self.parent)
+        self.tenant = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        sync_base_tenant()
+
+    def tearDown(self):
+        pass
+
+    def copy(self, name):
+        return TestTenantAwareModel.objects.get(tenant=self.tenant, name=name)
+
+    def test_clone_records_links(self):
+        self.assertEqual(BaseTenantLink.objects.filter(tenant=self.tenant, base_pk=self.parent.pk).get().local_pk, self.copy('parent').pk)
+        self.assertEqual(Tenant.objects.get(pk=self.tenant.pk).template_version, 1)
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.tenant).count(), 2, "The first sync duplicated the clone.")
+
+    def test_added_instance_is_inserted(self):
+        TestTenantAwareModel.objects.create(name='new', tenant=self.base, fkfield=self.parent)
+        sync_base_tenant()
+
+        new = self.copy('new')
+        self.assertEqual(new.fkfield, self.copy('parent'), "The new instance points at the base tenant's instance.")
+        sync_base_tenant()
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.tenant, name='new').count(), 1)
+
+    def test_changed_instance_is_updated(self):
+        self.parent.name = 'renamed'
+        self.parent.save()
+        sync_base_tenant()
+        self.assertTrue(TestTenantAwareModel.objects.filter(tenant=self.tenant, name='renamed').exists())
+
+    def test_changed_foreign_key_is_remapped(self):
+        self.parent.fkfield = self.child
+        self.parent.save()
+        sync_base_tenant()
+        self.assertEqual(self.copy('parent').fkfield, self.copy('child'))
+
+    def test_customized_copy_is_left_alone(self):
+        copy = self.copy('parent')
+        copy.name = 'mine'
+        copy.save()
+        self.parent.name = 'renamed'
+        self.parent.save()
+        sync_base_tenant()
+        self.assertEqual(TestTenantAwareModel.objects.get(pk=copy.pk).name, 'mine')
+
+    def test_deleted_copy_is_not_brought_back(self):
+        self.copy('child').delete()
+        self.child.name = 'renamed'
+        self.child.save()
+        sync_base_tenant()
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.tenant).count(), 1)
+
+    def test_untracked_tenants_are_left_out(self):
+        Tenant.objects.filter(pk=self.tenant.pk).update(template_version=None)
+        TestTenantAwareModel.objects.create(name='first', tenant=self.base)
+        sync_base_tenant()
+        self.assertFalse(TestTenantAwareModel.objects.filter(tenant=self.tenant, name='first').exists())
+
+        sync_base_tenant(adopt=True)
+        TestTenantAwareModel.objects.create(name='second', tenant=self.base)
+        sync_base_tenant()
+        self.assertFalse(TestTenantAwareModel.objects.filter(tenant=self.tenant, name='first').exists())
+        self.assertTrue(TestTenantAwareModel.objects.filter(tenant=self.tenant, name='second').exists())
@@ -0,0 +1,44 @@
+from StringIO import StringIO
+
+from django.test import TestCase
+
+from multitenant.models import *
+from multitenant.transfer import export_tenant, import_tenant
+
+
+
+class TenantTransferTests(TestCase):
+
+    def setUp(self):
+        self.tenant1 = Tenant.objects.create(name='Tenant1', email='tenant1@example.com')
+        self.tenant2 = Tenant.objects.create(name='Tenant2', email='tenant2@example.com')
+        self.parent = TestTenantAwareModel.objects.create(name='parent', tenant=self.tenant1)
+        self.child = TestTenantAwareModel.objects.create(name='child', tenant=self.tenant1, fkfield=self.parent)
+        # A reference to an instance that comes later, so it has to be fixed up after the insert.
+        self.parent.fkfield = self.child
+        self.parent.save()
+        self.child.m2mfield.add(self.parent)
+
+    def tearDown(self):
+        pass
+
+    def roundtrip(self):
+        out = StringIO()
+        self.assertEqual(export_tenant(self.tenant1, out), 2)
+        return import_tenant(StringIO(out.getvalue()), self.tenant2)
+
+    def test_roundtrip(self):
+        self.assertEqual(self.roundtrip(), 2)
+        parent = TestTenantAwareModel.objects.get(tenant=self.tenant2, name='parent')
+        child = TestTenantAwareModel.objects.get(tenant=self.tenant2, name='child')
+        self.assertNotEqual(child.pk, self.child.pk)
+        self.assertEqual(child.fkfield, parent, "The foreign key wasn't remapped.")
+        self.assertEqual(parent.fkfield, child, "The forward reference wasn't fixed up.")
+        self.assertEqual(list(child.m2mfield.all()), [parent])
+
+    def test_source_is_untouched(self):
+        self.roundtrip()
+        self.assertEqual(TestTenantAwareModel.objects.filter(tenant=self.tenant1).count(), 2)
+
+    def test_not_an_export(self):
+        self.assertRaises(ValueError, import_tenant, StringIO('{"format": "something else"}\n'), self.tenant2)
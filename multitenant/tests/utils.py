@@ -60,3 +60,23 @@ class TenantUtilsTests(TestCase):
         objects = tenant_filter(objects)
         self.assertEqual( len(objects), 1, 'Incorrect number of objects in tenant-filtered queryset.' )
         self.assertEqual( objects[0].name, 'obj1', 'Wrong object shows up in tenant-filtered queryset')
+
+    def test_ownership_checks_run_no_extra_queries(self):
+        set_current_tenant(self.tenant1)
+        obj1 = TestTenantAwareModel.objects.create(name='obj1', tenant=self.tenant1)
+        obj1 = TestTenantAwareModel.objects.get(id=obj1.id)
+        with self.assertNumQueries(0):
+            self.assertTrue( current_tenant_owns_object(obj1) )
+        with self.assertNumQueries(1):
+            self.assertEqual(tenant_get_object_or_404(TestTenantAwareModel, id=obj1.id), obj1)
+
+    def test_current_tenant_owns_objects(self):
+        set_current_tenant(self.tenant1)
+        obj1 = TestTenantAwareModel.objects.create(name='obj1', tenant=self.tenant1)
+        obj2 = TestTenantAwareModel.objects.create(name='obj2', tenant=self.tenant2)
+        self.assertTrue( current_tenant_owns_objects([obj1]) )
+        self.assertFalse( current_tenant_owns_objects([obj1, obj2]) )
+        with self.assertNumQueries(1):
+            self.assertTrue( current_tenant_owns_objects(TestTenantAwareModel.objects.filter(name='obj1')) )
+        with self.assertNumQueries(1):
+            self.assertFalse( current_tenant_owns_objects(TestTenantAwareModel.objects.all()) )
@@ -0,0 +1,251 @@
+"""
+Exporting one tenant's instances to a file, and importing them into another tenant (or another database).
+
+    ./manage.py export_tenant 42 acme.jsonl.gz
+    ./manage.py import_tenant acme.jsonl.gz --name="Acme (copy)"
+
+The file has one JSON object per line: a header describing the tenant, then the instances of every tenant-aware
+model in dependency order, then the many-to-many links between them.  Files whose name ends with .gz are
+compressed.  Both ways, the instances are streamed in batches of TENANT_BULK_BATCH_SIZE, so memory use stays
+flat however big the tenant is; only the mapping from old to new primary keys is kept in memory while importing.
+
+On import every instance gets a new primary key, and the foreign keys and many-to-many links between the
+imported instances are remapped to match.  References to instances outside the tenant (users, shared
+instances, ...) are kept as they are.  User profiles are not exported.
+
+example:
+
+    from multitenant.transfer import export_tenant, import_tenant
+
+    with open('acme.jsonl', 'w') as out:
+        export_tenant(tenant, out)
+    with open('acme.jsonl') as source:
+        import_tenant(source, other_tenant)
+"""
+
+import gzip
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils.encoding import is_protected_type
+
+from cloning import _batch_size, _chunks, _insert, apply_deferred
+from generations import bump_generation
+from registry import get_foreign_keys, get_m2m_fields, get_model_by_label, get_model_label, get_plan, get_profile_class
+from routers import get_tenant_database
+from settings import BULK_BATCH_SIZE
+
+FORMAT = 'multitenant'
+VERSION = 1
+
+
+def open_file(filename, mode='rb'):
+    """
+    Opens filename for export_tenant() or import_tenant(), compressed if it ends with .gz.
+    """
+    if filename.endswith('.gz'):
+        return gzip.open(filename, mode)
+    return open(filename, mode)
+
+
+def get_export_model_classes():
+    """
+    The tenant-aware models whose instances get exported, in dependency order.
+    That's all of them except the user profile.
+    """
+    user_profile_class = get_profile_class()
+    return [model_class for model_class in get_plan() if model_class is not user_profile_class]
+
+
+def _dump(value):
+    return json.dumps(value, cls=DjangoJSONEncoder) + '\n'
+
+
+def _field_value(field, obj):
+    # Like django's serializers: types json knows are written as they are, the others as strings.
+    value = getattr(obj, field.attname)
+    if value is None or is_protected_type(value):
+        return value
+    return field.value_to_string(obj)
+
+
+def _fields(model_class):
+    return [field for field in model_class._meta.local_fields if not field.primary_key and field.name != 'tenant']
+
+
+def export_tenant(tenant, out, using=None):
+    """
+    Writes all of tenant's instances to the file object out.  Returns the number of instances written.
+    """
+    from models import Tenant
+    tenant = tenant if isinstance(tenant, Tenant) else Tenant.objects.get(pk=tenant)
+    if using is None:
+        using = get_tenant_database(tenant.pk)
+    model_classes = get_export_model_classes()
+
+    out.write(_dump({
+        'format': FORMAT, 'version': VERSION,
+        'tenant': tenant.pk, 'name': tenant.name, 'email': tenant.email,
+        'models': [get_model_label(model_class) for model_class in model_classes],
+    }))
+
+    count = 0
+    for model_class in model_classes:
+        label = get_model_label(model_class)
+        fields = _fields(model_class)
+        rows = model_class._base_manager.db_manager(using).filter(tenant=tenant.pk).order_by('pk')
+        for obj in rows.iterator():
+            out.write(_dump({
+                'model': label, 'pk': obj.pk,
+                'fields': dict((field.attname, _field_value(field, obj)) for field in fields),
+            }))
+            count += 1
+
+    for model_class in model_classes:
+        for field in get_m2m_fields(model_class):
+            through = field.rel.through
+            source_name = field.m2m_field_name()
+            target_name = field.m2m_reverse_field_name()
+            links = through._base_manager.db_manager(using).filter(
+                **{'%s__tenant' % source_name: tenant.pk}
+            ).order_by('pk').values_list(source_name, target_name)
+            name = '%s.%s' % (get_model_label(model_class), field.name)
+            batch = []
+            for link in links.iterator():
+                batch.append(link)
+                if len(batch) == BULK_BATCH_SIZE:
+                    out.write(_dump({'m2m': name, 'links': batch}))
+                    batch = []
+            if batch:
+                out.write(_dump({'m2m': name, 'links': batch}))
+    return count
+
+
+def read_header(source):
+    """
+    Reads and checks the first line of an exported file.
+    """
+    header = json.loads(source.readline() or 'null')
+    if not header or header.get('format') != FORMAT:
+        raise ValueError('Not a tenant export file.')
+    if header.get('version') != VERSION:
+        raise ValueError('Unsupported tenant export version: %s.' % header.get('version'))
+    return header
+
+
+def _model(label):
+    model_class = get_model_by_label(label)
+    if model_class is None:
+        raise ValueError('Unknown model in tenant export: %s.' % label)
+    return model_class
+
+
+class _Importer(object):
+    """
+    Inserts the instances of one model at a time, a batch at a time, remapping their foreign keys.
+    """
+    def __init__(self, tenant_id, model_classes, using):
+        self.tenant_id = tenant_id
+        self.using = using
+        # A key for every model in the file: None until its instances are all in.
+        self.pk_maps = dict.fromkeys(model_classes)
+        self.deferred = []
+        self.model_class = None
+        self.pk_map = {}
+        self.batch = []
+
+    def add(self, model_class, pk, values):
+        if model_class is not self.model_class:
+            self.finish_model()
+            self.model_class = model_class
+            self.pk_map = {}
+        obj = model_class()
+        for field in _fields(model_class):
+            if field.attname in values:
+                setattr(obj, field.attname, field.to_python(values[field.attname]))
+        obj.tenant_id = self.tenant_id
+        self.batch.append((pk, obj))
+        if len(self.batch) >= _batch_size(model_class, self.using):
+            self.flush()
+
+    def flush(self):
+        if not self.batch:
+            return
+        model_class = self.model_class
+        pending = []
+        for index, (pk, obj) in enumerate(self.batch):
+            for field in get_foreign_keys(model_class):
+                value = getattr(obj, field.attname)
+                if value is None or field.rel.to not in self.pk_maps:
+                    continue
+                target_map = self.pk_map if field.rel.to is model_class else self.pk_maps[field.rel.to]
+                if target_map is not None and value in target_map:
+                    setattr(obj, field.attname, target_map[value])
+                elif target_map is None or field.rel.to is model_class:
+                    # Not imported yet; fixed up once everything is in.
+                    pending.append((index, field, value))
+        new_pks = _insert(model_class, [obj for pk, obj in self.batch], self.tenant_id, self.using)
+        for (pk, obj), new_pk in zip(self.batch, new_pks):
+            self.pk_map[pk] = new_pk
+        for index, field, value in pending:
+            self.deferred.append((model_class, field, new_pks[index], value))
+        self.batch = []
+
+    def finish_model(self):
+        self.flush()
+        if self.model_class is not None:
+            self.pk_maps[self.model_class] = self.pk_map
+
+    def add_links(self, model_class, field, links):
+        through = field.rel.through
+        source_attname = through._meta.get_field(field.m2m_field_name()).attname
+        target_attname = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        own_map = self.pk_maps.get(model_class) or {}
+        target_map = self.pk_maps.get(field.rel.to) or {}
+        objs = [
+            through(**{source_attname: own_map[source_pk], target_attname: target_map.get(target_pk, target_pk)})
+            for source_pk, target_pk in links if source_pk in own_map
+        ]
+        for batch in _chunks(objs, _batch_size(through, self.using)):
+            through._base_manager.db_manager(self.using).bulk_create(batch)
+
+
+def import_tenant(source, tenant, using=None):
+    """
+    Reads instances exported by export_tenant() from the file object source, and adds them to tenant, in a
+    single transaction.  Returns the number of instances imported.
+    """
+    tenant_id = getattr(tenant, 'pk', tenant)
+    if using is None:
+        using = get_tenant_database(tenant_id)
+    header = read_header(source)
+    model_classes = [_model(label) for label in header['models']]
+    importer = _Importer(tenant_id, model_classes, using)
+    count = 0
+
+    with transaction.commit_on_success(using=using):
+        links_started = False
+        for line in source:
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            if 'model' in item:
+                importer.add(_model(item['model']), item['pk'], item['fields'])
+                count += 1
+            else:
+                if not links_started:
+                    # All the instances are in; the links and deferred references can be remapped now.
+                    importer.finish_model()
+                    apply_deferred(importer.deferred, importer.pk_maps, using=using)
+                    links_started = True
+                label, field_name = item['m2m'].rsplit('.', 1)
+                model_class = _model(label)
+                importer.add_links(model_class, model_class._meta.get_field(field_name), item['links'])
+        if not links_started:
+            importer.finish_model()
+            apply_deferred(importer.deferred, importer.pk_maps, using=using)
+
+    for model_class in model_classes:
+        bump_generation(model_class, tenant_id)
+    return count
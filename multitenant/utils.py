@@ -3,22 +3,42 @@ A collection of useful tools related to the multitenant app.
 See the functions' docstrings for details and examples.
 """
 
-from django.shortcuts import get_object_or_404
-from django.http import Http404
+from django.db.models.query import QuerySet
+from django.shortcuts import get_object_or_404, _get_queryset
 
-from middleware import get_current_tenant
+from copyonwrite import tenant_q
+from middleware import get_current_tenant_id
 
 
 def current_tenant_owns_object(obj):
     """
     To verify that the current logged in tenant owns a particular instance.
+    Only the tenant ids are compared, so this doesn't hit the db.
     example:
         if current_tenant_owns_object(obj):
             do_something()
     """
-    if hasattr(obj, 'tenant'):
-        t = get_current_tenant()
-        if t != obj.tenant:
+    if hasattr(obj, 'tenant_id'):
+        return obj.tenant_id == get_current_tenant_id()
+    return True
+
+
+def current_tenant_owns_objects(objects):
+    """
+    To verify that the current logged in tenant owns every one of a list of instances.
+    A queryset is checked with a single query, without loading the instances.
+    example:
+        if current_tenant_owns_objects(bugs):
+            do_something()
+    """
+    tenant_id = get_current_tenant_id()
+    if isinstance(objects, QuerySet):
+        if not hasattr(objects.model, 'tenant'):
+            return True
+        return not objects.exclude(tenant=tenant_id).exists()
+
+    for obj in objects:
+        if hasattr(obj, 'tenant_id') and obj.tenant_id != tenant_id:
             return False
     return True
 
@@ -26,17 +46,11 @@ def current_tenant_owns_object(obj):
 def tenant_get_object_or_404(klass, *args, **kwargs):
     """
     A tenant-aware version of django's get_object_or_404 shortcut.
+    The tenant is part of the query, so instances of other tenants are simply not found.
     example:
         tenant_get_object_or_404(BugReport, id=1)
     """
-    obj = get_object_or_404(klass, *args, **kwargs)
-    
-    if obj and hasattr(obj, 'tenant'):
-        t = get_current_tenant()
-        if t != obj.tenant:
-            raise Http404
-    
-    return obj
+    return get_object_or_404(tenant_filter(_get_queryset(klass)), *args, **kwargs)
         
         
 def tenant_filter(queryset):
@@ -47,7 +61,6 @@ def tenant_filter(queryset):
         bugs = tenant_filter(bugs)
     """
     if hasattr(queryset.model, 'tenant'):
-        t = get_current_tenant()
-        return queryset.filter(tenant=t)   
+        return queryset.filter(tenant_q(queryset.model, get_current_tenant_id()))
     return queryset 
 
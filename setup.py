@@ -19,7 +19,7 @@ setup(
     version='0.1.0',
     author='Daniel Romaniuk',
     author_email='daniel.romaniuk@gmail.com',
-    packages=['multitenant',],
+    packages=['multitenant', 'multitenant.management', 'multitenant.management.commands', 'multitenant.templatetags',],
     url='https://github.com/phugoid/django-simple-multitenant',
     license='LICENSE.txt',
     description='Helps manage multi tenancy for django projects',